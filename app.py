@@ -9,7 +9,7 @@ import requests
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import our application factory
-from app import create_app, db
+from app import create_app, db, ollama_client
 
 # Configuration
 HISTORY_DIR = Path(os.path.expanduser("~/.freethinkers/history/"))
@@ -112,6 +112,7 @@ MODEL_PARAMS = {
         "mirostat": 1,
         "mirostat_eta": 0.1,
         "mirostat_tau": 5.0,
+        "image_size": 336,
         "speed_settings": {
             "slow": {"temperature": 0.7, "top_p": 0.9, "top_k": 30, "max_tokens": 768},
             "medium": {"temperature": 0.6, "top_p": 0.85, "top_k": 20, "max_tokens": 512},
@@ -137,20 +138,16 @@ def initialize_model_params():
         # Get all available models from Ollama
         # Note: This is wrapped in a try/except block since Ollama might not be running
         try:
-            response = requests.get('http://localhost:11434/api/tags', timeout=1)
-            if response.status_code == 200:
-                models = response.json().get('models', [])
-                
-                for model in models:
-                    model_name = model['name']
-                    # If the model doesn't have parameters yet, set default ones
-                    if model_name not in MODEL_PARAMS:
-                        # Create a deep copy of default params to avoid reference issues
-                        params = json.loads(json.dumps(DEFAULT_MODEL_PARAMS))
-                        
-                        # Add specific configurations based on model name if needed
-                        # Add the new model to the parameters dictionary
-                        MODEL_PARAMS[model_name] = params
+            for model in ollama_client.get_client().tags(timeout=1):
+                model_name = model['name']
+                # If the model doesn't have parameters yet, set default ones
+                if model_name not in MODEL_PARAMS:
+                    # Create a deep copy of default params to avoid reference issues
+                    params = json.loads(json.dumps(DEFAULT_MODEL_PARAMS))
+                    
+                    # Add specific configurations based on model name if needed
+                    # Add the new model to the parameters dictionary
+                    MODEL_PARAMS[model_name] = params
         except requests.exceptions.RequestException:
             print("Ollama server not available, skipping model parameter initialization")
     except Exception as e:
@@ -173,6 +170,9 @@ app = create_app_with_config()
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Free Thinkers AI Assistant')
     parser.add_argument('--debug', action='store_true', help='Run in debug mode')
+    parser.add_argument('--asgi', action='store_true', help='Serve with uvicorn and native async streaming')
+    parser.add_argument('--host', default='127.0.0.1', help='Host to bind')
+    parser.add_argument('--port', type=int, default=5000, help='Port to bind')
     args = parser.parse_args()
     
     # Initialize database if needed
@@ -183,4 +183,10 @@ if __name__ == '__main__':
         except Exception as e:
             print(f"Database already exists or error: {e}")
     
-    app.run(debug=args.debug)
+    if args.asgi:
+        import uvicorn
+        from app.asgi import create_asgi_app
+        uvicorn.run(create_asgi_app(app), host=args.host, port=args.port,
+                    log_level='debug' if args.debug else 'info')
+    else:
+        app.run(debug=args.debug, host=args.host, port=args.port)
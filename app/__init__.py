@@ -1,15 +1,19 @@
-from flask import Flask, render_template, send_from_directory, jsonify, request, session
-import os
-import json
-import requests
+from flask import Flask, render_template, jsonify, request, session
+import contextlib
+import time
 import uuid
-from datetime import datetime
-from pathlib import Path
 from flask_login import current_user
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
 
 from app.models import db
+from app import ollama_client, conversation_store, scheduler, response_cache, semantic_cache, image_pipeline, log, metrics, traffic_recorder, model_residency, batch, assets, registries, storage_codec, blob_store, history
+from app.streaming import (
+    CHAT_MODES, GenerationRelay, active_generations, flush_policy, build_generate_payload,
+    build_conversation_request, parse_image_request, cached_response, paced_lines
+)
 from app.auth import auth, login_manager
+from app.prompt_guides import build_prompt_guides, model_guides
 from app.conversation_api import conversation_api
 from app.user_management_api import user_management_api
 from app.model_management import model_management
@@ -20,80 +24,10 @@ from app.model_chain_api import model_chain_api
 from app.system_monitor_api import system_monitor_api
 from app.prompt_chain_api import prompt_chain_api
 from app.retrieval_api import retrieval_api
+from app.batch_api import batch_api
 from .model_strategies_api import model_strategies_api
 
-# Path to store history
-HISTORY_DIR = Path(os.path.expanduser("~/.freethinkers/history/"))
-HISTORY_DIR.mkdir(parents=True, exist_ok=True)
-MAX_HISTORY = 100
-
-def get_thread_path(thread_id):
-    """Get the path to a thread's JSON file."""
-    return HISTORY_DIR / f"{thread_id}.json"
-
-def save_thread(thread_id, model, messages):
-    """Save a thread to disk."""
-    thread_data = {
-        "id": thread_id,
-        "model": model,
-        "messages": messages,
-        "created_at": datetime.now().isoformat()
-    }
-    
-    thread_path = get_thread_path(thread_id)
-    with open(thread_path, 'w') as f:
-        json.dump(thread_data, f, indent=2)
-
-def load_history():
-    """Load all thread history from disk."""
-    # Ensure history directory exists
-    HISTORY_DIR.mkdir(parents=True, exist_ok=True)
-    
-    threads = []
-    try:
-        # Check if directory exists and has files
-        if not HISTORY_DIR.exists() or not any(HISTORY_DIR.iterdir()):
-            print(f"History directory empty or not accessible: {HISTORY_DIR}")
-            return threads
-            
-        # Sort by modification time to get newest first
-        json_files = sorted(HISTORY_DIR.glob("*.json"), 
-                          key=lambda x: x.stat().st_mtime, 
-                          reverse=True)[:MAX_HISTORY]
-        
-        print(f"Found {len(json_files)} history files")
-        
-        for file in json_files:
-            try:
-                with open(file, 'r') as f:
-                    thread = json.load(f)
-                    # Validate thread structure
-                    if not isinstance(thread, dict) or 'id' not in thread or 'messages' not in thread:
-                        print(f"Invalid thread format in {file}")
-                        continue
-                    if not isinstance(thread['messages'], list):
-                        print(f"Invalid messages format in {file}")
-                        continue
-                    threads.append(thread)
-            except json.JSONDecodeError as e:
-                print(f"JSON error in thread file {file}: {e}")
-                continue
-            except Exception as e:
-                print(f"Error loading thread file {file}: {e}")
-                continue
-    except Exception as e:
-        print(f"Error loading history: {e}")
-    
-    print(f"Loaded {len(threads)} valid threads from history")
-    return threads
-
-def get_thread(thread_id):
-    """Load a specific thread from disk."""
-    thread_path = get_thread_path(thread_id)
-    if thread_path.exists():
-        with open(thread_path, 'r') as f:
-            return json.load(f)
-    return None
+logger = log.get_logger('chat')
 
 def create_app(config_object='config.Config'):
     """Application factory for creating the Flask application."""
@@ -103,8 +37,28 @@ def create_app(config_object='config.Config'):
     app.config.from_object(config_object)
     
     # Initialize extensions
+    log.init_app(app)
     db.init_app(app)
     login_manager.init_app(app)
+    ollama_client.init_app(app)
+    scheduler.init_app(app)
+    response_cache.init_app(app)
+    semantic_cache.init_app(app)
+    image_pipeline.init_app(app)
+    conversation_store.init_app(app)
+    traffic_recorder.init_app(app)
+    model_residency.init_app(app)
+    batch.init_app(app)
+    assets.init_app(app)
+    storage_codec.init_app(app)
+    blob_store.init_app(app)
+    history.init_app(app)
+    
+    # Guide data is served as prepared JSON; the model guides are rebuilt when MODEL_PARAMS is replaced
+    model_params = lambda: app.config.get('MODEL_PARAMS')
+    registries.register('prompt_guides', lambda: registries.prepare(build_prompt_guides()))
+    registries.register('model_guides', lambda params: registries.prepare(model_guides(params)), source=model_params)
+    registries.register('model_guide', lambda params: registries.prepare_each(model_guides(params)), source=model_params)
     
     # Enable CORS
     CORS(app)
@@ -121,6 +75,7 @@ def create_app(config_object='config.Config'):
     app.register_blueprint(system_monitor_api)
     app.register_blueprint(prompt_chain_api, url_prefix='/api/prompt-chain')
     app.register_blueprint(retrieval_api)
+    app.register_blueprint(batch_api)
     app.register_blueprint(model_strategies_api, url_prefix='/api/model-strategies')
     
     # Context processor for adding global variables to templates
@@ -147,82 +102,81 @@ def create_app(config_object='config.Config'):
         """Handle chat requests with Ollama."""
         # Check for SSE (Server-Sent Events) request
         if request.method == 'GET':
-            # Get parameters from the session
-            model = session.get('model', 'mistral-7b')
-            messages = session.get('messages', [])
-            parameters = session.get('parameters', {})
+            # Look up the conversation state by handle (query string first, then session)
+            conversation_id = request.args.get('conversation_id') or session.get('conversation_id')
+            conversation = conversation_store.get_store().get(conversation_id) or {}
+            
+            model = conversation.get('model', 'mistral-7b')
+            messages = conversation.get('messages', [])
             
             if not messages:
                 return jsonify({"error": "No messages in session. Send a POST request first."}), 400
-            
-            # Format messages for Ollama
-            prompt = ""
-            for msg in messages:
-                role = msg.get('role', 'user')
-                content = msg.get('content', '')
-                if role == 'user':
-                    prompt += f"User: {content}\n"
-                elif role == 'assistant':
-                    prompt += f"Assistant: {content}\n"
-            
-            # Add final assistant prompt
-            prompt += "Assistant:"
                 
+            user = scheduler.current_user_key()
+            
             def generate_events():
+                relay = GenerationRelay('chat', flush_policy(conversation, app.config),
+                                        conversation_id=conversation_id, previous_turn=conversation.get('last_turn'))
+                cancel_event = active_generations.start(conversation_id)
+                generation_scheduler = scheduler.get_scheduler()
+                ticket = None
                 try:
-                    # Get parameters from session
-                    temperature = float(parameters.get('temperature', 0.7))
-                    top_p = float(parameters.get('top_p', 0.95))
-                    top_k = int(parameters.get('top_k', 40))
-                    
                     # Get model parameters
                     model_params = app.config.get('MODEL_PARAMS', {}).get(model, {})
                     
-                    print(f"Streaming for model: {model}")
-                    print(f"Temperature: {temperature}, Top-P: {top_p}, Top-K: {top_k}")
+                    # Ollama request for the conversation's chat mode (/api/chat or /api/generate)
+                    api_path, ollama_params = build_conversation_request(conversation, model_params, app.config)
+                    
+                    logger.info("Streaming for model %s via %s", model, api_path)
+                    if logger.isEnabledFor(log.logging.DEBUG):
+                        logger.debug("Ollama request: %s", log.redact_payload(ollama_params))
                     
-                    # Ollama parameters
-                    ollama_params = {
-                        'model': model,
-                        'prompt': prompt,
-                        'stream': True,
-                        'temperature': temperature,
-                        'top_p': top_p,
-                        'top_k': top_k
-                    }
+                    relay.payload = ollama_params
                     
-                    # Add other params if available in model_params
-                    for key in ['num_gpu', 'num_thread', 'num_batch', 'f16_kv', 'use_gpu', 'gpu_layers']:
-                        if key in model_params:
-                            ollama_params[key] = model_params[key]
+                    # Requests answered before (exactly, or near-duplicates) are replayed from cache
+                    cached = cached_response(ollama_params)
+                    if cached is not None:
+                        yield from relay.replay(cached)
+                        return
                     
-                    print(f"Using Ollama parameters: {ollama_params}")
+                    # Wait for a slot on this model, telling the client where it is in the queue
+                    ticket = generation_scheduler.submit(model, user)
+                    for status in generation_scheduler.queue_updates(ticket):
+                        if cancel_event.is_set():
+                            yield from relay.cancel('superseded')
+                            return
+                        yield relay.frame(status)
+                    relay.queue_wait = ticket.queue_wait
                     
-                    # Make request to Ollama
-                    response = requests.post(
-                        'http://127.0.0.1:11434/api/generate',
-                        json=ollama_params,
-                        stream=True,
-                        timeout=300
-                    )
+                    # Make request to Ollama over the shared connection pool
+                    # Leaving the with block closes the upstream socket, which makes Ollama stop generating
+                    def open_response():
+                        return ollama_client.get_client().post(api_path, json=ollama_params, stream=True,
+                                                               timeout=ollama_client.STREAM_TIMEOUT)
                     
-                    for line in response.iter_lines():
-                        if line:
-                            try:
-                                chunk = json.loads(line)
-                                if 'response' in chunk:
-                                    yield f"data: {json.dumps({'content': chunk['response']})}\n\n"
-                            except json.JSONDecodeError as e:
-                                print(f"JSON decode error: {e}, line: {line}")
-                                continue
+                    with contextlib.closing(paced_lines(open_response, relay.wait_timeout)) as lines:
+                        for line in lines:
+                            if cancel_event.is_set():
+                                # A newer message for this conversation superseded this stream
+                                yield from relay.cancel('superseded')
+                                return
+                            # None: no line yet; flush buffered text whose deadline passed
+                            yield from relay.tick() if line is None else relay.feed(line)
                                 
-                    # End of stream
-                    yield f"data: {json.dumps({'done': True})}\n\n"
+                    # End of stream, with prompt evaluation stats when Ollama reported them
+                    yield from relay.finish()
                     
+                except GeneratorExit:
+                    # The client disconnected; the upstream response is already closed
+                    relay.cancel('disconnect')
+                    raise
                 except Exception as e:
-                    print(f"Error in stream: {str(e)}")
-                    yield f"data: {json.dumps({'error': str(e)})}\n\n"
-                    yield f"data: {json.dumps({'done': True})}\n\n"
+                    logger.error("Error in stream: %s", e)
+                    yield from relay.error(e)
+                finally:
+                    if ticket is not None:
+                        generation_scheduler.release(ticket)
+                    active_generations.finish(conversation_id, cancel_event)
             
             return app.response_class(generate_events(), mimetype='text/event-stream')
         
@@ -238,10 +192,22 @@ def create_app(config_object='config.Config'):
                 'top_p': float(data.get('top_p', 0.95)),
                 'top_k': int(data.get('top_k', 40))
             }
+            if data.get('seed') is not None:
+                # A fixed seed makes the generation reproducible (and cacheable)
+                parameters['seed'] = int(data['seed'])
+            
+            # Optional per-request chat mode ('chat' or 'generate')
+            chat_mode = data.get('chat_mode')
+            if chat_mode and chat_mode not in CHAT_MODES:
+                return jsonify({"error": f"Invalid chat mode '{chat_mode}'"}), 400
+            
+            # Optional per-request SSE flush policy overrides
+            stream_options = {
+                key: data[key] for key in ('stream_flush_ms', 'stream_flush_bytes') if data.get(key) is not None
+            }
             
-            print(f"Received chat request for model: {model}")
-            print(f"Parameters: {parameters}")
-            print(f"Message count: {len(messages)}")
+            logger.info("Received chat request for model %s (%d messages)", model, len(messages))
+            logger.debug("Parameters: %s", parameters)
             
             # Validate model
             if model not in app.config.get('MODEL_PARAMS', {}):
@@ -252,110 +218,136 @@ def create_app(config_object='config.Config'):
                 if not messages:
                     return jsonify({"error": "No messages provided"}), 400
                 
-                # Store in session for the GET request
-                session['model'] = model
-                session['messages'] = messages
-                session['parameters'] = parameters
+                # A new message supersedes any generation still streaming for this conversation
+                if data.get('conversation_id'):
+                    active_generations.cancel(data['conversation_id'])
+                
+                # Store server-side for the GET request; the session only keeps the handle.
+                # The previous turn's token counts are kept to measure KV cache reuse
+                store = conversation_store.get_store()
+                previous = store.get(data.get('conversation_id')) or {}
+                conversation_id = store.save(data.get('conversation_id'), {
+                    'model': model,
+                    'messages': messages,
+                    'parameters': parameters,
+                    'chat_mode': chat_mode,
+                    'last_turn': previous.get('last_turn'),
+                    **stream_options
+                })
+                session['conversation_id'] = conversation_id
                 
-                return jsonify({"status": "ok", "message": "Chat initialized"})
+                return jsonify({
+                    "status": "ok",
+                    "message": "Chat initialized",
+                    "conversation_id": conversation_id
+                })
                 
             except Exception as e:
-                print(f"Error initializing chat: {e}")
+                logger.error("Error initializing chat: %s", e)
                 return jsonify({
                     'error': 'Failed to initialize chat',
                     'error_info': str(e)
                 }), 500
     
+    @app.route('/api/chat/cancel', methods=['POST'])
+    def cancel_chat():
+        """Stop the generation currently streaming for a conversation."""
+        data = request.get_json(silent=True) or {}
+        conversation_id = data.get('conversation_id') or session.get('conversation_id')
+        if not conversation_id:
+            return jsonify({"error": "No conversation to cancel"}), 400
+        
+        cancelled = active_generations.cancel(conversation_id)
+        return jsonify({"status": "ok", "cancelled": cancelled})
+    
     # Handle image-based chat
     @app.route('/api/chat_with_image', methods=['POST'])
     def chat_with_image():
         """Handle chat with image upload for multimodal models."""
+        started_at = time.monotonic()
         try:
-            # Get form data
-            model = request.form.get('model', 'llava-phi3:latest')
-            prompt = request.form.get('prompt', '')
-            temperature = float(request.form.get('temperature', 0.7))
-            top_p = float(request.form.get('top_p', 0.95))
-            top_k = int(request.form.get('top_k', 40))
-            
-            # Check if image is in the request
-            if 'image' not in request.files:
-                return jsonify({"error": "No image uploaded"}), 400
-                
-            image_file = request.files['image']
-            
-            # Validate image file
-            if image_file.filename == '':
-                return jsonify({"error": "Empty image file"}), 400
+            # Get and validate form data
+            try:
+                model, prompt, parameters, image_file = parse_image_request(request.form, request.files)
                 
-            # Check if it's a valid image type
-            if not image_file.content_type.startswith('image/'):
-                return jsonify({"error": "Invalid file type. Please upload an image."}), 400
+                # Read the upload, downscale it to the model's input size and encode it (cached by content hash)
+                model_params = app.config.get('MODEL_PARAMS', {}).get(model, {})
+                image_data = image_pipeline.get_pipeline().process(image_file, model_params)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            except RequestEntityTooLarge as e:
+                return jsonify({"error": e.description}), 413
             
-            # Read the image file and encode to base64
-            import base64
-            image_data = base64.b64encode(image_file.read()).decode('utf-8')
+            # Log info about the request (the prompt itself is never logged)
+            logger.info("Processing image request with model %s (%s, prompt %s)",
+                        model, image_file.content_type, log.fingerprint(prompt))
             
-            # Format the prompt for the multimodal model
-            formatted_prompt = prompt if prompt else "Describe this image in detail."
-            
-            # Log info about the request
-            print(f"Processing image request with model: {model}")
-            print(f"Image type: {image_file.content_type}, Prompt: {formatted_prompt}")
+            # SSE flush policy (form fields override the deployment defaults)
+            flush = flush_policy(request.form, app.config)
+            user = scheduler.current_user_key()
+            # Registered under the conversation like chat(), so a newer message or a cancel stops it
+            conversation_id = request.form.get('conversation_id') or session.get('conversation_id')
             
             def generate_events():
+                relay = GenerationRelay('chat_with_image', flush, started_at=started_at)
+                cancel_event = active_generations.start(conversation_id)
+                generation_scheduler = scheduler.get_scheduler()
+                ticket = None
                 try:
-                    # Get model parameters for optimization
-                    model_params = app.config.get('MODEL_PARAMS', {}).get(model, {})
+                    # Prepare Ollama API request with the base64 image data
+                    ollama_request = build_generate_payload(model, prompt, parameters, model_params, images=[image_data],
+                                                            keep_alive=model_residency.get_manager().keep_alive(model, app.config.get('OLLAMA_KEEP_ALIVE')))
+                    
+                    if logger.isEnabledFor(log.logging.DEBUG):
+                        logger.debug("Ollama request: %s", log.redact_payload(ollama_request))
                     
-                    # Prepare Ollama API request
-                    ollama_request = {
-                        'model': model,
-                        'prompt': formatted_prompt,
-                        'stream': True,
-                        'images': [image_data],  # Pass base64 image data to Ollama
-                        'temperature': temperature,
-                        'top_p': top_p,
-                        'top_k': top_k
-                    }
+                    relay.payload = ollama_request
                     
-                    # Add other params if available in model_params
-                    for key in ['num_gpu', 'num_thread', 'num_batch', 'f16_kv', 'use_gpu', 'gpu_layers']:
-                        if key in model_params:
-                            ollama_request[key] = model_params[key]
+                    # Requests answered before (exactly, or near-duplicates) are replayed from cache
+                    cached = cached_response(ollama_request)
+                    if cached is not None:
+                        yield from relay.replay(cached)
+                        return
                     
-                    print(f"Using Ollama parameters: {ollama_request}")
+                    # Wait for a slot on this model, telling the client where it is in the queue
+                    ticket = generation_scheduler.submit(model, user)
+                    for status in generation_scheduler.queue_updates(ticket):
+                        if cancel_event.is_set():
+                            yield from relay.cancel('superseded')
+                            return
+                        yield relay.frame(status)
+                    relay.queue_wait = ticket.queue_wait
                     
-                    # Make request to Ollama
-                    response = requests.post(
-                        'http://127.0.0.1:11434/api/generate',
-                        json=ollama_request,
-                        stream=True,
-                        timeout=300
-                    )
+                    # Make request to Ollama over the shared connection pool
+                    def open_response():
+                        return ollama_client.get_client().generate(ollama_request, stream=True)
                     
-                    for line in response.iter_lines():
-                        if line:
-                            try:
-                                chunk = json.loads(line)
-                                if 'response' in chunk:
-                                    yield f"data: {json.dumps({'content': chunk['response']})}\n\n"
-                            except json.JSONDecodeError as e:
-                                print(f"JSON decode error: {e}, line: {line}")
-                                continue
+                    with contextlib.closing(paced_lines(open_response, relay.wait_timeout)) as lines:
+                        for line in lines:
+                            if cancel_event.is_set():
+                                yield from relay.cancel('superseded')
+                                return
+                            yield from relay.tick() if line is None else relay.feed(line)
                     
                     # End of stream
-                    yield f"data: {json.dumps({'done': True})}\n\n"
+                    yield from relay.finish()
                     
+                except GeneratorExit:
+                    # The client disconnected; the upstream response is already closed
+                    relay.cancel('disconnect')
+                    raise
                 except Exception as e:
-                    print(f"Error in image processing stream: {str(e)}")
-                    yield f"data: {json.dumps({'error': str(e)})}\n\n"
-                    yield f"data: {json.dumps({'done': True})}\n\n"
+                    logger.error("Error in image processing stream: %s", e)
+                    yield from relay.error(e)
+                finally:
+                    if ticket is not None:
+                        generation_scheduler.release(ticket)
+                    active_generations.finish(conversation_id, cancel_event)
             
             return app.response_class(generate_events(), mimetype='text/event-stream')
             
         except Exception as e:
-            print(f"Error in chat_with_image: {str(e)}")
+            logger.error("Error in chat_with_image: %s", e)
             return jsonify({"error": str(e)}), 500
     
     # Route to get available models from Ollama
@@ -363,24 +355,12 @@ def create_app(config_object='config.Config'):
     def get_models():
         """Get a list of available models from Ollama."""
         try:
-            # Direct request to Ollama API
-            response = requests.get('http://127.0.0.1:11434/api/tags', timeout=5)
-            
-            if response.ok:
-                data = response.json()
-                if 'models' in data and isinstance(data['models'], list):
-                    # Return the list of model names from Ollama
-                    model_names = [model['name'] for model in data['models']]
-                    print(f"Available models: {model_names}")
-                    return jsonify(model_names)
-                else:
-                    print("Unexpected response format from Ollama API:", data)
-                    return jsonify([]), 500
-            else:
-                print(f"Error connecting to Ollama API: {response.status_code} {response.reason}")
-                return jsonify({"error": f"Failed to get models: {response.status_code}"}), response.status_code
+            # Models installed on any Ollama backend, over the shared connection pool
+            model_names = [model['name'] for model in ollama_client.get_client().tags()]
+            logger.debug("Available models: %s", model_names)
+            return jsonify(model_names)
         except Exception as e:
-            print(f"Exception while getting models: {e}")
+            logger.error("Exception while getting models: %s", e)
             return jsonify({"error": f"Error fetching models: {str(e)}"}), 500
 
     # Proxy endpoint for Ollama API
@@ -388,289 +368,124 @@ def create_app(config_object='config.Config'):
     def ollama_proxy(subpath):
         """Proxy requests to Ollama API."""
         try:
-            # Forward request to Ollama
-            ollama_url = f'http://127.0.0.1:11434/api/{subpath}'
-            
             # Forward the request method, headers, and body
             method = request.method
             headers = {k: v for k, v in request.headers.items() if k.lower() not in ['host', 'content-length']}
-            data = request.get_data()
+            body = request.get_json(silent=True)
+            # JSON bodies are passed parsed so the client can track which models each backend holds
+            payload = {'json': body} if isinstance(body, dict) else {'data': request.get_data()}
             
-            # Make the request to Ollama
-            response = requests.request(
-                method=method,
-                url=ollama_url,
+            # Make the request to Ollama over the shared connection pool (routed by the model it names)
+            with ollama_client.get_client().request(
+                method,
+                f'api/{subpath}',
                 headers=headers,
-                data=data,
                 stream=True,
-                timeout=60
-            )
-            
-            # Return the response from Ollama
-            return (response.content, response.status_code, response.headers.items())
+                timeout=ollama_client.PROXY_TIMEOUT,
+                model=body.get('model') if isinstance(body, dict) else None,
+                **payload
+            ) as response:
+                # Return the response from Ollama
+                return (response.content, response.status_code, response.headers.items())
         except Exception as e:
-            print(f"Error proxying to Ollama API: {e}")
+            logger.error("Error proxying to Ollama API: %s", e)
             return jsonify({"error": f"Error proxying to Ollama API: {str(e)}"}), 500
     
+    # Prometheus scrape endpoint
+    @app.route('/metrics')
+    def prometheus_metrics():
+        """Expose counters and generation timing histograms in the Prometheus text format."""
+        return app.response_class(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+    
     # History API endpoints
     @app.route('/api/history')
     def get_history():
-        """Return list of all saved threads."""
-        threads = load_history()
-        return jsonify(threads)
+        """Return one page of saved thread summaries, newest first (messages via /api/history/<id>)."""
+        try:
+            threads, next_cursor = history.get_store().list(
+                limit=request.args.get('limit', history.DEFAULT_PAGE_SIZE, type=int),
+                cursor=request.args.get('cursor')
+            )
+        except history.InvalidCursorError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify({"threads": threads, "next_cursor": next_cursor})
+
+    @app.route('/api/history/search')
+    def search_history():
+        """Search saved thread messages; every word of q must match."""
+        limit = request.args.get('limit', history.DEFAULT_SEARCH_LIMIT, type=int)
+        results = history.get_store().search(request.args.get('q', ''),
+                                             limit=max(1, min(limit, history.MAX_SEARCH_LIMIT)))
+        return jsonify({"results": results})
 
     @app.route('/api/history/save', methods=['POST'])
     def save_thread_endpoint():
-        """Save current thread to history."""
+        """
+        Save a thread to history.
+
+        With "offset", "messages" holds only the messages from that position on
+        and is appended to the saved thread; without it, it is the whole thread.
+        """
         try:
             data = request.get_json()
             if not data or 'model' not in data or 'messages' not in data:
-                print("Invalid save request data:", data)
+                # Only the field names are logged; the messages are the user's conversation
+                logger.warning("Invalid save request (fields: %s)",
+                               sorted(data) if isinstance(data, dict) else type(data).__name__)
                 return jsonify({"error": "Invalid data format"}), 400
                 
-            thread_id = str(uuid.uuid4())
-            save_thread(thread_id, data['model'], data['messages'])
-            return jsonify({"thread_id": thread_id, "status": "success"})
+            # Clients reuse their conversation id so saves continue the same thread
+            thread_id = str(data.get('id') or uuid.uuid4())
+            offset = data.get('offset')
+            if not history.THREAD_ID_PATTERN.match(thread_id):
+                return jsonify({"error": "Invalid thread id"}), 400
+            if offset is not None and (not isinstance(offset, int) or offset < 0):
+                return jsonify({"error": "offset must be a non-negative integer"}), 400
+
+            summary = history.get_store().save(thread_id, data['model'], data['messages'],
+                                               title=data.get('title'), category=data.get('category'),
+                                               offset=offset)
+            return jsonify({"thread_id": thread_id, "status": "success",
+                            "message_count": summary['message_count']})
+        except history.ThreadConflictError as e:
+            return jsonify({"error": str(e), "message_count": e.message_count}), 409
         except Exception as e:
-            print(f"Error saving thread: {e}")
+            logger.error("Error saving thread: %s", e)
             return jsonify({"error": str(e)}), 500
 
     @app.route('/api/history/<thread_id>')
     def get_thread_endpoint(thread_id):
         """Get a specific thread."""
-        thread = get_thread(thread_id)
+        thread = history.get_store().get(thread_id)
         if thread:
             return jsonify(thread)
         return jsonify({"error": "Thread not found"}), 404
+
+    @app.route('/api/history/<thread_id>', methods=['DELETE'])
+    def delete_thread_endpoint(thread_id):
+        """Delete a saved thread."""
+        if history.get_store().delete(thread_id):
+            return jsonify({"status": "success"})
+        return jsonify({"error": "Thread not found"}), 404
     
     # API endpoints from original app.py
     @app.route('/api/model_guide/<model_name>')
     def get_model_guide(model_name):
         """Return guide for a specific model."""
-        if model_name in app.config.get('MODEL_PARAMS', {}) and 'prompt_guide' in app.config.get('MODEL_PARAMS', {}).get(model_name, {}):
-            response = {
-                'guide': app.config.get('MODEL_PARAMS', {}).get(model_name, {}).get('prompt_guide', {}),
-                'limits': app.config.get('MODEL_PARAMS', {}).get(model_name, {}).get('limits', {})
-            }
-            return jsonify(response)
+        guides = registries.get('model_guide')
+        if model_name in guides:
+            return registries.json_response(guides[model_name])
         return jsonify({"error": "Model guide not found"}), 404
     
     @app.route('/api/model_guides')
     def get_model_guides():
         """Return prompt guides for all models."""
-        guides = {}
-        for model, params in app.config.get('MODEL_PARAMS', {}).items():
-            if 'prompt_guide' in params:
-                guides[model] = {
-                    'guide': params['prompt_guide'],
-                    'limits': params['limits']
-                }
-        return jsonify(guides)
+        return registries.json_response(registries.get('model_guides'))
     
     @app.route('/api/prompt_guides')
     def get_prompt_guides():
         """Return prompt guides for all models."""
-        try:
-            # Comprehensive guides based on prompt engineering roadmap
-            guides = {
-                # Large language models
-                'llama3.1:8b': {
-                    'title': 'Llama 3.1 (8B) - Detailed Reasoning',
-                    'useCases': 'Ideal for complex reasoning, logic puzzles, and creative writing. This model excels at step-by-step problem solving and detailed explanations.',
-                    'examples': 'Explain the process of photosynthesis and how it relates to global carbon cycles.',
-                    'tips': 'Use chain-of-thought prompting by asking the model to "think step by step" for best results.'
-                },
-                'llama3.2:latest': {
-                    'title': 'Llama 3.2 - General Purpose',
-                    'useCases': 'A versatile, general-purpose model for everyday tasks, creative writing, and information retrieval.',
-                    'examples': 'What are the key differences between nuclear fusion and nuclear fission?',
-                    'tips': 'For complex queries, try breaking them down into sequential parts for more accurate responses.'
-                },
-                'mistral-7b:latest': {
-                    'title': 'Mistral 7B - Precise Information',
-                    'useCases': 'Excellent for factual information, code explanation, and technical content. This model prioritizes accuracy.',
-                    'examples': 'Explain how TCP/IP protocols ensure reliable data transmission across networks.',
-                    'tips': 'Use clear, explicit instructions and consider formatting requirements for structured outputs.'
-                },
-                
-                # Smaller/specialized models
-                'phi3:3.8b': {
-                    'title': 'Phi-3 (3.8B) - Concise Reasoning',
-                    'useCases': 'Optimized for reasoning tasks despite its smaller size. Good for when you need efficient, concise responses.',
-                    'examples': 'What are three key considerations when designing a sustainable urban transportation system?',
-                    'tips': 'This model works well with few-shot examples when you need specific response formats.'
-                },
-                'gemma3:4b': {
-                    'title': 'Gemma 3 (4B) - Efficient Assistant',
-                    'useCases': 'A compact but capable model for general information and assistance with lower compute requirements.',
-                    'examples': 'Give me a quick explanation of how blockchain technology works.',
-                    'tips': 'Provide clear context and be specific with your requirements for best results.'
-                },
-                'gemma3:1b': {
-                    'title': 'Gemma 3 (1B) - Quick Responses',
-                    'useCases': 'Ultra-lightweight model for basic tasks and quick responses when efficiency is prioritized over detail.',
-                    'examples': 'What are three healthy breakfast ideas that take less than 10 minutes to prepare?',
-                    'tips': 'Keep queries simple and focused. Avoid complex reasoning tasks.'
-                },
-                'zephyr:latest': {
-                    'title': 'Zephyr - Instruction Following',
-                    'useCases': 'Excellent at following precise instructions and formatting requirements. Good for structured outputs.',
-                    'examples': 'Create a 5-day itinerary for visiting Tokyo, with each day focused on a different area of the city.',
-                    'tips': 'Use clear formatting instructions like "respond with a numbered list" or "format as a table".'
-                },
-                
-                # Code models
-                'codegemma:2b': {
-                    'title': 'CodeGemma (2B) - Code Generation',
-                    'useCases': 'Specialized for programming tasks, code explanation, and debugging assistance.',
-                    'examples': 'Write a Python function that checks if a string is a valid palindrome, ignoring spaces and punctuation.',
-                    'tips': 'Specify the programming language, desired functionality, and any specific requirements or constraints.'
-                },
-                
-                # Math models
-                'qwen2-math:1.5b': {
-                    'title': 'Qwen2 Math (1.5B) - Mathematical Reasoning',
-                    'useCases': 'Specialized for mathematical problems, equations, and numerical reasoning tasks.',
-                    'examples': 'Solve the following system of equations: 2x + 3y = 7, 4x - 2y = 10',
-                    'tips': 'Ask the model to show its work step-by-step for complex math problems.'
-                },
-                
-                # Multimodal models
-                'llava-phi3:latest': {
-                    'title': 'LLaVA-Phi3 - Visual Understanding',
-                    'useCases': 'Multimodal model capable of understanding and describing images alongside text.',
-                    'examples': 'Upload an image and ask: "Describe what you see in this image in detail."',
-                    'tips': 'For best results with images, ask specific questions about visual elements rather than general descriptions.'
-                },
-                
-                # Specialty models
-                'falcon3:1b': {
-                    'title': 'Falcon 3 (1B) - Quick Responses',
-                    'useCases': 'Fast, efficient model for simple tasks and basic information requests.',
-                    'examples': 'What are the key ingredients in a classic carbonara pasta?',
-                    'tips': 'Keep queries concise and straightforward for this lightweight model.'
-                },
-                'llama2-uncensored:7b': {
-                    'title': 'Llama 2 Uncensored (7B)',
-                    'useCases': 'Model with fewer content restrictions for research and creative writing purposes.',
-                    'examples': 'Write a horror short story set in an abandoned research facility.',
-                    'tips': 'Remember that while less restricted, ethical considerations still apply.'
-                },
-                
-                # Default fallback guide
-                'default': {
-                    'title': 'General AI Assistant',
-                    'useCases': 'Ask questions on virtually any topic, request creative content, or get assistance with various tasks.',
-                    'examples': 'Explain the concept of quantum computing in simple terms.',
-                    'tips': 'Be specific with your questions and provide relevant context for better results.'
-                }
-            }
-            
-            # Add model-specific parameter recommendations for each model
-            # This supports the parameter optimization part of the prompt engineering roadmap
-            parameter_recommendations = {
-                'llama3.1:8b': {
-                    'temperature': 0.7,
-                    'top_p': 0.9,
-                    'top_k': 40,
-                    'context_window': 0.95,
-                    'max_tokens': 2048
-                },
-                'llama3.2:latest': {
-                    'temperature': 0.7,
-                    'top_p': 0.9,
-                    'top_k': 40,
-                    'context_window': 0.95,
-                    'max_tokens': 2048
-                },
-                'mistral-7b:latest': {
-                    'temperature': 0.7,
-                    'top_p': 0.9,
-                    'top_k': 40,
-                    'context_window': 0.95,
-                    'max_tokens': 2048
-                },
-                'phi3:3.8b': {
-                    'temperature': 0.8,
-                    'top_p': 0.9,
-                    'top_k': 40,
-                    'context_window': 0.95,
-                    'max_tokens': 1024
-                },
-                'gemma3:4b': {
-                    'temperature': 0.8,
-                    'top_p': 0.9,
-                    'top_k': 40,
-                    'context_window': 0.95,
-                    'max_tokens': 1024
-                },
-                'gemma3:1b': {
-                    'temperature': 0.8,
-                    'top_p': 0.9,
-                    'top_k': 40,
-                    'context_window': 0.9,
-                    'max_tokens': 512
-                },
-                'zephyr:latest': {
-                    'temperature': 0.7,
-                    'top_p': 0.9,
-                    'top_k': 40,
-                    'context_window': 0.95,
-                    'max_tokens': 1024
-                },
-                'codegemma:2b': {
-                    'temperature': 0.3,  # Lower temperature for more deterministic code
-                    'top_p': 0.95,
-                    'top_k': 40,
-                    'context_window': 0.9,
-                    'max_tokens': 1024
-                },
-                'qwen2-math:1.5b': {
-                    'temperature': 0.1,  # Very low temperature for math precision
-                    'top_p': 0.95,
-                    'top_k': 40,
-                    'context_window': 0.9,
-                    'max_tokens': 1024
-                },
-                'llava-phi3:latest': {
-                    'temperature': 0.7,
-                    'top_p': 0.9,
-                    'top_k': 40,
-                    'context_window': 0.95,
-                    'max_tokens': 1024
-                },
-                'falcon3:1b': {
-                    'temperature': 0.8,
-                    'top_p': 0.9,
-                    'top_k': 40,
-                    'context_window': 0.8,
-                    'max_tokens': 512
-                },
-                'llama2-uncensored:7b': {
-                    'temperature': 0.8,  # Higher for more creative outputs
-                    'top_p': 0.95,
-                    'top_k': 40,
-                    'context_window': 0.95,
-                    'max_tokens': 2048
-                },
-                'default': {
-                    'temperature': 0.7,
-                    'top_p': 0.9,
-                    'top_k': 40,
-                    'context_window': 0.9,
-                    'max_tokens': 1024
-                }
-            }
-            
-            # Add parameter recommendations to each guide
-            for model_name, params in parameter_recommendations.items():
-                if model_name in guides:
-                    guides[model_name]['parameters'] = params
-            
-            return jsonify(guides)
-        except Exception as e:
-            print(f"Error getting prompt guides: {e}")
-            return jsonify({"error": f"Error getting prompt guides: {str(e)}"}), 500
+        return registries.json_response(registries.get('prompt_guides'))
     
     # Add missing API endpoints that are showing errors in the console
     @app.route('/api/token_count', methods=['POST'])
@@ -762,12 +577,6 @@ def create_app(config_object='config.Config'):
             print(f"Error getting templates: {str(e)}")
             return jsonify([])
     
-    # Static files routes
-    @app.route('/static/<path:path>')
-    def serve_static(path):
-        """Serve static files."""
-        return send_from_directory('../static', path)
-    
     # Catch-all route for SPA
     @app.route('/<path:path>')
     def catch_all(path):
@@ -1,6 +1,6 @@
 from flask import Blueprint, jsonify, request
-import requests
 from .model_chain import ModelChain
+from . import ollama_client
 
 api = Blueprint('api', __name__)
 
@@ -11,9 +11,7 @@ def ollama_models():
     [{"name": "mistral-7b", "display_name": "Mistral 7B"}, ...]
     """
     try:
-        r = requests.get('http://localhost:11434/api/tags', timeout=2)
-        r.raise_for_status()
-        models = r.json().get('models', [])
+        models = ollama_client.get_client().tags(timeout=2)
         # Format: display_name is just the name with underscores replaced and capitalized
         out = []
         for m in models:
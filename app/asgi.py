@@ -0,0 +1,352 @@
+"""
+ASGI Application for Free Thinkers
+Serves the token streaming endpoints natively on asyncio and hands every other
+route to the Flask app, so long generations no longer hold a worker thread each
+"""
+
+import asyncio
+import io
+import json
+import time
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.wrappers import Request
+
+from . import ollama_client, conversation_store, scheduler, image_pipeline, log, model_residency
+from .streaming import (
+    GenerationRelay, active_generations, flush_policy, build_generate_payload,
+    build_conversation_request, parse_image_request, cached_response, CANCEL_POLL_INTERVAL
+)
+
+# asgiref is only needed to serve the remaining Flask routes over ASGI
+try:
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError:
+    WsgiToAsgi = None
+
+SSE_HEADERS = [
+    (b'content-type', b'text/event-stream; charset=utf-8'),
+    (b'cache-control', b'no-cache'),
+    (b'access-control-allow-origin', b'*')
+]
+logger = log.get_logger('asgi')
+
+JSON_HEADERS = [
+    (b'content-type', b'application/json'),
+    (b'access-control-allow-origin', b'*')
+]
+
+
+class AsyncChatApp:
+    """
+    ASGI entry point wrapping the Flask application.
+
+    GET /api/chat and POST /api/chat_with_image are streamed with an
+    httpx.AsyncClient shared by every request on the event loop; all other
+    requests are passed through to Flask unchanged.
+    """
+
+    def __init__(self, flask_app):
+        """Initialize the ASGI wrapper around a configured Flask app."""
+        if WsgiToAsgi is None:
+            raise RuntimeError("asgiref is required for ASGI serving (pip install asgiref)")
+
+        self.flask_app = flask_app
+        self.wsgi_app = WsgiToAsgi(flask_app)
+        self.client = None
+        self.routes = {
+            ('GET', '/api/chat'): self.chat,
+            ('POST', '/api/chat_with_image'): self.chat_with_image
+        }
+
+    async def __call__(self, scope, receive, send):
+        """Dispatch an ASGI connection."""
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+
+        if scope['type'] == 'http':
+            handler = self.routes.get((scope['method'], scope['path']))
+            if handler:
+                await handler(scope, receive, send)
+                return
+
+        await self.wsgi_app(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        """Handle server startup and shutdown events."""
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.client is not None:
+                    await self.client.aclose()
+                    self.client = None
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def get_client(self):
+        """Return the async Ollama client, creating it on the running loop."""
+        if self.client is None:
+            config = self.flask_app.config
+            self.client = ollama_client.AsyncOllamaClient(
+                max_connections=config.get('OLLAMA_ASYNC_MAX_CONNECTIONS'),
+                connect_timeout=config.get('OLLAMA_CONNECT_TIMEOUT'),
+                registry=ollama_client.get_client().registry
+            )
+        return self.client
+
+    def make_request(self, scope, body=b''):
+        """Build a werkzeug Request so Flask's session and form parsing can be reused."""
+        headers = {}
+        for key, value in scope.get('headers', []):
+            name = key.decode('latin-1').upper().replace('-', '_')
+            headers[name] = value.decode('latin-1')
+
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': '',
+            'PATH_INFO': scope['path'],
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'CONTENT_TYPE': headers.pop('CONTENT_TYPE', ''),
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.url_scheme': scope.get('scheme', 'http')
+        }
+        headers.pop('CONTENT_LENGTH', None)
+        for name, value in headers.items():
+            environ[f'HTTP_{name}'] = value
+
+        return Request(environ)
+
+    async def read_body(self, scope, receive):
+        """
+        Read the request body from the ASGI receive channel.
+
+        Raises RequestEntityTooLarge as soon as the declared Content-Length or
+        the bytes received so far exceed MAX_CONTENT_LENGTH, so an oversized
+        upload is never held in memory.
+        """
+        max_bytes = self.flask_app.config.get('MAX_CONTENT_LENGTH')
+        if max_bytes is not None:
+            for key, value in scope.get('headers', []):
+                if key.lower() == b'content-length' and value.isdigit() and int(value) > max_bytes:
+                    raise RequestEntityTooLarge()
+
+        chunks = []
+        received = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                break
+            chunk = message.get('body', b'')
+            received += len(chunk)
+            if max_bytes is not None and received > max_bytes:
+                raise RequestEntityTooLarge()
+            chunks.append(chunk)
+            more_body = message.get('more_body', False)
+        return b''.join(chunks)
+
+    async def send_json(self, send, status, data):
+        """Send a complete JSON response."""
+        await send({'type': 'http.response.start', 'status': status, 'headers': JSON_HEADERS})
+        await send({'type': 'http.response.body', 'body': json.dumps(data).encode('utf-8')})
+
+    async def wait_for_disconnect(self, receive):
+        """Return once the client has gone away."""
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+
+    def user_key(self, scope, session):
+        """Queueing identity for a request: logged-in user, guest id, or client address."""
+        client = scope.get('client') or (None,)
+        return scheduler.user_key(session or {}, client[0])
+
+    def open_session(self, request):
+        """Load the Flask session for a request (read-only)."""
+        return self.flask_app.session_interface.open_session(self.flask_app, request) or {}
+
+    async def wait_for_cancel(self, cancel_event):
+        """Return once a newer message or /api/chat/cancel has cancelled the generation."""
+        while not cancel_event.is_set():
+            await asyncio.sleep(CANCEL_POLL_INTERVAL)
+
+    async def wait_for_slot(self, ticket, send_frames, relay):
+        """Wait for the scheduler to admit a ticket, sending queue updates meanwhile."""
+        generation_scheduler = scheduler.get_scheduler()
+        loop = asyncio.get_running_loop()
+        admitted = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: admitted.done() or admitted.set_result(True))
+
+        ticket.add_callback(wake)
+        deadline = ticket.enqueued_at + generation_scheduler.queue_timeout
+        while not ticket.admitted.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise scheduler.QueueTimeoutError(f"Timed out waiting for model '{ticket.model}'")
+            await send_frames([relay.frame(generation_scheduler.queue_status(ticket))])
+            try:
+                await asyncio.wait_for(asyncio.shield(admitted), min(scheduler.QUEUE_UPDATE_INTERVAL, remaining))
+            except asyncio.TimeoutError:
+                pass
+
+    async def stream_generation(self, receive, send, api_path, payload, relay, error_label, key=None, user=None):
+        """
+        Relay an Ollama generation to the client as coalesced SSE events.
+
+        The relay runs alongside disconnect and cancel watchers; if the client
+        leaves or a newer message supersedes the stream, the relay task is
+        cancelled, which closes the upstream stream and frees the model slot
+        immediately, even while Ollama is still loading the model.
+        """
+        await send({'type': 'http.response.start', 'status': 200, 'headers': SSE_HEADERS})
+
+        async def send_frames(frames):
+            if frames:
+                body = ''.join(frames).encode('utf-8')
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+
+        cancel_event = active_generations.start(key)
+
+        async def relay_stream():
+            generation_scheduler = scheduler.get_scheduler()
+            ticket = None
+            try:
+                # Requests answered before (exactly, or near-duplicates) are replayed from cache;
+                # the lookup may call the embeddings API, so it runs off the event loop
+                cached = await asyncio.get_running_loop().run_in_executor(None, cached_response, payload)
+                if cached is not None:
+                    await send_frames(relay.replay(cached))
+                    return
+
+                # Wait for a slot on this model before opening the upstream stream
+                ticket = generation_scheduler.submit(payload.get('model'), user)
+                await self.wait_for_slot(ticket, send_frames, relay)
+                relay.queue_wait = ticket.queue_wait
+
+                async with self.get_client().stream('POST', api_path, json=payload) as response:
+                    lines = response.aiter_lines()
+                    next_line = None
+                    try:
+                        while True:
+                            # Wait for the next line only until buffered text is due
+                            if next_line is None:
+                                next_line = asyncio.ensure_future(lines.__anext__())
+                            done, _ = await asyncio.wait({next_line}, timeout=relay.flush_timeout())
+                            if not done:
+                                await send_frames(relay.tick())
+                                continue
+                            try:
+                                line = next_line.result()
+                            except StopAsyncIteration:
+                                break
+                            next_line = None
+                            await send_frames(relay.feed(line))
+                    finally:
+                        if next_line is not None:
+                            next_line.cancel()
+
+                # End of stream, with prompt evaluation stats when Ollama reported them
+                await send_frames(relay.finish())
+            except Exception as e:
+                logger.error("Error in %s: %s", error_label, e)
+                await send_frames(relay.error(e))
+            finally:
+                if ticket is not None:
+                    generation_scheduler.release(ticket)
+
+        relay.payload = payload
+        stream_task = asyncio.ensure_future(relay_stream())
+        watch_task = asyncio.ensure_future(self.wait_for_disconnect(receive))
+        cancel_task = asyncio.ensure_future(self.wait_for_cancel(cancel_event))
+        try:
+            done, _ = await asyncio.wait({stream_task, watch_task, cancel_task}, return_when=asyncio.FIRST_COMPLETED)
+            if stream_task not in done:
+                stream_task.cancel()
+                await asyncio.gather(stream_task, return_exceptions=True)
+                if watch_task in done:
+                    relay.cancel('disconnect')
+                    return
+                # A newer message for this conversation superseded this stream
+                await send_frames(relay.cancel('superseded'))
+        finally:
+            watch_task.cancel()
+            cancel_task.cancel()
+            active_generations.finish(key, cancel_event)
+
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+    async def chat(self, scope, receive, send):
+        """Async variant of GET /api/chat."""
+        request = self.make_request(scope)
+        conversation_id = request.args.get('conversation_id')
+        session = self.open_session(request)
+        if not conversation_id:
+            conversation_id = session.get('conversation_id')
+        conversation = conversation_store.get_store().get(conversation_id) or {}
+
+        model = conversation.get('model', 'mistral-7b')
+
+        if not conversation.get('messages'):
+            await self.send_json(send, 400, {"error": "No messages in session. Send a POST request first."})
+            return
+
+        model_params = self.flask_app.config.get('MODEL_PARAMS', {}).get(model, {})
+        api_path, payload = build_conversation_request(conversation, model_params, self.flask_app.config)
+
+        logger.info("Async streaming for model %s via %s", model, api_path)
+        relay = GenerationRelay('chat', flush_policy(conversation, self.flask_app.config),
+                                conversation_id=conversation_id, previous_turn=conversation.get('last_turn'))
+        await self.stream_generation(receive, send, api_path, payload, relay, 'async stream', key=conversation_id,
+                                     user=self.user_key(scope, session))
+
+    async def chat_with_image(self, scope, receive, send):
+        """Async variant of POST /api/chat_with_image."""
+        started_at = time.monotonic()
+        try:
+            try:
+                request = self.make_request(scope, await self.read_body(scope, receive))
+            except RequestEntityTooLarge as e:
+                await self.send_json(send, 413, {"error": e.description})
+                return
+            try:
+                model, prompt, parameters, image_file = parse_image_request(request.form, request.files)
+
+                # Downscaling decodes the image, so it runs off the event loop
+                model_params = self.flask_app.config.get('MODEL_PARAMS', {}).get(model, {})
+                image_data = await asyncio.get_running_loop().run_in_executor(
+                    None, image_pipeline.get_pipeline().process, image_file, model_params
+                )
+            except ValueError as e:
+                await self.send_json(send, 400, {"error": str(e)})
+                return
+
+            relay = GenerationRelay('chat_with_image', flush_policy(request.form, self.flask_app.config),
+                                    started_at=started_at)
+        except Exception as e:
+            logger.error("Error in async chat_with_image: %s", e)
+            await self.send_json(send, 500, {"error": str(e)})
+            return
+
+        logger.info("Async image request with model %s", model)
+        payload = build_generate_payload(model, prompt, parameters, model_params, images=[image_data],
+                                         keep_alive=model_residency.get_manager().keep_alive(
+                                             model, self.flask_app.config.get('OLLAMA_KEEP_ALIVE')))
+        session = self.open_session(request)
+        # Registered under the conversation like chat(), so a newer message or a cancel stops it
+        conversation_id = request.form.get('conversation_id') or session.get('conversation_id')
+        await self.stream_generation(receive, send, 'api/generate', payload, relay, 'async image processing stream',
+                                     key=conversation_id, user=self.user_key(scope, session))
+
+
+def create_asgi_app(flask_app):
+    """Wrap a configured Flask app for serving under an ASGI server such as uvicorn."""
+    return AsyncChatApp(flask_app)
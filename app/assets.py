@@ -0,0 +1,122 @@
+"""
+Static Assets for Free Thinkers
+Resolves page bundles to the fingerprinted files written by build_assets.py and serves
+them precompressed with immutable caching; without a build the source files are used
+"""
+
+import json
+import mimetypes
+import os
+from pathlib import Path
+
+from flask import request, send_from_directory, url_for
+
+from . import log
+
+logger = log.get_logger('assets')
+
+BUNDLES_FILE = 'bundles.json'
+MANIFEST_FILE = 'dist/manifest.json'
+
+# Fingerprinted files never change, so browsers may keep them for a year without revalidating
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Precompressed variants in order of preference: (Content-Encoding, file suffix)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def load_json(path):
+    """Read a JSON file, returning None when it is missing or unreadable."""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class AssetManifest:
+    """
+    Maps bundle names ('index.js') to the URLs a page should load.
+
+    The build manifest records the modification time of every source file;
+    if any source changed after the build, the manifest is ignored so edits
+    show up without a rebuild.
+    """
+
+    def __init__(self, static_dir, use_build=True):
+        """Load the bundle definitions and, when current, the build manifest."""
+        self.static_dir = Path(static_dir)
+        self.bundles = load_json(self.static_dir / BUNDLES_FILE) or {}
+        self.built = {}
+        self.files = set()
+        if use_build:
+            self.load_build()
+
+    def load_build(self):
+        """Use the build manifest unless it is missing or older than its sources."""
+        manifest = load_json(self.static_dir / MANIFEST_FILE)
+        if not manifest:
+            return
+        for name, entry in manifest.get('bundles', {}).items():
+            for source, mtime in entry.get('sources', {}).items():
+                try:
+                    current = os.path.getmtime(self.static_dir / source)
+                except OSError:
+                    current = None
+                if current != mtime:
+                    logger.warning("Asset build is out of date (%s changed); serving source files. "
+                                   "Run build_assets.py to rebuild.", source)
+                    return
+        self.built = {name: entry['file'] for name, entry in manifest.get('bundles', {}).items()}
+        self.files = set(self.built.values())
+        logger.info("Serving %d built asset bundles", len(self.built))
+
+    def urls(self, name):
+        """URLs for a bundle: its built file, or its source files in order."""
+        if name in self.built:
+            return [url_for('static', filename=self.built[name])]
+        return [url_for('static', filename=source) for source in self.bundles.get(name, [])]
+
+    def is_fingerprinted(self, filename):
+        """Check whether a static path is a built, content-hashed file."""
+        return filename in self.files
+
+
+def send_asset(manifest, filename):
+    """
+    Send a static file.
+
+    Built files are sent as their brotli or gzip variant when the client
+    accepts it and marked immutable; everything else is sent as it is, with
+    Flask's usual conditional request handling.
+    """
+    if not manifest.is_fingerprinted(filename):
+        return send_from_directory(manifest.static_dir, filename)
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    for encoding, suffix in ENCODINGS:
+        if encoding in request.accept_encodings and (manifest.static_dir / (filename + suffix)).exists():
+            response = send_from_directory(manifest.static_dir, filename + suffix, mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            response.headers.pop('Content-Disposition', None)
+            break
+    else:
+        response = send_from_directory(manifest.static_dir, filename, mimetype=mimetype)
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_app(app):
+    """Serve static files through the asset manifest and expose asset_urls() to templates."""
+    manifest = AssetManifest(app.static_folder, use_build=app.config.get('STATIC_ASSETS_BUILD', True))
+
+    def serve_static(filename):
+        """Serve static files."""
+        return send_asset(manifest, filename)
+
+    # Replace the view behind Flask's own 'static' endpoint so url_for('static', ...) keeps working
+    app.view_functions['static'] = serve_static
+    app.jinja_env.globals['asset_urls'] = manifest.urls
+    app.extensions['assets'] = manifest
+    return manifest
@@ -0,0 +1,373 @@
+"""
+Batch Runner for Free Thinkers
+Runs lists of prompt jobs (template fills, eval sets) through a bounded worker pool,
+checkpointing every result so an interrupted batch can be resumed where it stopped
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from . import log, metrics, model_residency, ollama_client, scheduler
+from .streaming import OLLAMA_PASSTHROUGH_PARAMS, cached_response, normalize_messages, record_generation, remember_response
+
+logger = log.get_logger('batch')
+
+BATCH_DIR = Path.home() / '.freethinkers' / 'batches'
+
+DEFAULT_CONCURRENCY = 4
+MAX_CONCURRENCY = 16
+MAX_JOBS = 1000
+HISTORY_LIMIT = 50
+
+
+class BatchError(Exception):
+    """Raised when a batch cannot be started or resumed."""
+
+
+class BatchBusyError(BatchError):
+    """Raised when a batch is resumed while it is still running."""
+
+
+def parse_jobs(jobs, defaults=None):
+    """
+    Validate a job list and fill in batch-level defaults.
+
+    Each job needs a prompt (or a messages list) and a model, given on the job
+    or in defaults; params are Ollama options merged over the default params.
+    Raises ValueError with a user-facing message for the first invalid job.
+    """
+    defaults = defaults or {}
+    if not isinstance(jobs, list) or not jobs:
+        raise ValueError("jobs must be a non-empty list")
+    if len(jobs) > MAX_JOBS:
+        raise ValueError(f"A batch may hold at most {MAX_JOBS} jobs")
+
+    parsed = []
+    for index, job in enumerate(jobs):
+        if isinstance(job, str):
+            job = {'prompt': job}
+        if not isinstance(job, dict):
+            raise ValueError(f"Job {index} must be an object or a prompt string")
+        model = job.get('model') or defaults.get('model')
+        if not model:
+            raise ValueError(f"Job {index} has no model")
+        if not job.get('prompt') and not job.get('messages'):
+            raise ValueError(f"Job {index} needs a prompt or messages")
+        params = dict(defaults.get('params') or {}, **(job.get('params') or {}))
+        entry = {'index': index, 'model': model, 'params': params}
+        for field in ('id', 'prompt', 'messages', 'system'):
+            value = job.get(field, defaults.get(field) if field == 'system' else None)
+            if value is not None:
+                entry[field] = value
+        parsed.append(entry)
+    return parsed
+
+
+def build_job_request(job, model_params, keep_alive=None):
+    """Return (api_path, payload) for a non-streaming generation of one job."""
+    options = dict(job['params'])
+    for key in OLLAMA_PASSTHROUGH_PARAMS:
+        if key in model_params and key not in options:
+            options[key] = model_params[key]
+
+    if job.get('messages'):
+        path = 'api/chat'
+        payload = {'model': job['model'], 'messages': normalize_messages(job['messages'], job.get('system'))}
+    else:
+        path = 'api/generate'
+        payload = {'model': job['model'], 'prompt': job['prompt']}
+        if job.get('system'):
+            payload['system'] = job['system']
+    payload['stream'] = False
+    payload['options'] = options
+    if keep_alive:
+        payload['keep_alive'] = keep_alive
+    return path, payload
+
+
+def _round(value, digits=3):
+    """Round a value, passing None through."""
+    return round(value, digits) if value is not None else None
+
+
+class Batch:
+    """
+    One batch and its checkpoint directory.
+
+    batch.json holds the jobs and the latest summary; results.jsonl gets one
+    line per finished job, appended as soon as the job completes.
+    """
+
+    def __init__(self, batch_id, directory):
+        """Initialize a batch stored under directory/batch_id."""
+        self.id = batch_id
+        self.path = Path(directory) / batch_id
+        self.jobs = []
+        self.settings = {}
+        self.summary = {}
+        self.lock = threading.Lock()
+
+    @property
+    def results_path(self):
+        """The batch's results file."""
+        return self.path / 'results.jsonl'
+
+    def load(self):
+        """Read the batch definition and summary from disk."""
+        with open(self.path / 'batch.json', 'r') as f:
+            data = json.load(f)
+        self.jobs = data.get('jobs', [])
+        self.settings = data.get('settings', {})
+        self.summary = data.get('summary', {})
+        return self
+
+    def save(self):
+        """Write the batch definition and summary atomically."""
+        self.path.mkdir(parents=True, exist_ok=True)
+        path = self.path / 'batch.json'
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'id': self.id, 'settings': self.settings, 'summary': self.summary, 'jobs': self.jobs}, f)
+        os.replace(tmp_path, path)
+
+    def results(self):
+        """Yield the checkpointed results in completion order, skipping a torn last line."""
+        if not self.results_path.exists():
+            return
+        with open(self.results_path, 'r') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def completed(self):
+        """Indexes of the jobs that already finished successfully."""
+        return {result['index'] for result in self.results() if result.get('status') == 'ok'}
+
+    def append(self, result):
+        """Checkpoint one result."""
+        with self.lock:
+            with open(self.results_path, 'a') as f:
+                f.write(json.dumps(result) + '\n')
+
+
+class BatchRunner:
+    """
+    Runs batches through a per-batch worker pool.
+
+    Every job holds a scheduler slot for its model under a separate 'batch:'
+    identity, so fair queueing keeps interactive users ahead of a long batch
+    and the per-model concurrency limits still bound the load on Ollama.
+    """
+
+    def __init__(self, client=None, batch_dir=BATCH_DIR, default_concurrency=DEFAULT_CONCURRENCY,
+                 max_concurrency=MAX_CONCURRENCY):
+        """Initialize the runner; the shared Ollama client is used unless one is given."""
+        self.client = client
+        self.batch_dir = Path(batch_dir)
+        self.default_concurrency = default_concurrency
+        self.max_concurrency = max_concurrency
+        self.running = set()
+        self.lock = threading.Lock()
+
+    def ollama(self):
+        """The Ollama client used for batch requests."""
+        return self.client or ollama_client.get_client()
+
+    def create(self, jobs, defaults=None, concurrency=None, user=None):
+        """Validate jobs and checkpoint a new batch; raises ValueError for invalid input."""
+        batch = Batch(uuid.uuid4().hex[:12], self.batch_dir)
+        batch.jobs = parse_jobs(jobs, defaults)
+        batch.settings = {
+            'concurrency': self.concurrency(concurrency),
+            'user': user,
+            'created_at': time.time()
+        }
+        batch.summary = {'status': 'pending', 'total': len(batch.jobs)}
+        batch.save()
+        return batch
+
+    def get(self, batch_id):
+        """Load a batch by id; raises BatchError when it does not exist."""
+        if not batch_id or not batch_id.isalnum():
+            raise BatchError(f"Unknown batch '{batch_id}'")
+        try:
+            return Batch(batch_id, self.batch_dir).load()
+        except (OSError, ValueError):
+            raise BatchError(f"Unknown batch '{batch_id}'")
+
+    def concurrency(self, value):
+        """Clamp a requested worker count to the configured bounds."""
+        if value is None:
+            return self.default_concurrency
+        return max(1, min(int(value), self.max_concurrency))
+
+    def run_job(self, job, model_params, keep_alive, user):
+        """Run one job and return its result record."""
+        path, payload = build_job_request(job, model_params.get(job['model'], {}),
+                                          model_residency.get_manager().keep_alive(job['model'], keep_alive))
+        result = {'index': job['index'], 'model': job['model']}
+        if 'id' in job:
+            result['id'] = job['id']
+        started = time.perf_counter()
+
+        try:
+            cached = cached_response(payload)
+            if cached is not None:
+                result.update(status='ok', output=cached['response'], cached=True,
+                              eval_count=(cached.get('stats') or {}).get('eval_count'))
+            else:
+                with scheduler.get_scheduler().slot(job['model'], user) as ticket:
+                    response = self.ollama().post(path, json=payload, timeout=ollama_client.STREAM_TIMEOUT)
+                if response.status_code != 200:
+                    raise BatchError(f"Ollama returned {response.status_code}: {response.text[:200]}")
+                body = response.json()
+                if body.get('error'):
+                    raise BatchError(body['error'])
+                output = body.get('message', {}).get('content', '') if path == 'api/chat' else body.get('response', '')
+                record_generation('batch', job['model'], body, ticket.queue_wait)
+                if output:
+                    remember_response(payload, output, {'eval_count': body.get('eval_count')})
+                result.update(status='ok', output=output, cached=False, eval_count=body.get('eval_count'),
+                              prompt_eval_count=body.get('prompt_eval_count'), queue_wait=_round(ticket.queue_wait))
+        except Exception as e:
+            result.update(status='error', error=str(e))
+
+        result['duration'] = _round(time.perf_counter() - started)
+        metrics.increment('batch_jobs_total', model=job['model'], status=result['status'])
+        return result
+
+    def run(self, batch, model_params=None, keep_alive=None):
+        """
+        Run the unfinished jobs of a batch, yielding records as they happen.
+
+        Yields a 'batch' record first, then one 'result' record per job in
+        completion order, then a 'summary' record with the throughput. Jobs
+        that completed in an earlier run are skipped and failed ones retried.
+        If the consumer stops early, queued jobs are cancelled; jobs already
+        running still finish and are checkpointed. Close the generator when
+        the consumer goes away, even before the first record was read, so the
+        batch stops counting as running and can be resumed.
+        """
+        with self.lock:
+            if batch.id in self.running:
+                raise BatchBusyError(f"Batch '{batch.id}' is already running")
+            self.running.add(batch.id)
+
+        model_params = model_params or {}
+        user = f"batch:{batch.settings.get('user') or batch.id}"
+        done = batch.completed()
+        pending = [job for job in batch.jobs if job['index'] not in done]
+        concurrency = batch.settings.get('concurrency', self.default_concurrency)
+        results = queue.Queue()
+        executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"batch-{batch.id}")
+        counts = {'ok': 0, 'error': 0, 'cached': 0}
+        eval_tokens = 0
+        started = time.perf_counter()
+        status = 'interrupted'
+
+        def work(job):
+            # Always hand a record back, even if checkpointing fails, so the consumer never waits forever
+            result = {'index': job['index'], 'model': job['model'], 'status': 'error', 'error': 'Job did not finish'}
+            try:
+                result = self.run_job(job, model_params, keep_alive, user)
+                batch.append(result)
+            except Exception as e:
+                # An unsaved result counts as failed, so resuming the batch runs the job again
+                logger.error("Batch %s: job %s failed: %s", batch.id, job['index'], e)
+                result = dict(result, status='error', error=str(e))
+            finally:
+                results.put(result)
+
+        try:
+            batch.summary.update(status='running', resumed=len(done))
+            batch.save()
+            logger.info("Batch %s: running %d of %d jobs with %d workers",
+                        batch.id, len(pending), len(batch.jobs), concurrency)
+            yield {'type': 'batch', 'batch_id': batch.id, 'total': len(batch.jobs),
+                   'pending': len(pending), 'resumed': len(done), 'concurrency': concurrency}
+
+            for job in pending:
+                executor.submit(work, job)
+            for _ in pending:
+                result = results.get()
+                counts[result['status']] += 1
+                if result.get('cached'):
+                    counts['cached'] += 1
+                eval_tokens += result.get('eval_count') or 0
+                yield dict(result, type='result')
+            status = 'completed' if not counts['error'] else 'completed_with_errors'
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            elapsed = time.perf_counter() - started
+            finished = counts['ok'] + counts['error']
+            batch.summary.update({
+                'status': status,
+                'total': len(batch.jobs),
+                'completed': len(done) + counts['ok'],
+                'failed': counts['error'],
+                'cached': counts['cached'],
+                'elapsed': _round(elapsed),
+                'jobs_per_second': _round(finished / elapsed if elapsed else None, 2),
+                'tokens_per_second': _round(eval_tokens / elapsed if elapsed else None, 2),
+                'finished_at': time.time()
+            })
+            batch.save()
+            with self.lock:
+                self.running.discard(batch.id)
+            logger.info("Batch %s %s: %d ok, %d failed in %.1fs (%.2f jobs/s)", batch.id, status,
+                        counts['ok'], counts['error'], elapsed, batch.summary['jobs_per_second'] or 0)
+
+        yield dict(batch.summary, type='summary', batch_id=batch.id)
+
+    def status(self, batch_id):
+        """Return a batch's settings and latest summary."""
+        batch = self.get(batch_id)
+        return dict(batch.summary, id=batch.id, settings=batch.settings, running=batch.id in self.running)
+
+    def history(self, limit=HISTORY_LIMIT):
+        """Return the summaries of recent batches, newest first."""
+        if not self.batch_dir.exists():
+            return []
+        batches = []
+        for path in self.batch_dir.iterdir():
+            try:
+                batches.append(self.status(path.name))
+            except BatchError:
+                continue
+        batches.sort(key=lambda batch: batch['settings'].get('created_at', 0), reverse=True)
+        return batches[:limit]
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_runner():
+    """Return the process-wide batch runner, creating it on first use."""
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = BatchRunner()
+    return _runner
+
+
+def init_app(app):
+    """Configure the shared batch runner from the Flask app config."""
+    global _runner
+    runner = BatchRunner(
+        default_concurrency=app.config.get('BATCH_CONCURRENCY', DEFAULT_CONCURRENCY),
+        max_concurrency=app.config.get('BATCH_MAX_CONCURRENCY', MAX_CONCURRENCY)
+    )
+    with _runner_lock:
+        _runner = runner
+    app.extensions['batch_runner'] = runner
+    return runner
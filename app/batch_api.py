@@ -0,0 +1,88 @@
+"""
+API routes for batch generation in Free Thinkers
+"""
+
+import json
+
+from flask import Blueprint, Response, current_app, jsonify, request
+
+from . import batch, scheduler
+
+batch_api = Blueprint('batch_api', __name__, url_prefix='/api/batch')
+
+
+def ndjson(records):
+    """Serialize records as newline-delimited JSON."""
+    for record in records:
+        yield json.dumps(record) + '\n'
+
+
+# POST /api/batch
+@batch_api.route('', methods=['POST'])
+def run_batch():
+    """
+    Start a batch, or resume one by batch_id, streaming NDJSON records.
+
+    The body is {"jobs": [...], "model": ..., "params": {...}, "system": ...,
+    "concurrency": n}, where model, params and system are defaults for the jobs.
+    """
+    data = request.get_json(silent=True) or {}
+    runner = batch.get_runner()
+
+    try:
+        if data.get('batch_id'):
+            job_batch = runner.get(data['batch_id'])
+        else:
+            defaults = {key: data[key] for key in ('model', 'params', 'system') if key in data}
+            job_batch = runner.create(data.get('jobs'), defaults, data.get('concurrency'),
+                                      user=scheduler.current_user_key())
+    except batch.BatchError as e:
+        return jsonify({'error': str(e)}), 404
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    records = runner.run(job_batch, current_app.config.get('MODEL_PARAMS', {}),
+                         current_app.config.get('OLLAMA_KEEP_ALIVE'))
+    try:
+        # Start the run here so a batch that is already running is refused with a status code
+        first = next(records)
+    except batch.BatchBusyError as e:
+        return jsonify({'error': str(e)}), 409
+
+    def stream():
+        yield json.dumps(first) + '\n'
+        yield from ndjson(records)
+
+    response = Response(stream(), mimetype='application/x-ndjson', headers={'X-Accel-Buffering': 'no'})
+    # Ends the run (and frees the batch for resuming) when the client leaves, however early
+    response.call_on_close(records.close)
+    return response
+
+
+# GET /api/batch
+@batch_api.route('', methods=['GET'])
+def list_batches():
+    """List recent batches with their summaries."""
+    limit = request.args.get('limit', batch.HISTORY_LIMIT, type=int)
+    return jsonify({'batches': batch.get_runner().history(limit=limit)})
+
+
+# GET /api/batch/<batch_id>
+@batch_api.route('/<batch_id>', methods=['GET'])
+def batch_status(batch_id):
+    """Return a batch's status and throughput summary."""
+    try:
+        return jsonify(batch.get_runner().status(batch_id))
+    except batch.BatchError as e:
+        return jsonify({'error': str(e)}), 404
+
+
+# GET /api/batch/<batch_id>/results
+@batch_api.route('/<batch_id>/results', methods=['GET'])
+def batch_results(batch_id):
+    """Return a batch's checkpointed results as NDJSON, in completion order."""
+    try:
+        job_batch = batch.get_runner().get(batch_id)
+    except batch.BatchError as e:
+        return jsonify({'error': str(e)}), 404
+    return Response(ndjson(job_batch.results()), mimetype='application/x-ndjson')
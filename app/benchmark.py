@@ -0,0 +1,315 @@
+"""
+Benchmark Runner for Free Thinkers
+Measures a model under a parameter profile against the local Ollama server: cold load
+versus warm time to first token, generation speed and peak Ollama memory, with every
+run persisted so results can be compared over time and across profiles
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import psutil
+
+from . import log, ollama_client, parameter_profiles, scheduler
+from .context_manager import APPROX_CHARS_PER_TOKEN
+
+logger = log.get_logger('benchmark')
+
+BENCHMARK_DIR = Path.home() / '.freethinkers' / 'benchmarks'
+
+BENCHMARK_TYPES = ('token_generation', 'memory_usage', 'inference_time', 'comprehensive')
+DEFAULT_ITERATIONS = 3
+MAX_ITERATIONS = 20
+DEFAULT_PROMPT_TOKENS = 256
+MAX_PROMPT_TOKENS = 8192
+DEFAULT_OUTPUT_TOKENS = 128
+MAX_OUTPUT_TOKENS = 4096
+BENCHMARK_SEED = 42
+BENCHMARK_USER = 'benchmark'
+MEMORY_SAMPLE_INTERVAL = 0.1  # Seconds between Ollama RSS samples
+HISTORY_LIMIT = 50
+
+# Parameter profile names that differ from Ollama option names
+PROFILE_OPTION_NAMES = {
+    'repetition_penalty': 'repeat_penalty',
+    'context_window': 'num_ctx'
+}
+
+BENCHMARK_TEXT = (
+    "The committee reviewed the quarterly figures for the northern warehouse. "
+    "Deliveries arrived late on three occasions because of flooding on the coast road. "
+    "A new scheduling system was proposed to balance the load between the two depots. "
+    "Staff asked for clearer guidance on handling fragile and temperature sensitive goods. "
+    "The budget for the next year includes two additional trucks and a training programme. "
+)
+
+
+class BenchmarkError(Exception):
+    """Raised when Ollama rejects or fails a benchmark generation."""
+
+
+def build_prompt(tokens, salt=0):
+    """
+    Build a prompt of roughly the requested number of tokens.
+
+    The salt goes first so consecutive iterations do not share a prefix and
+    every run pays for a full prompt evaluation instead of reusing Ollama's cache.
+    """
+    header = f"Notes {salt}. Summarize these notes, then continue writing about them in detail.\n\n"
+    target_chars = max(tokens * APPROX_CHARS_PER_TOKEN - len(header), 0)
+    repeats = target_chars // len(BENCHMARK_TEXT) + 1
+    return header + (BENCHMARK_TEXT * repeats)[:target_chars]
+
+
+def profile_options(profile, model):
+    """Translate a parameter profile into Ollama options (empty for the model's defaults)."""
+    if not profile:
+        return {}
+    parameters = parameter_profiles.get_profile(profile, model)
+    return {PROFILE_OPTION_NAMES.get(name, name): value for name, value in parameters.items()}
+
+
+def ollama_processes():
+    """Return the running Ollama server and runner processes visible to this user."""
+    processes = []
+    for process in psutil.process_iter(['name']):
+        if 'ollama' in (process.info.get('name') or '').lower():
+            processes.append(process)
+    return processes
+
+
+class MemorySampler:
+    """Samples the combined RSS of the Ollama processes in a background thread and keeps the peak."""
+
+    def __init__(self, interval=MEMORY_SAMPLE_INTERVAL):
+        """Initialize the sampler; nothing is sampled until start()."""
+        self.interval = interval
+        self.peak_bytes = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def sample(self):
+        """Record one sample; returns the combined RSS in bytes, or None without Ollama processes."""
+        total = None
+        for process in ollama_processes():
+            try:
+                total = (total or 0) + process.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        if total is not None and (self.peak_bytes is None or total > self.peak_bytes):
+            self.peak_bytes = total
+        return total
+
+    def run(self):
+        """Sample until stopped."""
+        while not self.stop_event.is_set():
+            self.sample()
+            self.stop_event.wait(self.interval)
+
+    def start(self):
+        """Start sampling in the background."""
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name='benchmark-memory', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop sampling and return the peak RSS in MB (None if Ollama is not a local process)."""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.sample()
+        return round(self.peak_bytes / (1024 * 1024)) if self.peak_bytes is not None else None
+
+
+def _mean(values):
+    """Mean of the non-empty values, or None."""
+    values = [value for value in values if value is not None]
+    return sum(values) / len(values) if values else None
+
+
+def _round(value, digits=3):
+    """Round a measurement that may be missing."""
+    return round(value, digits) if value is not None else None
+
+
+class BenchmarkRunner:
+    """
+    Runs benchmarks and keeps their results.
+
+    A run optionally unloads the model first and times the cold load, then
+    streams a number of warm iterations, all on one Ollama backend. Every
+    scheduler slot for the model is held for the whole run (generations
+    already running finish first), so no user generation on the model
+    overlaps the measurements.
+    """
+
+    def __init__(self, client=None, results_dir=BENCHMARK_DIR):
+        """Initialize the runner; the shared Ollama client is used unless one is given."""
+        self.client = client
+        self.results_dir = Path(results_dir)
+
+    def ollama(self):
+        """The Ollama client used for benchmark requests."""
+        return self.client or ollama_client.get_client()
+
+    def unload(self, model, backend=None):
+        """Ask Ollama to evict the model so the next request pays the full load time."""
+        response = self.ollama().generate({'model': model, 'keep_alive': 0}, timeout=ollama_client.GENERATE_TIMEOUT,
+                                          backend=backend)
+        if response.status_code != 200:
+            raise BenchmarkError(f"Could not unload '{model}': {response.status_code} {response.text[:200]}")
+
+    def run_once(self, model, prompt, options, backend=None):
+        """Stream one generation (on backend, when given) and return its timings."""
+        payload = {'model': model, 'prompt': prompt, 'stream': True, 'options': options}
+        started = time.perf_counter()
+        first_token_at = None
+        final = None
+
+        with self.ollama().generate(payload, stream=True, backend=backend) as response:
+            if response.status_code != 200:
+                raise BenchmarkError(f"Ollama returned {response.status_code}: {response.text[:200]}")
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get('error'):
+                    raise BenchmarkError(chunk['error'])
+                if first_token_at is None and chunk.get('response'):
+                    first_token_at = time.perf_counter()
+                if chunk.get('done'):
+                    final = chunk
+                    break
+
+        finished = time.perf_counter()
+        if final is None:
+            raise BenchmarkError("Ollama closed the stream before the generation finished")
+
+        eval_count = final.get('eval_count') or 0
+        eval_duration = (final.get('eval_duration') or 0) / 1e9
+        prompt_eval_count = final.get('prompt_eval_count') or 0
+        prompt_eval_duration = (final.get('prompt_eval_duration') or 0) / 1e9
+        return {
+            'ttft': _round(first_token_at - started if first_token_at is not None else None),
+            'total_time': _round(finished - started),
+            'load_time': _round((final.get('load_duration') or 0) / 1e9),
+            'prompt_tokens': prompt_eval_count,
+            'output_tokens': eval_count,
+            'tokens_per_second': _round(eval_count / eval_duration if eval_duration else None, 2),
+            'prompt_tokens_per_second': _round(prompt_eval_count / prompt_eval_duration if prompt_eval_duration else None, 2)
+        }
+
+    def run(self, model, profile='', benchmark_type='token_generation', iterations=DEFAULT_ITERATIONS,
+            prompt_tokens=DEFAULT_PROMPT_TOKENS, output_tokens=DEFAULT_OUTPUT_TOKENS, cold_start=True):
+        """
+        Benchmark a model and persist the result.
+
+        Every run measures all metrics; benchmark_type is recorded so runs of
+        the same kind can be compared. Raises ValueError for invalid settings
+        and BenchmarkError when Ollama fails.
+        """
+        if benchmark_type not in BENCHMARK_TYPES:
+            raise ValueError(f"Unknown benchmark type '{benchmark_type}'")
+        if not 1 <= iterations <= MAX_ITERATIONS:
+            raise ValueError(f"Iterations must be between 1 and {MAX_ITERATIONS}")
+        if not 1 <= prompt_tokens <= MAX_PROMPT_TOKENS:
+            raise ValueError(f"Prompt length must be between 1 and {MAX_PROMPT_TOKENS} tokens")
+        if not 1 <= output_tokens <= MAX_OUTPUT_TOKENS:
+            raise ValueError(f"Output length must be between 1 and {MAX_OUTPUT_TOKENS} tokens")
+
+        options = dict(profile_options(profile, model), num_predict=output_tokens, seed=BENCHMARK_SEED)
+        started_at = time.time()
+        sampler = MemorySampler()
+        cold = None
+        runs = []
+
+        with scheduler.get_scheduler().slot(model, BENCHMARK_USER, exclusive=True) as ticket:
+            # The unload and every timed generation go to the same backend
+            backend = self.ollama().registry.choose(model).url
+            sampler.start()
+            try:
+                if cold_start:
+                    self.unload(model, backend)
+                    cold = self.run_once(model, build_prompt(prompt_tokens, salt=0), options, backend)
+                for iteration in range(1, iterations + 1):
+                    runs.append(self.run_once(model, build_prompt(prompt_tokens, salt=iteration), options, backend))
+            finally:
+                peak_memory_mb = sampler.stop()
+
+        eval_tokens = sum(run['output_tokens'] for run in runs)
+        result = {
+            'id': uuid.uuid4().hex[:12],
+            'status': 'success',
+            'model': model,
+            'backend': backend,
+            'profile': profile,
+            'type': benchmark_type,
+            'iterations': iterations,
+            'options': options,
+            'queue_wait': _round(ticket.queue_wait),
+            'cold': cold,
+            'warm_ttft': _round(_mean(run['ttft'] for run in runs)),
+            'tokens_per_second': _round(_mean(run['tokens_per_second'] for run in runs), 2),
+            'prompt_tokens_per_second': _round(_mean(run['prompt_tokens_per_second'] for run in runs), 2),
+            'avg_inference_time': _round(_mean(run['total_time'] for run in runs)),
+            'peak_memory_mb': peak_memory_mb,
+            'prompt_length': round(_mean(run['prompt_tokens'] for run in runs) or 0),
+            'response_length': round(eval_tokens / len(runs)),
+            'total_tokens': sum(run['prompt_tokens'] + run['output_tokens'] for run in runs),
+            'runs': runs,
+            'duration': _round(time.time() - started_at),
+            'timestamp': started_at
+        }
+        self.save(result)
+        logger.info("Benchmark %s: %s (%s) %.2f tok/s, warm TTFT %ss",
+                    result['id'], model, profile or 'default', result['tokens_per_second'] or 0, result['warm_ttft'])
+        return result
+
+    def save(self, result):
+        """Write a result to the results directory."""
+        self.results_dir.mkdir(parents=True, exist_ok=True)
+        path = self.results_dir / f"{int(result['timestamp'])}-{result['id']}.json"
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(result, f)
+        os.replace(tmp_path, path)
+
+    def history(self, model=None, profile=None, benchmark_type=None, limit=HISTORY_LIMIT):
+        """Return saved results, newest first, optionally filtered by model, profile and type."""
+        if not self.results_dir.exists():
+            return []
+        results = []
+        for path in sorted(self.results_dir.glob('*.json'), reverse=True):
+            try:
+                with open(path, 'r') as f:
+                    result = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if model and result.get('model') != model:
+                continue
+            if profile is not None and result.get('profile') != profile:
+                continue
+            if benchmark_type and result.get('type') != benchmark_type:
+                continue
+            results.append(result)
+            if len(results) >= limit:
+                break
+        return results
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_runner():
+    """Return the process-wide benchmark runner, creating it on first use."""
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = BenchmarkRunner()
+    return _runner
@@ -0,0 +1,276 @@
+"""
+Message Blob Store for Free Thinkers
+Keeps each distinct chat message once, addressed by the hash of its content; history
+threads and context summaries hold ordered lists of those hashes. Blobs are packed in
+one SQLite database, reference counted and deleted as soon as nothing refers to them
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+from . import log, metrics, storage_codec
+
+logger = log.get_logger('blobs')
+
+BLOB_DIR = Path(os.path.expanduser("~/.freethinkers/blobs/"))
+REFS_DB = 'refs.db'  # Blobs and their reference counts, inside BLOB_DIR
+SQLITE_BUSY_TIMEOUT = 10
+
+# Hashes looked up per query (below SQLite's default limit of bound parameters)
+READ_BATCH_SIZE = 500
+
+# Smaller messages are stored plain; a compression header would cost more than it saves
+COMPRESS_MIN_BYTES = 256
+
+# Decoded blobs kept in memory; content never changes, so cached entries are never stale
+CACHE_BYTES = 8 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    refs INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    data BLOB
+);
+CREATE INDEX IF NOT EXISTS unreferenced_blobs ON blobs (hash) WHERE refs <= 0;
+"""
+
+
+def canonical(message):
+    """The bytes a message is stored and hashed as: JSON with sorted keys."""
+    return json.dumps(message, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def message_hash(message):
+    """Content address of a message."""
+    return hashlib.sha256(canonical(message)).hexdigest()
+
+
+class BlobStore:
+    """
+    Messages packed in SQLite (BLOB_DIR/refs.db), one row per distinct
+    message holding its stored bytes and its reference count.
+
+    Reading a thread fetches all of its messages with a few batched queries
+    instead of opening a file per message. Every hash listed in a thread or
+    summary file counts as one reference. Callers add references (put)
+    before writing a file that lists them and drop them (release) after that
+    file is rewritten or removed, so a crash in between can only leave a
+    count too high, which recount() repairs. Counting and deleting happen
+    under SQLite's write lock, so a blob is never deleted while another save
+    is adding a reference to it.
+    """
+
+    def __init__(self, directory=BLOB_DIR):
+        """Open (or create) the blob database, packing blobs left as files by older versions."""
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.local = threading.local()
+        self.cache = OrderedDict()
+        self.cache_bytes = 0
+        self.cache_lock = threading.Lock()
+        db = self.connection()
+        db.executescript(SCHEMA)
+        if 'data' not in {row[1] for row in db.execute('PRAGMA table_info(blobs)')}:
+            db.execute('ALTER TABLE blobs ADD COLUMN data BLOB')
+        self._pack_files()
+
+    def connection(self):
+        """The calling thread's connection (autocommit; writes go through transaction())."""
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.directory / REFS_DB, timeout=SQLITE_BUSY_TIMEOUT, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self.local.db = db
+        return db
+
+    @contextmanager
+    def transaction(self):
+        """Hold the database write lock for the duration of the block."""
+        db = self.connection()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def _pack_files(self):
+        """Move blobs stored one file each under <first two hex digits>/<hash> into the database."""
+        shards = [path for path in self.directory.glob('??') if path.is_dir()]
+        if not shards:
+            return
+        packed = 0
+        with self.transaction() as db:
+            for shard in shards:
+                for path in shard.iterdir():
+                    if not path.name.endswith('.tmp'):
+                        with open(path, 'rb') as f:
+                            packed += db.execute('UPDATE blobs SET data = ? WHERE hash = ? AND data IS NULL',
+                                                 (f.read(), path.name)).rowcount
+        # Files are removed only once the database holds their content
+        for shard in shards:
+            for path in shard.iterdir():
+                path.unlink()
+            shard.rmdir()
+        logger.info("Packed %d message blob files into %s", packed, REFS_DB)
+
+    def _encode(self, data):
+        if len(data) >= COMPRESS_MIN_BYTES:
+            return storage_codec.default_codec().compress(data)
+        return data
+
+    def put(self, messages):
+        """Store messages, adding one reference per occurrence; returns their hashes in order."""
+        blobs = {}
+        refs = []
+        for message in messages:
+            data = canonical(message)
+            ref = hashlib.sha256(data).hexdigest()
+            blobs[ref] = data
+            refs.append(ref)
+        if not refs:
+            return refs
+
+        with self.transaction() as db:
+            known = set()
+            unique = list(blobs)
+            for start in range(0, len(unique), READ_BATCH_SIZE):
+                batch = unique[start:start + READ_BATCH_SIZE]
+                known.update(row[0] for row in db.execute(
+                    f"SELECT hash FROM blobs WHERE hash IN ({','.join('?' * len(batch))})", batch))
+            new = [ref for ref in unique if ref not in known]
+            db.executemany('INSERT INTO blobs (hash, refs, size, data) VALUES (?, 0, ?, ?)',
+                           [(ref, len(blobs[ref]), self._encode(blobs[ref])) for ref in new])
+            db.executemany('UPDATE blobs SET refs = refs + 1 WHERE hash = ?', [(ref,) for ref in refs])
+        if new:
+            metrics.increment('message_blobs_written_total', len(new))
+        return refs
+
+    def _cached(self, ref, data=None):
+        """Look up a decoded blob in the cache, or add one."""
+        with self.cache_lock:
+            if data is None:
+                data = self.cache.get(ref)
+                if data is not None:
+                    self.cache.move_to_end(ref)
+                return data
+            if ref not in self.cache:
+                self.cache[ref] = data
+                self.cache_bytes += len(data)
+                while self.cache_bytes > CACHE_BYTES and len(self.cache) > 1:
+                    self.cache_bytes -= len(self.cache.popitem(last=False)[1])
+            return data
+
+    def read_many(self, refs):
+        """
+        The stored bytes of several blobs, as {hash: bytes}, read with one
+        query per READ_BATCH_SIZE hashes not already cached. Raises
+        FileNotFoundError for an unknown hash.
+        """
+        found = {}
+        missing = []
+        for ref in dict.fromkeys(refs):
+            data = self._cached(ref)
+            if data is None:
+                missing.append(ref)
+            else:
+                found[ref] = data
+        db = self.connection()
+        for start in range(0, len(missing), READ_BATCH_SIZE):
+            batch = missing[start:start + READ_BATCH_SIZE]
+            for ref, data in db.execute(
+                    f"SELECT hash, data FROM blobs WHERE hash IN ({','.join('?' * len(batch))}) AND data IS NOT NULL",
+                    batch):
+                found[ref] = self._cached(ref, storage_codec.decode(data))
+        unknown = [ref for ref in missing if ref not in found]
+        if unknown:
+            raise FileNotFoundError(f"{len(unknown)} message blobs are missing, e.g. {unknown[0]}")
+        return found
+
+    def read(self, ref):
+        """The stored bytes of one blob; raises FileNotFoundError for an unknown hash."""
+        return self.read_many([ref])[ref]
+
+    def get(self, refs):
+        """Messages for a list of hashes, in order; each is a separate object."""
+        found = self.read_many(refs)
+        return [json.loads(found[ref]) for ref in refs]
+
+    def release(self, refs):
+        """Drop one reference per listed hash and delete blobs nothing refers to any more."""
+        if not refs:
+            return 0
+        with self.transaction() as db:
+            db.executemany('UPDATE blobs SET refs = refs - 1 WHERE hash = ?', [(ref,) for ref in refs])
+            return self._collect(db, set(refs))
+
+    def collect(self):
+        """Delete every blob without references; returns how many were deleted."""
+        with self.transaction() as db:
+            return self._collect(db)
+
+    def _collect(self, db, refs=None):
+        if refs is None:
+            unreferenced = [row[0] for row in db.execute('SELECT hash FROM blobs WHERE refs <= 0')]
+        else:
+            unreferenced = [ref for ref in refs
+                            if db.execute('SELECT 1 FROM blobs WHERE hash = ? AND refs <= 0', (ref,)).fetchone()]
+        db.executemany('DELETE FROM blobs WHERE hash = ?', [(ref,) for ref in unreferenced])
+        if unreferenced:
+            metrics.increment('message_blobs_deleted_total', len(unreferenced))
+        return len(unreferenced)
+
+    def recount(self, counts):
+        """
+        Replace every reference count with counts (hash -> references found
+        in live files), then delete unreferenced blobs.
+
+        Returns the number of blobs deleted.
+        """
+        with self.transaction() as db:
+            db.execute('UPDATE blobs SET refs = 0')
+            db.executemany('UPDATE blobs SET refs = ? WHERE hash = ?',
+                           [(count, ref) for ref, count in counts.items()])
+            deleted = self._collect(db)
+            known = {row[0] for row in db.execute('SELECT hash FROM blobs WHERE data IS NOT NULL')}
+        missing = [ref for ref in counts if ref not in known]
+        if missing:
+            logger.warning("%d referenced message blobs are missing", len(missing))
+        return deleted
+
+    def stats(self):
+        """Number of blobs, their total (uncompressed) size and total references."""
+        blobs, size, refs = self.connection().execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(refs), 0) FROM blobs'
+        ).fetchone()
+        return {'blobs': blobs, 'bytes': size, 'references': refs}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Get the shared blob store."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = BlobStore()
+    return _store
+
+
+def init_app(app):
+    """Open the blob store and register it on the app."""
+    store = get_store()
+    app.extensions['blob_store'] = store
+    return store
@@ -11,6 +11,8 @@ import re
 from datetime import datetime
 import hashlib
 
+from . import blob_store, storage_codec
+
 # Initialize NLTK for text processing (download if not already present)
 try:
     nltk.data.find('tokenizers/punkt')
@@ -23,7 +25,8 @@ TOKENS_PER_MESSAGE = 4  # Overhead tokens per message for role, formatting, etc.
 APPROX_CHARS_PER_TOKEN = 4  # Approximate number of characters per token
 AGGRESSIVE_SUMMARIZATION_THRESHOLD = 0.85  # When to use aggressive summarization (% of context window)
 
-# Directory for storing summaries
+# Directory for storing summaries (<thread_id>.json, compressed by the storage codec);
+# summarized messages are stored in the blob store and listed by hash
 SUMMARIES_DIR = Path(os.path.expanduser("~/.freethinkers/summaries/"))
 SETTINGS_FILE = Path(os.path.expanduser("~/.freethinkers/context_settings.json"))
 
@@ -56,12 +59,13 @@ class ContextManager:
             if not SUMMARIES_DIR.exists():
                 return
                 
-            for file in SUMMARIES_DIR.glob("*.json"):
+            for thread_id, file in storage_codec.find_all(SUMMARIES_DIR).items():
                 try:
-                    with open(file, 'r') as f:
-                        summary_data = json.load(f)
-                        thread_id = file.stem
-                        self.summaries[thread_id] = summary_data
+                    summary_data = storage_codec.read_json(file)
+                    if 'summarized_message_refs' in summary_data:
+                        summary_data['summarized_messages'] = blob_store.get_store().get(
+                            summary_data.pop('summarized_message_refs'))
+                    self.summaries[thread_id] = summary_data
                 except Exception as e:
                     print(f"Error loading summary file {file}: {e}")
         except Exception as e:
@@ -108,9 +112,15 @@ class ContextManager:
     def save_summary(self, thread_id, summary_data):
         """Save a conversation summary to disk."""
         try:
+            blobs = blob_store.get_store()
             summary_file = SUMMARIES_DIR / f"{thread_id}.json"
-            with open(summary_file, 'w') as f:
-                json.dump(summary_data, f, indent=2)
+            previous = storage_codec.find(summary_file)
+            old_refs = storage_codec.read_json(previous).get('summarized_message_refs', []) if previous else []
+            
+            stored = {key: value for key, value in summary_data.items() if key != 'summarized_messages'}
+            stored['summarized_message_refs'] = blobs.put(summary_data.get('summarized_messages', []))
+            storage_codec.write_json(summary_file, stored)
+            blobs.release(old_refs)
         except Exception as e:
             print(f"Error saving summary: {e}")
     
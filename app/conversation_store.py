@@ -0,0 +1,204 @@
+"""
+Conversation State Store for Free Thinkers
+Server-side storage for in-flight chat state keyed by an opaque conversation id,
+so requests carry a small handle instead of the full message list
+"""
+
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+# Constants
+STATE_DIR = Path(os.path.expanduser("~/.freethinkers/chat_state/"))
+MAX_MEMORY_CONVERSATIONS = 256
+STATE_MAX_AGE = 7 * 24 * 3600  # Persistent state older than a week is pruned
+
+
+class MemoryTier:
+    """Bounded in-memory LRU of conversation records."""
+
+    def __init__(self, max_size=MAX_MEMORY_CONVERSATIONS):
+        """Initialize an empty LRU."""
+        self.max_size = max_size
+        self.records = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, conversation_id):
+        """Return a record and mark it most recently used."""
+        with self.lock:
+            record = self.records.get(conversation_id)
+            if record is not None:
+                self.records.move_to_end(conversation_id)
+            return record
+
+    def put(self, conversation_id, record):
+        """Store a record, evicting the least recently used ones over capacity."""
+        with self.lock:
+            self.records[conversation_id] = record
+            self.records.move_to_end(conversation_id)
+            while len(self.records) > self.max_size:
+                self.records.popitem(last=False)
+
+    def delete(self, conversation_id):
+        """Remove a record if present."""
+        with self.lock:
+            self.records.pop(conversation_id, None)
+
+
+class FileTier:
+    """Persistent tier storing one compact JSON file per conversation."""
+
+    def __init__(self, directory=STATE_DIR):
+        """Initialize the tier and make sure its directory exists."""
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def path(self, conversation_id):
+        """Get the path to a conversation's state file."""
+        return self.directory / f"{conversation_id}.json"
+
+    def get(self, conversation_id):
+        """Load a record from disk, or None if it does not exist."""
+        try:
+            with open(self.path(conversation_id), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Error loading conversation state {conversation_id}: {e}")
+            return None
+
+    def put(self, conversation_id, record):
+        """Write a record atomically so readers never see a partial file."""
+        path = self.path(conversation_id)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(record, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    def delete(self, conversation_id):
+        """Remove a record from disk if present."""
+        try:
+            self.path(conversation_id).unlink()
+        except FileNotFoundError:
+            pass
+
+    def prune(self, max_age=STATE_MAX_AGE):
+        """Delete state files that have not been touched for max_age seconds."""
+        cutoff = time.time() - max_age
+        for file in self.directory.glob("*.json"):
+            try:
+                if file.stat().st_mtime < cutoff:
+                    file.unlink()
+            except OSError:
+                continue
+
+
+class ConversationStore:
+    """
+    Two-tier conversation store: an LRU in front of an optional persistent tier.
+
+    Writes go through to the persistent tier so other worker processes can
+    serve the follow-up streaming request; reads are served from memory
+    whenever possible.
+    """
+
+    def __init__(self, memory=None, persistent=None):
+        """Initialize the store with its tiers."""
+        self.memory = memory or MemoryTier()
+        self.persistent = persistent
+
+    @staticmethod
+    def new_id():
+        """Generate an opaque, unguessable conversation id."""
+        return secrets.token_urlsafe(16)
+
+    @staticmethod
+    def is_valid_id(conversation_id):
+        """Check that an id is safe to use as a file name."""
+        return bool(conversation_id) and len(conversation_id) <= 64 and \
+            all(c.isalnum() or c in '-_' for c in conversation_id)
+
+    def get(self, conversation_id):
+        """Return the record for a conversation, or None."""
+        if not self.is_valid_id(conversation_id):
+            return None
+
+        record = self.memory.get(conversation_id)
+        if record is None and self.persistent is not None:
+            record = self.persistent.get(conversation_id)
+            if record is not None:
+                self.memory.put(conversation_id, record)
+        return record
+
+    def save(self, conversation_id, record):
+        """Store a record under an id, creating a new id when none is given."""
+        if not self.is_valid_id(conversation_id):
+            conversation_id = self.new_id()
+
+        record = dict(record, updated_at=time.time())
+        self.memory.put(conversation_id, record)
+        if self.persistent is not None:
+            try:
+                self.persistent.put(conversation_id, record)
+            except OSError as e:
+                print(f"Error persisting conversation state {conversation_id}: {e}")
+        return conversation_id
+
+    def update(self, conversation_id, **fields):
+        """Merge fields into an existing record; returns False if it does not exist."""
+        record = self.get(conversation_id)
+        if record is None:
+            return False
+        self.save(conversation_id, {**record, **fields})
+        return True
+
+    def delete(self, conversation_id):
+        """Remove a conversation from every tier."""
+        if not self.is_valid_id(conversation_id):
+            return
+        self.memory.delete(conversation_id)
+        if self.persistent is not None:
+            self.persistent.delete(conversation_id)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def create_store(backend='file', memory_size=MAX_MEMORY_CONVERSATIONS, directory=STATE_DIR):
+    """Create a store for a backend name: 'memory' or 'file'."""
+    if backend == 'memory':
+        return ConversationStore(MemoryTier(memory_size))
+    if backend == 'file':
+        persistent = FileTier(directory)
+        persistent.prune()
+        return ConversationStore(MemoryTier(memory_size), persistent)
+    raise ValueError(f"Unknown conversation store backend '{backend}'")
+
+
+def get_store():
+    """Return the process-wide conversation store, creating it on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = create_store()
+    return _store
+
+
+def init_app(app):
+    """Configure the shared conversation store from the Flask app config."""
+    global _store
+    store = create_store(
+        backend=app.config.get('CONVERSATION_STORE_BACKEND', 'file'),
+        memory_size=app.config.get('CONVERSATION_STORE_MEMORY_SIZE', MAX_MEMORY_CONVERSATIONS)
+    )
+    with _store_lock:
+        _store = store
+    app.extensions['conversation_store'] = store
+    return store
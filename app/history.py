@@ -0,0 +1,827 @@
+"""
+Thread History for Free Thinkers
+Saved chat threads on disk as compressed snapshots plus append-only logs that refer to
+messages in the blob store, and an index of their summaries so listing history never
+has to open the thread files
+"""
+
+import base64
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from . import blob_store, log, metrics, storage_codec
+
+logger = log.get_logger('history')
+
+HISTORY_DIR = Path(os.path.expanduser("~/.freethinkers/history/"))
+# Kept outside HISTORY_DIR so it is never mistaken for a thread file
+INDEX_PATH = Path(os.path.expanduser("~/.freethinkers/history_index.json"))
+INDEX_VERSION = 1
+# Index changes are appended to a JSONL log next to INDEX_PATH (history_index.jsonl), which is
+# folded into the index file once it holds as many records as there are threads (or this many)
+INDEX_LOG_SUFFIX = '.jsonl'
+INDEX_COMPACT_MIN_RECORDS = 256
+
+# Each thread is a snapshot (<id>.json, compressed by the storage codec; older plain
+# files are read too) and a JSONL log of the saves since: one record per save holding the
+# hashes of the messages it added (in the blob store) and the position they start at.
+# After this many logged saves the log is folded into a new snapshot.
+SNAPSHOT_SUFFIX = '.json'
+LOG_SUFFIX = '.jsonl'
+COMPACT_AFTER_RECORDS = 32
+
+# Optional SQLite backend (HISTORY_BACKEND=sqlite); import file threads with migrate_history.py
+HISTORY_DB_PATH = Path(os.path.expanduser("~/.freethinkers/history.db"))
+SQLITE_BUSY_TIMEOUT = 10  # Seconds a writer waits for another writer's lock
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+DEFAULT_SEARCH_LIMIT = 50
+MAX_SEARCH_LIMIT = 200
+SNIPPET_CHARS = 120
+TITLE_LENGTH = 30  # Same default title length as the conversation sidebar
+
+THREAD_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+class InvalidCursorError(ValueError):
+    """Raised for a pagination cursor that was not produced by this index."""
+
+
+class ThreadConflictError(ValueError):
+    """Raised when an incremental save starts past the end of the stored thread."""
+
+    def __init__(self, message, message_count):
+        """Record how many messages the stored thread has, so the client can resend."""
+        super().__init__(message)
+        self.message_count = message_count
+
+
+def thread_title(messages):
+    """Derive a title from the first user message, or None when there is none."""
+    for message in messages:
+        if message.get('role') == 'user' and (message.get('content') or '').strip():
+            content = message['content'].strip()
+            return content[:TITLE_LENGTH] + '...' if len(content) > TITLE_LENGTH else content
+    return None
+
+
+def summarize(thread, size):
+    """Build the index entry of a thread: everything the listing needs, no message bodies."""
+    messages = thread.get('messages') or []
+    created_at = thread.get('created_at')
+    return {
+        'id': thread['id'],
+        'model': thread.get('model'),
+        'title': thread.get('title') or thread_title(messages),
+        'category': thread.get('category'),
+        'message_count': len(messages),
+        'size': size,
+        'created_at': created_at,
+        'updated_at': thread.get('updated_at') or created_at
+    }
+
+
+def public_summary(entry):
+    """An index entry without the bookkeeping that is not part of the API."""
+    return {key: value for key, value in entry.items() if key != 'records'}
+
+
+def sort_key(entry):
+    """Newest first; ties are broken by id so the order is total and cursors are stable."""
+    return (entry.get('updated_at') or '', entry['id'])
+
+
+def encode_cursor(entry):
+    """Opaque cursor pointing just after entry."""
+    raw = json.dumps(list(sort_key(entry)), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises InvalidCursorError for anything else."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        updated_at, thread_id = json.loads(raw)
+        return (str(updated_at), str(thread_id))
+    except (ValueError, TypeError):
+        raise InvalidCursorError("Invalid cursor")
+
+
+def query_terms(query):
+    """Lowercased words of a search query."""
+    return [term for term in (query or '').lower().split() if term]
+
+
+def like_pattern(term):
+    """A LIKE pattern matching term anywhere, with its wildcards escaped."""
+    return '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def text_snippet(content, start, width=SNIPPET_CHARS):
+    """A window of content around start, with ellipses where it was cut."""
+    begin = max(0, start - width // 2)
+    end = min(len(content), begin + width)
+    return ('...' if begin else '') + content[begin:end] + ('...' if end < len(content) else '')
+
+
+def search_result(summary, position, role, snippet):
+    """One search hit: the thread's summary fields plus the matching message."""
+    return {
+        'thread_id': summary['id'],
+        'title': summary.get('title'),
+        'model': summary.get('model'),
+        'updated_at': summary.get('updated_at'),
+        'position': position,
+        'role': role,
+        'snippet': snippet
+    }
+
+
+def thread_files(directory):
+    """Map thread ids to their (snapshot, log) paths; either may be None."""
+    directory = Path(directory)
+    snapshots = storage_codec.find_all(directory, SNAPSHOT_SUFFIX)
+    logs = {path.name[:-len(LOG_SUFFIX)]: path for path in directory.glob('*' + LOG_SUFFIX)}
+    return {thread_id: (snapshots.get(thread_id), logs.get(thread_id)) for thread_id in set(snapshots) | set(logs)}
+
+
+def apply_record(thread, record):
+    """Apply one log record: keep the messages before its offset, then add its messages."""
+    record = dict(record)
+    messages = thread.get('messages', [])
+    del messages[record.pop('offset', 0):]
+    messages.extend(record.pop('messages', []))
+    thread.update(record)
+    thread['messages'] = messages
+    return thread
+
+
+def iter_log(path):
+    """Parsed records of a thread log."""
+    with open(path, 'r') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Only a save interrupted mid-write leaves a torn line; the records around it stand
+                logger.warning("Skipping torn record in thread log %s", path)
+
+
+def resolve(items, blobs=None):
+    """
+    Replace the message hashes of stored snapshots and records with the
+    messages, fetching the messages of them all from the blob store at once.
+    """
+    refs = [ref for item in items if isinstance(item, dict) for ref in item.get('message_refs', [])]
+    messages = iter((blobs or blob_store.get_store()).get(refs))
+    for item in items:
+        if isinstance(item, dict) and 'message_refs' in item:
+            item['messages'] = [next(messages) for _ in item.pop('message_refs')]
+    return items
+
+
+def load_thread(snapshot, log_path, blobs=None):
+    """
+    Read a thread from its snapshot and log files (either may be None).
+
+    Returns (thread, records in the log, bytes on disk), or (None, 0, 0)
+    when the files are unreadable or malformed.
+    """
+    thread = {}
+    records = []
+    size = 0
+    try:
+        if snapshot is not None:
+            thread = storage_codec.read_json(snapshot)
+            size += snapshot.stat().st_size
+        if log_path is not None:
+            records = list(iter_log(log_path))
+            size += log_path.stat().st_size
+        resolve([thread] + records, blobs)
+        for record in records:
+            apply_record(thread, record)
+    except (OSError, ValueError, AttributeError) as e:
+        logger.warning("Skipping unreadable thread files %s, %s: %s", snapshot, log_path, e)
+        return None, 0, 0
+    if not isinstance(thread, dict) or 'id' not in thread or not isinstance(thread.get('messages'), list):
+        logger.warning("Skipping malformed thread files %s, %s", snapshot, log_path)
+        return None, 0, 0
+    return thread, len(records), size
+
+
+def thread_refs(snapshot, log_path):
+    """Every message hash a thread's files list, once per listing (the blob references they hold)."""
+    refs = []
+    try:
+        if snapshot is not None:
+            refs.extend(storage_codec.read_json(snapshot).get('message_refs', []))
+        if log_path is not None:
+            for record in iter_log(log_path):
+                refs.extend(record.get('message_refs', []))
+    except (OSError, ValueError) as e:
+        # Unlisted references only keep blobs alive until the next recount (blob_gc.py)
+        logger.warning("Could not read all blob references of %s, %s: %s", snapshot, log_path, e)
+    return refs
+
+
+class HistoryIndex:
+    """
+    Summaries of every saved thread, kept in memory and in INDEX_PATH.
+
+    Saves update the index directly by appending one record to the index
+    log, so their cost does not grow with the number of threads; the log is
+    folded into the index file once it is as long as the index. Changes made
+    behind its back (another worker process, files copied in by hand) are
+    picked up cheaply: records other processes appended to the log are
+    replayed, the index file is reloaded when its mtime changes, and the
+    history directory is re-listed, parsing only new files, when the
+    directory's mtime changes.
+    """
+
+    def __init__(self, directory, index_path, blobs=None):
+        """Initialize an empty index; load() reads it from disk."""
+        self.directory = Path(directory)
+        self.index_path = Path(index_path)
+        self.log_path = self.index_path.with_suffix(INDEX_LOG_SUFFIX)
+        self.blobs = blobs
+        self.entries = {}
+        self.dir_mtime = None
+        self.index_mtime = None
+        self.log_size = 0
+        self.log_records = 0
+        self.lock = threading.RLock()
+
+    def _stat_mtime(self, path):
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return None
+
+    def _stat_size(self, path):
+        try:
+            return os.stat(path).st_size
+        except OSError:
+            return 0
+
+    def load(self):
+        """Read the index file and replay its log, rebuilding it from the thread files if missing or unreadable."""
+        with self.lock:
+            try:
+                with open(self.index_path, 'r') as f:
+                    data = json.load(f)
+                if data.get('version') != INDEX_VERSION:
+                    raise ValueError(f"index version {data.get('version')}")
+            except (OSError, ValueError) as e:
+                if self.index_path.exists():
+                    logger.warning("Rebuilding history index: %s", e)
+                self.rebuild()
+                return
+            self.entries = {entry['id']: entry for entry in data.get('threads', [])}
+            self.dir_mtime = data.get('dir_mtime')
+            self.index_mtime = self._stat_mtime(self.index_path)
+            self.log_size = self.log_records = 0
+            self._replay_log()
+
+    def _replay_log(self):
+        """Apply the log records written since the last read (by this or another process)."""
+        try:
+            with open(self.log_path, 'rb') as f:
+                f.seek(self.log_size)
+                data = f.read()
+        except OSError:
+            return
+        # Only whole lines; a record still being written is read next time
+        data = data[:data.rfind(b'\n') + 1]
+        for line in data.splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                logger.warning("Skipping torn record in history index log %s", self.log_path)
+                continue
+            if 'put' in record:
+                self.entries[record['put']['id']] = record['put']
+            elif 'delete' in record:
+                self.entries.pop(record['delete'], None)
+            self.dir_mtime = record.get('dir_mtime', self.dir_mtime)
+            self.log_records += 1
+        self.log_size += len(data)
+
+    def _append(self, record):
+        """Log one index change, folding the log into the index file once it is long enough."""
+        self.dir_mtime = record['dir_mtime'] = self._stat_mtime(self.directory)
+        line = (json.dumps(record, separators=(',', ':'), ensure_ascii=False) + '\n').encode('utf-8')
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.log_path, 'ab') as f:
+            f.write(line)
+            end = f.tell()
+        # Records appended by other processes in the meantime are replayed before ours is counted
+        if end - len(line) != self.log_size:
+            self._replay_log()
+        else:
+            self.log_size = end
+            self.log_records += 1
+        if self.log_records >= max(INDEX_COMPACT_MIN_RECORDS, len(self.entries)):
+            metrics.increment('history_index_compactions_total')
+            self.save()
+
+    def rebuild(self):
+        """Summarize every thread file from scratch."""
+        with self.lock:
+            self.entries = {}
+            for files in thread_files(self.directory).values():
+                self._add_files(*files)
+            self.save()
+            metrics.increment('history_index_rebuilds_total')
+            logger.info("Indexed %d history threads", len(self.entries))
+
+    def _add_files(self, snapshot, log_path):
+        thread, records, size = load_thread(snapshot, log_path, self.blobs)
+        if thread is not None:
+            self.entries[thread['id']] = dict(summarize(thread, size), records=records)
+
+    def save(self):
+        """Write the whole index atomically, empty its log and remember the directory state it reflects."""
+        with self.lock:
+            self.dir_mtime = self._stat_mtime(self.directory)
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.index_path.with_suffix('.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump({'version': INDEX_VERSION, 'dir_mtime': self.dir_mtime,
+                           'threads': list(self.entries.values())}, f)
+            os.replace(tmp_path, self.index_path)
+            # Replaying the log over the new index file is harmless, so a crash before this is too
+            with open(self.log_path, 'wb'):
+                pass
+            self.index_mtime = self._stat_mtime(self.index_path)
+            self.log_size = self.log_records = 0
+
+    def refresh(self, directory=True):
+        """
+        Pick up changes made by other processes or outside the app; the
+        history directory is only re-listed when directory is true.
+        """
+        with self.lock:
+            if self._stat_mtime(self.index_path) != self.index_mtime or self._stat_size(self.log_path) < self.log_size:
+                self.load()
+            elif self._stat_size(self.log_path) > self.log_size:
+                self._replay_log()
+            if directory and self._stat_mtime(self.directory) != self.dir_mtime:
+                self.reconcile()
+
+    def reconcile(self):
+        """Add thread files missing from the index and drop entries whose file is gone."""
+        with self.lock:
+            files = thread_files(self.directory)
+            for thread_id in set(self.entries) - set(files):
+                del self.entries[thread_id]
+            for thread_id in set(files) - set(self.entries):
+                self._add_files(*files[thread_id])
+            self.save()
+
+    def get(self, thread_id):
+        """The current entry of a thread, or None."""
+        with self.lock:
+            self.refresh()
+            return self.entries.get(thread_id)
+
+    def update(self, entry):
+        """Record a saved thread's entry (its files were just written, so the directory is not re-listed)."""
+        with self.lock:
+            self.refresh(directory=False)
+            self.entries[entry['id']] = entry
+            self._append({'put': entry})
+
+    def remove(self, thread_id):
+        """Forget a deleted thread."""
+        with self.lock:
+            self.refresh(directory=False)
+            if self.entries.pop(thread_id, None) is not None:
+                self._append({'delete': thread_id})
+
+    def page(self, limit=DEFAULT_PAGE_SIZE, cursor=None):
+        """
+        Return (summaries, next_cursor) for one page, newest first.
+
+        next_cursor is None on the last page. Raises InvalidCursorError for a
+        cursor this index did not produce.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        after = decode_cursor(cursor) if cursor else None
+        with self.lock:
+            self.refresh()
+            entries = sorted(self.entries.values(), key=sort_key, reverse=True)
+        if after is not None:
+            entries = [entry for entry in entries if sort_key(entry) < after]
+        page = entries[:limit]
+        next_cursor = encode_cursor(page[-1]) if len(entries) > limit else None
+        return [public_summary(entry) for entry in page], next_cursor
+
+
+class HistoryStore:
+    """
+    Saved threads, each a compressed snapshot plus an append-only JSONL log,
+    with their summary index. Thread files list message hashes; the messages
+    themselves are stored once each in the blob store.
+
+    A save that continues a thread appends one log record with just the new
+    messages, so its cost follows the size of the change rather than of the
+    thread. Every COMPACT_AFTER_RECORDS saves the thread is rewritten as a
+    single snapshot, which also drops messages that later saves replaced.
+    """
+
+    def __init__(self, directory=HISTORY_DIR, index_path=INDEX_PATH, blobs=None):
+        """Initialize the store and load (or build) its index."""
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.blobs = blobs or blob_store.get_store()
+        self.index = HistoryIndex(self.directory, index_path, self.blobs)
+        self.index.load()
+        self.lock = threading.Lock()
+
+    def files(self, thread_id):
+        """A thread's existing (snapshot, log) paths; (None, None) for an unknown or invalid id."""
+        if not thread_id or not THREAD_ID_PATTERN.match(thread_id):
+            return None, None
+        log_path = self.directory / f"{thread_id}{LOG_SUFFIX}"
+        return storage_codec.find(self.directory / f"{thread_id}{SNAPSHOT_SUFFIX}"), (log_path if log_path.exists() else None)
+
+    def save(self, thread_id, model, messages, title=None, category=None, offset=None):
+        """
+        Save a thread and index it; returns its summary.
+
+        With offset None, messages is the whole thread. Otherwise messages
+        continue the stored thread at position offset, replacing whatever was
+        stored from there on (e.g. a regenerated reply), and only they are
+        written. Raises ThreadConflictError when offset is past the stored end.
+        """
+        now = datetime.now().isoformat()
+        record = {"offset": offset or 0, "messages": messages, "model": model, "updated_at": now}
+        if title:
+            record["title"] = title
+        if category:
+            record["category"] = category
+
+        with self.lock:
+            entry = self.index.get(thread_id)
+            if offset and (entry is None or offset > entry['message_count']):
+                count = entry['message_count'] if entry else 0
+                raise ThreadConflictError(f"Thread has {count} saved messages, cannot continue at {offset}", count)
+
+            if entry is None or not offset:
+                thread = {"id": thread_id, "created_at": entry['created_at'] if entry else now}
+                return self._write_snapshot(apply_record(thread, record))
+            if (entry.get('records') or 0) >= COMPACT_AFTER_RECORDS:
+                metrics.increment('history_compactions_total')
+                return self._write_snapshot(apply_record(self.get(thread_id), record))
+            return self._append(entry, record)
+
+    def _write_snapshot(self, thread):
+        """Write a thread as a single snapshot and drop its log and the references they held."""
+        old_refs = thread_refs(*self.files(thread['id']))
+        stored = {key: value for key, value in thread.items() if key != 'messages'}
+        stored['message_refs'] = self.blobs.put(thread['messages'])
+        path, size = storage_codec.write_json(self.directory / f"{thread['id']}{SNAPSHOT_SUFFIX}", stored)
+        log_path = self.directory / f"{thread['id']}{LOG_SUFFIX}"
+        if log_path.exists():
+            # Replaying the log over the new snapshot is harmless, so a crash before this is too
+            log_path.unlink()
+        self.blobs.release(old_refs)
+        entry = dict(summarize(thread, size), records=0)
+        self.index.update(entry)
+        return public_summary(entry)
+
+    def _append(self, entry, record):
+        """Append a save to a thread's log and update its entry without reading the thread."""
+        log_path = self.directory / f"{entry['id']}{LOG_SUFFIX}"
+        stored = {key: value for key, value in record.items() if key != 'messages'}
+        stored['message_refs'] = self.blobs.put(record['messages'])
+        line = (json.dumps(stored, separators=(',', ':'), ensure_ascii=False) + '\n').encode('utf-8')
+        with open(log_path, 'ab+') as f:
+            # Start on a fresh line if an interrupted save left a torn record
+            if f.seek(0, os.SEEK_END):
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    line = b'\n' + line
+            f.write(line)
+        size = sum(path.stat().st_size for path in self.files(entry['id']) if path is not None)
+        entry = dict(entry, model=record['model'], message_count=record['offset'] + len(record['messages']),
+                     size=size, updated_at=record['updated_at'], records=(entry.get('records') or 0) + 1)
+        if record.get('title') or not entry.get('title'):
+            entry['title'] = record.get('title') or thread_title(record['messages'])
+        if record.get('category'):
+            entry['category'] = record['category']
+        self.index.update(entry)
+        return public_summary(entry)
+
+    def get(self, thread_id):
+        """Load a specific thread, messages included."""
+        snapshot, log_path = self.files(thread_id)
+        if snapshot is None and log_path is None:
+            return None
+        return load_thread(snapshot, log_path, self.blobs)[0]
+
+    def delete(self, thread_id):
+        """Delete a thread; returns False when it does not exist."""
+        snapshot, log_path = self.files(thread_id)
+        if snapshot is None and log_path is None:
+            return False
+        refs = thread_refs(snapshot, log_path)
+        storage_codec.remove(self.directory / f"{thread_id}{SNAPSHOT_SUFFIX}")
+        if log_path is not None:
+            log_path.unlink()
+        self.blobs.release(refs)
+        self.index.remove(thread_id)
+        return True
+
+    def list(self, limit=DEFAULT_PAGE_SIZE, cursor=None):
+        """One page of thread summaries, newest first, and the cursor of the next page."""
+        return self.index.page(limit, cursor)
+
+    def search(self, query, limit=DEFAULT_SEARCH_LIMIT):
+        """
+        Find messages containing every word of query, newest threads first.
+
+        This reads every thread file; the SQLite backend answers from its
+        full-text index instead.
+        """
+        terms = query_terms(query)
+        if not terms:
+            return []
+        results = []
+        summaries, cursor = self.index.page(MAX_PAGE_SIZE)
+        while summaries and len(results) < limit:
+            for summary in summaries:
+                thread = self.get(summary['id'])
+                for position, message in enumerate((thread or {}).get('messages', [])):
+                    content = message.get('content') or ''
+                    lowered = content.lower()
+                    if all(term in lowered for term in terms):
+                        results.append(search_result(summary, position, message.get('role'),
+                                                     text_snippet(content, lowered.index(terms[0]))))
+                        if len(results) >= limit:
+                            return results
+            if not cursor:
+                break
+            summaries, cursor = self.index.page(MAX_PAGE_SIZE, cursor)
+        return results
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS threads (
+    id TEXT PRIMARY KEY,
+    model TEXT,
+    title TEXT,
+    category TEXT,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    size INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS threads_by_update ON threads (updated_at DESC, id DESC);
+CREATE TABLE IF NOT EXISTS messages (
+    thread_id TEXT NOT NULL REFERENCES threads (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    role TEXT,
+    content TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (thread_id, position)
+);
+"""
+
+# Full-text index over message content; left out when SQLite was built without FTS5
+SQLITE_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5 (
+    content, content='messages', content_rowid='rowid', tokenize='unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, content) VALUES (new.rowid, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+END;
+"""
+
+SUMMARY_COLUMNS = 'id, model, title, category, message_count, size, created_at, updated_at'
+
+
+def message_rows(thread_id, messages, start=0):
+    """Rows of the messages table for messages stored from position start; size is the data length."""
+    return [(thread_id, start + position, message.get('role'), message.get('content') or '', json.dumps(message))
+            for position, message in enumerate(messages)]
+
+
+class SQLiteHistoryStore:
+    """
+    Saved threads in SQLite: a threads table for listings, a messages table
+    with one row per message, and an FTS5 index over message content.
+
+    The database runs in WAL mode so listings and searches never wait for a
+    save; each thread gets its own connection.
+    """
+
+    def __init__(self, db_path=HISTORY_DB_PATH):
+        """Open (or create) the database and its schema."""
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.local = threading.local()
+        with self.connection() as db:
+            db.executescript(SQLITE_SCHEMA)
+            try:
+                db.executescript(SQLITE_FTS_SCHEMA)
+                self.full_text = True
+            except sqlite3.OperationalError as e:
+                logger.warning("SQLite full-text search unavailable (%s); history search will scan messages", e)
+                self.full_text = False
+
+    def connection(self):
+        """The calling thread's connection."""
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=SQLITE_BUSY_TIMEOUT)
+            db.row_factory = sqlite3.Row
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute('PRAGMA foreign_keys=ON')
+            self.local.db = db
+        return db
+
+    def save(self, thread_id, model, messages, title=None, category=None, offset=None):
+        """
+        Save a thread; returns its summary.
+
+        With offset None, messages is the whole thread and replaces it
+        (created_at is kept). Otherwise messages replace the stored ones from
+        position offset on. Raises ThreadConflictError when offset is past the
+        stored end.
+        """
+        now = datetime.now().isoformat()
+        if not offset:
+            thread = {"id": thread_id, "model": model, "messages": messages, "created_at": now, "updated_at": now}
+            if title:
+                thread["title"] = title
+            if category:
+                thread["category"] = category
+            self.import_thread(thread)
+            return self.summary(thread_id)
+
+        db = self.connection()
+        with db:
+            row = db.execute('SELECT message_count, size, title FROM threads WHERE id = ?', (thread_id,)).fetchone()
+            if row is None or offset > row['message_count']:
+                count = row['message_count'] if row else 0
+                raise ThreadConflictError(f"Thread has {count} saved messages, cannot continue at {offset}", count)
+            dropped = db.execute(
+                'SELECT COALESCE(SUM(LENGTH(data)), 0) FROM messages WHERE thread_id = ? AND position >= ?',
+                (thread_id, offset)
+            ).fetchone()[0]
+            db.execute('DELETE FROM messages WHERE thread_id = ? AND position >= ?', (thread_id, offset))
+            rows = message_rows(thread_id, messages, offset)
+            db.executemany('INSERT INTO messages (thread_id, position, role, content, data) VALUES (?, ?, ?, ?, ?)', rows)
+            db.execute(
+                'UPDATE threads SET model = ?, title = ?, category = COALESCE(?, category), message_count = ?, '
+                'size = ?, updated_at = ? WHERE id = ?',
+                (model, title or row['title'] or thread_title(messages), category, offset + len(messages),
+                 row['size'] - dropped + sum(len(data) for *_, data in rows), now, thread_id)
+            )
+        return self.summary(thread_id)
+
+    def import_thread(self, thread, replace=True):
+        """
+        Write a thread dict as it is (timestamps included).
+
+        Returns False without writing when replace is off and the thread
+        already exists.
+        """
+        rows = message_rows(thread['id'], thread.get('messages') or [])
+        summary = summarize(thread, sum(len(data) for *_, data in rows))
+        db = self.connection()
+        with db:
+            if db.execute('SELECT 1 FROM threads WHERE id = ?', (thread['id'],)).fetchone():
+                if not replace:
+                    return False
+                db.execute('DELETE FROM messages WHERE thread_id = ?', (thread['id'],))
+            db.execute(
+                f"INSERT INTO threads ({SUMMARY_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET model = excluded.model, title = excluded.title, "
+                "category = excluded.category, message_count = excluded.message_count, "
+                "size = excluded.size, updated_at = excluded.updated_at",
+                tuple(summary[column] for column in SUMMARY_COLUMNS.split(', '))
+            )
+            db.executemany('INSERT INTO messages (thread_id, position, role, content, data) VALUES (?, ?, ?, ?, ?)', rows)
+        return True
+
+    def summary(self, thread_id):
+        """A thread's summary, as listed."""
+        row = self.connection().execute(f'SELECT {SUMMARY_COLUMNS} FROM threads WHERE id = ?', (thread_id,)).fetchone()
+        return dict(row) if row else None
+
+    def get(self, thread_id):
+        """Load a specific thread, messages included."""
+        db = self.connection()
+        row = db.execute(f'SELECT {SUMMARY_COLUMNS} FROM threads WHERE id = ?', (thread_id,)).fetchone()
+        if row is None:
+            return None
+        thread = {key: row[key] for key in ('id', 'model', 'created_at', 'updated_at', 'title', 'category')
+                  if row[key] is not None}
+        thread['messages'] = [
+            json.loads(message['data']) for message in
+            db.execute('SELECT data FROM messages WHERE thread_id = ? ORDER BY position', (thread_id,))
+        ]
+        return thread
+
+    def delete(self, thread_id):
+        """Delete a thread; returns False when it does not exist."""
+        db = self.connection()
+        with db:
+            return db.execute('DELETE FROM threads WHERE id = ?', (thread_id,)).rowcount > 0
+
+    def list(self, limit=DEFAULT_PAGE_SIZE, cursor=None):
+        """One page of thread summaries, newest first, and the cursor of the next page."""
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        query = f'SELECT {SUMMARY_COLUMNS} FROM threads'
+        params = []
+        if cursor:
+            query += ' WHERE (COALESCE(updated_at, \'\'), id) < (?, ?)'
+            params.extend(decode_cursor(cursor))
+        query += ' ORDER BY COALESCE(updated_at, \'\') DESC, id DESC LIMIT ?'
+        params.append(limit + 1)
+        rows = [dict(row) for row in self.connection().execute(query, params)]
+        page = rows[:limit]
+        return page, encode_cursor(page[-1]) if len(rows) > limit else None
+
+    def search(self, query, limit=DEFAULT_SEARCH_LIMIT):
+        """Find messages matching every word of query (prefix matches included), best first."""
+        terms = query_terms(query)
+        if not terms:
+            return []
+        columns = ', '.join('t.' + column for column in SUMMARY_COLUMNS.split(', '))
+        if not self.full_text:
+            rows = self.connection().execute(
+                f"SELECT {columns}, m.position, m.role, m.content FROM messages m "
+                "JOIN threads t ON t.id = m.thread_id WHERE "
+                + ' AND '.join("m.content LIKE ? ESCAPE '\\'" for _ in terms)
+                + " ORDER BY t.updated_at DESC, m.position LIMIT ?",
+                [like_pattern(term) for term in terms]
+                + [int(limit)]
+            )
+            return [search_result(dict(row), row['position'], row['role'],
+                                  text_snippet(row['content'], row['content'].lower().find(terms[0])))
+                    for row in rows]
+        match = ' '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+        rows = self.connection().execute(
+            f"SELECT {columns}, m.position, m.role, "
+            "snippet(messages_fts, 0, '', '', '...', 16) AS snippet "
+            "FROM messages_fts JOIN messages m ON m.rowid = messages_fts.rowid "
+            "JOIN threads t ON t.id = m.thread_id "
+            "WHERE messages_fts MATCH ? ORDER BY rank LIMIT ?",
+            (match, int(limit))
+        )
+        return [search_result(dict(row), row['position'], row['role'], row['snippet']) for row in rows]
+
+
+def create_store(backend='file', directory=HISTORY_DIR, db_path=HISTORY_DB_PATH):
+    """Create a history store for a backend name: 'file' or 'sqlite'."""
+    if backend == 'file':
+        return HistoryStore(directory)
+    if backend == 'sqlite':
+        store = SQLiteHistoryStore(db_path)
+        if not store.list(limit=1)[0] and thread_files(directory):
+            logger.warning("SQLite history at %s is empty but %s has threads; "
+                           "run migrate_history.py to import them", db_path, directory)
+        return store
+    raise ValueError(f"Unknown history backend '{backend}'")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Return the process-wide history store, creating it on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = create_store(os.environ.get('HISTORY_BACKEND', 'file'))
+    return _store
+
+
+def init_app(app):
+    """Open the configured history store (building its index if needed) and register it on the app."""
+    global _store
+    store = create_store(
+        backend=app.config.get('HISTORY_BACKEND', 'file'),
+        db_path=app.config.get('HISTORY_DB_PATH') or HISTORY_DB_PATH
+    )
+    with _store_lock:
+        _store = store
+    app.extensions['history_store'] = store
+    return store
@@ -0,0 +1,147 @@
+"""
+Image Pipeline for Free Thinkers
+Prepares uploaded images for multimodal models: size-checked reads, downscaling to the
+model's input resolution and a content-hash cache of the encoded payload
+"""
+
+import base64
+import hashlib
+import io
+import os
+import threading
+
+from . import metrics, log
+from .conversation_store import MemoryTier
+
+# Pillow is optional; without it images are sent at their original size
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = log.get_logger('image_pipeline')
+
+# Defaults (overridable through the environment, app config or MODEL_PARAMS['image_size'])
+DEFAULT_MAX_SIDE = int(os.environ.get('IMAGE_MAX_SIDE', 672))
+MAX_UPLOAD_BYTES = int(os.environ.get('IMAGE_MAX_UPLOAD_BYTES', 20 * 1024 * 1024))
+MAX_CACHED_IMAGES = 64
+READ_CHUNK_SIZE = 64 * 1024
+JPEG_QUALITY = 90
+
+
+def read_upload(stream, max_bytes=MAX_UPLOAD_BYTES):
+    """
+    Read an uploaded file in chunks, hashing as it goes.
+
+    Returns (sha256 hex digest, bytes) and raises ValueError when the file
+    exceeds max_bytes. The request body has already been received by then;
+    MAX_CONTENT_LENGTH is what stops oversized requests at the transport.
+    """
+    digest = hashlib.sha256()
+    data = bytearray()
+    while True:
+        chunk = stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        data.extend(chunk)
+        if len(data) > max_bytes:
+            raise ValueError(f"Image too large (limit {max_bytes // (1024 * 1024)} MB)")
+        digest.update(chunk)
+    return digest.hexdigest(), bytes(data)
+
+
+def downscale(data, max_side):
+    """
+    Shrink an image so its longest side is at most max_side pixels.
+
+    Returns the original bytes when Pillow is unavailable, the image already
+    fits, or it cannot be decoded (Ollama reports unreadable images itself).
+    """
+    if Image is None or not max_side:
+        return data
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if max(image.size) <= max_side:
+                return data
+            image.thumbnail((max_side, max_side), Image.LANCZOS)
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            output = io.BytesIO()
+            image.save(output, format='JPEG', quality=JPEG_QUALITY)
+            return output.getvalue()
+    except (OSError, ValueError) as e:
+        logger.warning("Could not downscale image, sending original: %s", e)
+        return data
+
+
+class ImagePipeline:
+    """
+    Turns uploads into base64 payloads for Ollama, caching by content hash.
+
+    Re-asking about the same image (same bytes, same target size) reuses the
+    prepared payload without decoding or encoding it again.
+    """
+
+    def __init__(self, max_side=DEFAULT_MAX_SIDE, max_upload_bytes=MAX_UPLOAD_BYTES, cache_size=MAX_CACHED_IMAGES):
+        """Initialize the pipeline with its payload cache."""
+        self.max_side = max_side
+        self.max_upload_bytes = max_upload_bytes
+        self.cache = MemoryTier(cache_size)
+
+    def target_size(self, model_params):
+        """Longest image side a model needs (its MODEL_PARAMS 'image_size', else the default)."""
+        return model_params.get('image_size') or self.max_side
+
+    def read(self, image_file):
+        """Read an upload; returns (content hash, raw bytes)."""
+        return read_upload(image_file.stream, self.max_upload_bytes)
+
+    def prepare(self, digest, data, max_side):
+        """Return the base64 payload for image bytes, from cache when seen before."""
+        key = f"{digest}:{max_side}"
+        encoded = self.cache.get(key)
+        if encoded is not None:
+            metrics.increment('image_cache_hits_total')
+            return encoded
+
+        metrics.increment('image_cache_misses_total')
+        prepared = downscale(data, max_side)
+        encoded = base64.b64encode(prepared).decode('utf-8')
+        self.cache.put(key, encoded)
+
+        metrics.increment('image_bytes_uploaded_total', len(data))
+        metrics.increment('image_bytes_sent_total', len(prepared))
+        return encoded
+
+    def process(self, image_file, model_params):
+        """Read, downscale and encode an upload for a model."""
+        digest, data = self.read(image_file)
+        return self.prepare(digest, data, self.target_size(model_params))
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline():
+    """Return the process-wide image pipeline, creating it on first use."""
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                _pipeline = ImagePipeline()
+    return _pipeline
+
+
+def init_app(app):
+    """Configure the shared image pipeline from the Flask app config."""
+    global _pipeline
+    pipeline = ImagePipeline(
+        max_side=app.config.get('IMAGE_MAX_SIDE', DEFAULT_MAX_SIDE),
+        max_upload_bytes=app.config.get('IMAGE_MAX_UPLOAD_BYTES', MAX_UPLOAD_BYTES),
+        cache_size=app.config.get('IMAGE_CACHE_SIZE', MAX_CACHED_IMAGES)
+    )
+    with _pipeline_lock:
+        _pipeline = pipeline
+    app.extensions['image_pipeline'] = pipeline
+    return pipeline
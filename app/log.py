@@ -0,0 +1,164 @@
+"""
+Logging for Free Thinkers
+Leveled, sampled and redacted logging for the generation hot path; records are
+handed to a background thread through a queue so log I/O never blocks a stream
+"""
+
+import atexit
+import hashlib
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+
+from . import metrics
+
+# Defaults (overridable through the environment or app config)
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 1.0))
+LOG_QUEUE_SIZE = 10000
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+ROOT_LOGGER = 'freethinkers'
+
+# Long runs of base64 characters (inline images) are never written out
+BASE64_PATTERN = re.compile(r'[A-Za-z0-9+/]{256,}={0,2}')
+MAX_MESSAGE_CHARS = 2000
+
+
+def get_logger(name):
+    """Return a logger under the application's logger hierarchy."""
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def fingerprint(text):
+    """Describe text by length and a short hash instead of its content."""
+    text = text or ''
+    digest = hashlib.sha256(text.encode('utf-8')).hexdigest()[:10]
+    return f"<{len(text)} chars sha256:{digest}>"
+
+
+def redact_payload(payload):
+    """
+    Summarize an Ollama request for logging.
+
+    Prompts and message contents are replaced by their length and hash,
+    images by their encoded size; options and other settings are kept.
+    """
+    summary = {}
+    for key, value in payload.items():
+        if key == 'prompt' or key == 'system':
+            summary[key] = fingerprint(value)
+        elif key == 'images':
+            summary[key] = [f"<image {len(image)} b64 chars>" for image in value or []]
+        elif key == 'messages':
+            summary[key] = [
+                {'role': message.get('role'), 'content': fingerprint(message.get('content'))}
+                for message in value or []
+            ]
+        else:
+            summary[key] = value
+    return summary
+
+
+class RedactionFilter(logging.Filter):
+    """Safety net: strip inline base64 blobs and cap message length."""
+
+    def filter(self, record):
+        """Rewrite the record's message in place; always keeps the record."""
+        message = record.getMessage()
+        message = BASE64_PATTERN.sub(lambda match: f"<base64 {len(match.group(0))} chars>", message)
+        if len(message) > MAX_MESSAGE_CHARS:
+            message = f"{message[:MAX_MESSAGE_CHARS]}... <{len(message) - MAX_MESSAGE_CHARS} chars truncated>"
+        record.msg = message
+        record.args = None
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of records below WARNING; warnings and errors are always kept."""
+
+    def __init__(self, rate=LOG_SAMPLE_RATE):
+        """Initialize the filter with a keep probability between 0 and 1."""
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        """Decide whether to keep a record."""
+        if record.levelno >= logging.WARNING or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records instead of waiting when the queue is full."""
+
+    def enqueue(self, record):
+        """Put a record on the queue without blocking."""
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.increment('log_records_dropped_total')
+
+
+_listener = None
+_lock = threading.Lock()
+
+
+def configure(level=LOG_LEVEL, sample_rate=LOG_SAMPLE_RATE, stream=None, queue_size=LOG_QUEUE_SIZE):
+    """
+    Route the application's loggers through a bounded queue to a background writer.
+
+    Level and sampling are checked in the calling thread before anything is
+    queued; redaction runs there too so payloads never reach the writer.
+    Calling again replaces the previous configuration.
+    """
+    global _listener
+
+    logger = logging.getLogger(ROOT_LOGGER)
+    records = queue.Queue(maxsize=queue_size)
+
+    handler = NonBlockingQueueHandler(records)
+    handler.addFilter(SamplingFilter(sample_rate))
+    handler.addFilter(RedactionFilter())
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+        for existing in list(logger.handlers):
+            logger.removeHandler(existing)
+
+        logger.addHandler(handler)
+        logger.setLevel(level.upper() if isinstance(level, str) else level)
+        logger.propagate = False
+
+        _listener = logging.handlers.QueueListener(records, output, respect_handler_level=False)
+        _listener.start()
+    return logger
+
+
+def shutdown():
+    """Flush queued records and stop the background writer."""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+atexit.register(shutdown)
+
+
+def init_app(app):
+    """Configure logging from the Flask app config."""
+    return configure(
+        level=app.config.get('LOG_LEVEL', LOG_LEVEL),
+        sample_rate=app.config.get('LOG_SAMPLE_RATE', LOG_SAMPLE_RATE)
+    )
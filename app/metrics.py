@@ -0,0 +1,146 @@
+"""
+Metrics for Free Thinkers
+In-process counters and histograms shared by the streaming and generation layers,
+exported as JSON and in the Prometheus text format
+"""
+
+import bisect
+import threading
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+
+PROMETHEUS_PREFIX = 'freethinkers_'
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+TOKEN_RATE_BUCKETS = (1, 2, 5, 10, 15, 20, 30, 40, 50, 75, 100, 150, 200, 300)
+HISTOGRAM_BUCKETS = {
+    'generation_tokens_per_second': TOKEN_RATE_BUCKETS
+}
+
+
+def _key(name, labels):
+    """Build a registry key from a metric name and its labels."""
+    return name, tuple(sorted(labels.items()))
+
+
+def increment(name, value=1, **labels):
+    """Add value to a counter identified by name and labels."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def get_counter(name, **labels):
+    """Return the current value of a counter (0 if never incremented)."""
+    with _lock:
+        return _counters.get(_key(name, labels), 0)
+
+
+def observe(name, value, **labels):
+    """Record one observation in a histogram identified by name and labels."""
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            buckets = HISTOGRAM_BUCKETS.get(name, LATENCY_BUCKETS)
+            histogram = _histograms[key] = {'buckets': buckets, 'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+        index = bisect.bisect_left(histogram['buckets'], value)
+        if index < len(histogram['buckets']):
+            histogram['counts'][index] += 1
+        histogram['sum'] += value
+        histogram['count'] += 1
+
+
+def get_histogram(name, **labels):
+    """Return (count, sum) of a histogram ((0, 0.0) if never observed)."""
+    with _lock:
+        histogram = _histograms.get(_key(name, labels))
+        return (histogram['count'], histogram['sum']) if histogram else (0, 0.0)
+
+
+def snapshot():
+    """Return every counter grouped by name, suitable for JSON output."""
+    result = {}
+    with _lock:
+        items = list(_counters.items())
+    for (name, labels), value in sorted(items):
+        result.setdefault(name, []).append({'labels': dict(labels), 'value': value})
+    return result
+
+
+def histogram_snapshot():
+    """Return every histogram grouped by name with count, sum, mean and cumulative buckets."""
+    result = {}
+    with _lock:
+        items = [(key, dict(histogram, counts=list(histogram['counts']))) for key, histogram in _histograms.items()]
+    for (name, labels), histogram in sorted(items, key=lambda item: item[0]):
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(histogram['buckets'], histogram['counts']):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        result.setdefault(name, []).append({
+            'labels': dict(labels),
+            'count': histogram['count'],
+            'sum': histogram['sum'],
+            'mean': histogram['sum'] / histogram['count'] if histogram['count'] else 0.0,
+            'buckets': buckets
+        })
+    return result
+
+
+def _escape(value):
+    """Escape a label value for the Prometheus text format."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, extra=()):
+    """Render a label set as {a="b",...} (empty string when there are none)."""
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def render_prometheus():
+    """Render every counter and histogram in the Prometheus text exposition format."""
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted(
+            ((key, dict(histogram, counts=list(histogram['counts']))) for key, histogram in _histograms.items()),
+            key=lambda item: item[0]
+        )
+
+    lines = []
+    typed = set()
+    for (name, labels), value in counters:
+        metric = PROMETHEUS_PREFIX + name
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} counter")
+            typed.add(metric)
+        lines.append(f"{metric}{_labels(labels)} {value}")
+
+    for (name, labels), histogram in histograms:
+        metric = PROMETHEUS_PREFIX + name
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} histogram")
+            typed.add(metric)
+        cumulative = 0
+        for bound, count in zip(histogram['buckets'], histogram['counts']):
+            cumulative += count
+            lines.append(f"{metric}_bucket{_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{metric}_bucket{_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+        lines.append(f"{metric}_sum{_labels(labels)} {histogram['sum']}")
+        lines.append(f"{metric}_count{_labels(labels)} {histogram['count']}")
+
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    """Clear every counter and histogram."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
@@ -11,6 +11,11 @@ import asyncio
 from typing import List, Dict, Any, Tuple, Optional
 from pathlib import Path
 
+from . import ollama_client, scheduler, log
+from .streaming import cached_response, remember_response, record_generation
+
+logger = log.get_logger('model_chain')
+
 # Constants
 CHAIN_DIR = Path(os.path.expanduser("~/.freethinkers/chains/"))
 
@@ -33,24 +38,20 @@ class ModelChain:
     def load_models(self):
         """Load available models from Ollama."""
         try:
-            response = requests.get('http://localhost:11434/api/tags')
-            if response.status_code == 200:
-                models = response.json().get('models', [])
+            for model in ollama_client.get_client().tags():
+                model_name = model['name']
+                model_details = model.get('details', {})
                 
-                for model in models:
-                    model_name = model['name']
-                    model_details = model.get('details', {})
-                    
-                    # Classify model by capabilities
-                    capabilities = self._classify_model_capabilities(model_name, model_details)
-                    
-                    self.models[model_name] = {
-                        'name': model_name,
-                        'family': model_details.get('family', ''),
-                        'parameter_size': model_details.get('parameter_size', ''),
-                        'quantization_level': model_details.get('quantization_level', ''),
-                        'capabilities': capabilities
-                    }
+                # Classify model by capabilities
+                capabilities = self._classify_model_capabilities(model_name, model_details)
+                
+                self.models[model_name] = {
+                    'name': model_name,
+                    'family': model_details.get('family', ''),
+                    'parameter_size': model_details.get('parameter_size', ''),
+                    'quantization_level': model_details.get('quantization_level', ''),
+                    'capabilities': capabilities
+                }
         except Exception as e:
             print(f"Error loading models: {e}")
     
@@ -454,16 +455,21 @@ class ModelChain:
             payload = {
                 "model": model,
                 "prompt": prompt,
+                "stream": False,
                 "options": params
             }
-            response = requests.post(
-                "http://localhost:11434/api/generate",
-                json=payload,
-                timeout=30
-            )
+            cached = cached_response(payload)
+            if cached is not None:
+                return cached['response']
+            
+            with scheduler.get_scheduler().slot(model, scheduler.current_user_key()) as ticket:
+                response = ollama_client.get_client().generate(payload, timeout=30)
             if response.status_code == 200:
                 resp_json = response.json()
+                record_generation('run_model', model, resp_json, ticket.queue_wait)
                 # Ollama returns 'response' key with the generated text
+                if resp_json.get("response"):
+                    remember_response(payload, resp_json["response"], {'eval_count': resp_json.get('eval_count')})
                 return resp_json.get("response", "[No response from model]")
             else:
                 return f"[Error: Model call failed with status {response.status_code}]"
@@ -471,6 +477,11 @@ class ModelChain:
             # Fallback to mock response if Ollama is unavailable
             return f"[MOCK-{model}] Response to: '{prompt}' (error: {str(e)})"
     
+    def _generate_in_slot(self, payload: Dict, timeout: float, user: str) -> Tuple[requests.Response, scheduler.Ticket]:
+        """Wait for a slot on the payload's model, then run one blocking generation in it."""
+        with scheduler.get_scheduler().slot(payload['model'], user) as ticket:
+            return ollama_client.get_client().generate(payload, timeout=timeout), ticket
+    
     async def _run_model(self, model_name: str, prompt: str, parameters: Dict = None) -> str:
         """Run a single model with the given prompt."""
         parameters = parameters or {}
@@ -508,7 +519,20 @@ class ModelChain:
         default_params['model'] = model_name
         default_params['prompt'] = prompt
         
-        print(f"Running model {model_name} with parameters: {default_params}")
+        logger.info("Running model %s", model_name)
+        if logger.isEnabledFor(log.logging.DEBUG):
+            logger.debug("Ollama request: %s", log.redact_payload(default_params))
+        
+        # Deterministic runs and near-duplicate prompts are served from the response caches;
+        # the lookup may call the embeddings API, so it runs off the event loop
+        loop = asyncio.get_running_loop()
+        cached = await loop.run_in_executor(None, cached_response, default_params)
+        if cached is not None:
+            return cached['response']
+        
+        # Waiting for admission and the request itself block, so they run on a worker thread
+        # instead of stalling the event loop; the queueing identity is taken from this request
+        user = scheduler.current_user_key()
         
         try:
             # Add timeout handler with exponential backoff
@@ -518,21 +542,21 @@ class ModelChain:
             
             while retry_count <= max_retries:
                 try:
-                    # Make request to Ollama with current timeout
-                    response = requests.post(
-                        'http://localhost:11434/api/generate',
-                        json=default_params,
-                        timeout=timeout
-                    )
+                    # Make request to Ollama with current timeout, once the model has a free slot
+                    response, ticket = await loop.run_in_executor(
+                        None, self._generate_in_slot, default_params, timeout, user)
                     
                     if response.status_code == 200:
                         result = response.json()
+                        record_generation('model_chain', model_name, result, ticket.queue_wait)
+                        await loop.run_in_executor(None, remember_response, default_params, result.get('response', ''),
+                                                   {'eval_count': result.get('eval_count')})
                         return result.get('response', '')
                     elif response.status_code == 429 or response.status_code >= 500:
                         # Server busy or error - retry with backoff
                         retry_count += 1
                         timeout *= 2  # Double timeout for next attempt
-                        print(f"Server busy, retrying in {timeout} seconds (attempt {retry_count}/{max_retries})")
+                        logger.warning("Server busy, retrying with timeout %ss (attempt %d/%d)", timeout, retry_count, max_retries)
                         await asyncio.sleep(1)  # Small delay before retry
                     else:
                         # Other error - don't retry
@@ -553,7 +577,7 @@ class ModelChain:
                         raise Exception(f"Timed out after {max_retries} retries")
                     
                     timeout *= 2  # Double timeout for next attempt
-                    print(f"Request timed out, retrying with timeout {timeout}s (attempt {retry_count}/{max_retries})")
+                    logger.warning("Request timed out, retrying with timeout %ss (attempt %d/%d)", timeout, retry_count, max_retries)
                     await asyncio.sleep(1)  # Small delay before retry
                     continue
             
@@ -1,9 +1,11 @@
 from flask import Blueprint, jsonify, request, make_response
 from flask_cors import cross_origin
-import requests
 import json
 from pathlib import Path
 import os
+import requests
+
+from . import ollama_client
 
 model_management = Blueprint('model_management', __name__, url_prefix='/model_management')
 
@@ -15,17 +17,13 @@ MODEL_DOWNLOAD_DIR = Path(os.path.expanduser("~/.freethinkers/models/"))
 def list_models():
     """List all available models with CORS support."""
     try:
-        response = requests.get('http://localhost:11434/api/tags')
-        if response.status_code == 200:
-            models = response.json().get('models', [])
-            # Extract just the model names
-            model_names = [model['name'] for model in models]
-            resp = make_response(jsonify(model_names))
-            resp.headers['Access-Control-Allow-Origin'] = '*' 
-            resp.headers['Access-Control-Allow-Methods'] = 'GET'
-            return resp
-        else:
-            return jsonify([]), 500
+        models = ollama_client.get_client().tags()
+        # Extract just the model names
+        model_names = [model['name'] for model in models]
+        resp = make_response(jsonify(model_names))
+        resp.headers['Access-Control-Allow-Origin'] = '*' 
+        resp.headers['Access-Control-Allow-Methods'] = 'GET'
+        return resp
     except Exception as e:
         print(f"Error fetching models: {str(e)}")
         return jsonify([]), 500
@@ -33,10 +31,11 @@ def list_models():
 @model_management.route('/api/models/download', methods=['POST'])
 @cross_origin()
 def download_model():
-    """Download a new model."""
+    """Download a new model onto every healthy Ollama backend, or onto the one named by "backend"."""
     data = request.json
     model_name = data.get('name')
     model_url = data.get('url')
+    backend = data.get('backend')
     
     if not model_name or not model_url:
         return jsonify({
@@ -48,25 +47,33 @@ def download_model():
         # Create download directory if it doesn't exist
         MODEL_DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
         
-        # Download model
-        response = requests.post(
-            'http://localhost:11434/api/pull',
-            json={'name': model_name}
-        )
+        client = ollama_client.get_client()
+        if backend:
+            try:
+                backend = client.registry.get(backend).url
+            except KeyError as e:
+                return jsonify({
+                    'error': str(e),
+                    'status': 'error'
+                }), 400
         
-        if response.status_code == 200:
-            resp = make_response(jsonify({
-                'message': f'Model {model_name} downloaded successfully',
-                'status': 'success'
-            }))
-            resp.headers['Access-Control-Allow-Origin'] = '*' 
-            resp.headers['Access-Control-Allow-Methods'] = 'POST'
-            return resp
-        else:
+        # Download model
+        try:
+            backends = client.pull(model_name, backend=backend, timeout=None)
+        except requests.HTTPError:
             return jsonify({
                 'error': 'Failed to download model',
                 'status': 'error'
             }), 500
+        
+        resp = make_response(jsonify({
+            'message': f'Model {model_name} downloaded successfully',
+            'backends': backends,
+            'status': 'success'
+        }))
+        resp.headers['Access-Control-Allow-Origin'] = '*' 
+        resp.headers['Access-Control-Allow-Methods'] = 'POST'
+        return resp
     except Exception as e:
         print(f"Error downloading model: {str(e)}")
         return jsonify({
@@ -87,7 +94,7 @@ def get_model_version():
         }), 400
     
     try:
-        response = requests.get(f'http://localhost:11434/api/tags/{model_name}')
+        response = ollama_client.get_client().get(f'api/tags/{model_name}')
         if response.status_code == 200:
             model_info = response.json()
             resp = make_response(jsonify({
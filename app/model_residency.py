@@ -0,0 +1,344 @@
+"""
+Model Residency for Free Thinkers
+Keeps the right models loaded in Ollama: preloads default models at startup, pins hot
+models with keep_alive and unloads idle ones when system memory runs short
+"""
+
+import threading
+import time
+from collections import deque
+
+import psutil
+
+from . import metrics, log, ollama_client, scheduler
+from .ollama_client import base_name
+
+logger = log.get_logger('model_residency')
+
+# Defaults (overridable through app config)
+CHECK_INTERVAL = 30          # Seconds between residency checks
+STARTUP_DELAY = 2            # Seconds before the first check, so the app finishes starting
+MEMORY_HIGH_PERCENT = 90     # Start unloading idle models above this much used memory
+MEMORY_LOW_PERCENT = 80      # Stop unloading once usage is expected to be below this
+IDLE_TIMEOUT = 600           # Seconds without a generation before a model counts as idle
+PIN_WINDOW = 600             # Seconds over which uses are counted to decide which models are hot
+PIN_MIN_USES = 3             # Uses within the window that make a model hot
+MAX_PINNED = 2               # Most models pinned at once
+PRELOAD_COUNT = 1            # Models preloaded in 'auto' mode
+PINNED_KEEP_ALIVE = -1       # keep_alive for pinned models (negative = until unloaded)
+
+
+def parse_models(value):
+    """Parse a comma-separated model list."""
+    return [model.strip() for model in (value or '').split(',') if model.strip()]
+
+
+class ResidencyManager:
+    """
+    Decides which models Ollama should keep in memory.
+
+    Generations are reported through touch(); models used often within the
+    pin window are pinned (their requests and a refresh call carry
+    keep_alive -1), and under memory pressure resident models that are idle
+    and not generating are unloaded, least recently used first.
+    """
+
+    def __init__(self, app=None, preload='auto', preload_count=PRELOAD_COUNT, pinned=(),
+                 memory_high=MEMORY_HIGH_PERCENT, memory_low=MEMORY_LOW_PERCENT, idle_timeout=IDLE_TIMEOUT,
+                 pin_window=PIN_WINDOW, pin_min_uses=PIN_MIN_USES, max_pinned=MAX_PINNED,
+                 interval=CHECK_INTERVAL, default_keep_alive=None):
+        """Initialize the manager; call start() to begin preloading and checking."""
+        self.app = app
+        self.preload_setting = preload
+        self.preload_count = preload_count
+        self.configured_pins = {base_name(model) for model in pinned}
+        self.memory_high = memory_high
+        self.memory_low = memory_low
+        self.idle_timeout = idle_timeout
+        self.pin_window = pin_window
+        self.pin_min_uses = pin_min_uses
+        self.max_pinned = max_pinned
+        self.interval = interval
+        self.default_keep_alive = default_keep_alive
+
+        self.uses = {}       # model -> deque of use times (monotonic)
+        self.last_used = {}  # model -> last use (epoch seconds)
+        self.pinned = set(self.configured_pins)
+        self.preloaded = []
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    # Usage tracking
+
+    def touch(self, model):
+        """Record a generation for a model."""
+        if not model:
+            return
+        model = base_name(model)
+        now = time.monotonic()
+        with self.lock:
+            uses = self.uses.setdefault(model, deque())
+            uses.append(now)
+            while uses and now - uses[0] > self.pin_window:
+                uses.popleft()
+            self.last_used[model] = time.time()
+
+    def hot_models(self):
+        """Models to pin: configured pins plus the most used models within the pin window."""
+        now = time.monotonic()
+        with self.lock:
+            counts = {}
+            for model, uses in self.uses.items():
+                while uses and now - uses[0] > self.pin_window:
+                    uses.popleft()
+                if len(uses) >= self.pin_min_uses:
+                    counts[model] = len(uses)
+        ranked = sorted(counts, key=counts.get, reverse=True)
+        hot = [model for model in ranked if model not in self.configured_pins]
+        return self.configured_pins | set(hot[:max(self.max_pinned - len(self.configured_pins), 0)])
+
+    def keep_alive(self, model, default=None):
+        """keep_alive to send with a request for model: pinned models stay loaded until unloaded."""
+        with self.lock:
+            pinned = base_name(model) in self.pinned
+        return PINNED_KEEP_ALIVE if pinned else (default if default is not None else self.default_keep_alive)
+
+    # Candidates
+
+    def candidates(self):
+        """
+        Models worth keeping resident, most wanted first.
+
+        Ranked by how many users chose each as their default model, then by
+        MODEL_PARAMS order; only installed models are returned.
+        """
+        preference_counts = {}
+        model_params = []
+        if self.app is not None:
+            model_params = [base_name(model) for model in self.app.config.get('MODEL_PARAMS', {})]
+            try:
+                from .models import db, UserPreference
+                with self.app.app_context():
+                    rows = (db.session.query(UserPreference.default_model, db.func.count())
+                            .filter(UserPreference.default_model.isnot(None))
+                            .group_by(UserPreference.default_model).all())
+                preference_counts = {base_name(model): count for model, count in rows if model}
+            except Exception as e:
+                logger.debug("Could not read default model preferences: %s", e)
+
+        installed = {base_name(model.get('name')): model.get('name') for model in ollama_client.get_client().tags()}
+        names = list(dict.fromkeys(list(preference_counts) + model_params))
+        order = {model: index for index, model in enumerate(model_params)}
+        names.sort(key=lambda model: (-preference_counts.get(model, 0), order.get(model, len(order))))
+        return [installed[model] for model in names if model in installed]
+
+    def preload_models(self):
+        """Models to load at startup: the configured list, or the top candidates in 'auto' mode."""
+        setting = (self.preload_setting or '').strip()
+        if not setting or setting.lower() in ('off', 'none', '0'):
+            return []
+        if setting.lower() == 'auto':
+            return self.candidates()[:self.preload_count]
+        return parse_models(setting)
+
+    # Ollama calls
+
+    def load(self, model, keep_alive, backend=None):
+        """Load a model (or refresh its expiry) without generating anything."""
+        payload = {'model': model, 'keep_alive': keep_alive if keep_alive is not None else self.default_keep_alive}
+        if payload['keep_alive'] is None:
+            del payload['keep_alive']
+        response = ollama_client.get_client().generate(payload, timeout=ollama_client.STREAM_TIMEOUT, backend=backend)
+        response.raise_for_status()
+
+    def unload(self, model, reason, backend=None):
+        """Ask Ollama (the given backend, or the one the router picks) to evict a model now."""
+        response = ollama_client.get_client().generate({'model': model, 'keep_alive': 0}, backend=backend)
+        response.raise_for_status()
+        metrics.increment('model_unloads_total', model=base_name(model), reason=reason)
+        logger.info("Unloaded %s%s (%s)", model, f" from {backend}" if backend else '', reason)
+
+    def resident(self):
+        """Models currently loaded in Ollama, from /api/ps on every backend."""
+        return ollama_client.get_client().ps()
+
+    # Background work
+
+    def preload(self):
+        """Load the startup models."""
+        for model in self.preload_models():
+            try:
+                started = time.perf_counter()
+                self.load(model, self.keep_alive(model))
+                self.preloaded.append(model)
+                metrics.increment('model_preloads_total', model=base_name(model))
+                logger.info("Preloaded %s in %.1fs", model, time.perf_counter() - started)
+            except Exception as e:
+                logger.warning("Could not preload %s: %s", model, e)
+
+    def update_pins(self, resident):
+        """Pin newly hot models and release cooled ones, refreshing their keep_alive in Ollama."""
+        hot = self.hot_models()
+        with self.lock:
+            added = hot - self.pinned
+            removed = self.pinned - hot
+            self.pinned = hot
+
+        for entry in resident:
+            model = base_name(entry.get('name'))
+            if model not in added | removed:
+                continue
+            try:
+                self.load(entry.get('name'), self.keep_alive(model), backend=entry.get('backend'))
+                logger.info("%s %s", "Pinned" if model in added else "Unpinned", model)
+            except Exception as e:
+                logger.warning("Could not update keep_alive for %s: %s", model, e)
+
+    def relieve_pressure(self, resident):
+        """Unload idle, unpinned models while memory use is above the high-water mark."""
+        memory = psutil.virtual_memory()
+        if memory.percent < self.memory_high:
+            return []
+
+        busy = {base_name(model) for model, state in scheduler.get_scheduler().stats().items() if state['running']}
+        now = time.time()
+        with self.lock:
+            pinned = set(self.pinned)
+            last_used = dict(self.last_used)
+
+        idle = [
+            model for model in resident
+            if base_name(model.get('name')) not in busy
+            and base_name(model.get('name')) not in pinned
+            and now - last_used.get(base_name(model.get('name')), 0) > self.idle_timeout
+        ]
+        # Pinned models are only released when nothing else is left to free
+        if not idle:
+            idle = [model for model in resident
+                    if base_name(model.get('name')) not in busy
+                    and now - last_used.get(base_name(model.get('name')), 0) > self.idle_timeout]
+        idle.sort(key=lambda model: last_used.get(base_name(model.get('name')), 0))
+
+        target = memory.total * self.memory_low / 100
+        used = memory.total - memory.available
+        unloaded = []
+        for model in idle:
+            if used <= target:
+                break
+            try:
+                self.unload(model.get('name'), 'memory_pressure', backend=model.get('backend'))
+                with self.lock:
+                    self.pinned.discard(base_name(model.get('name')))
+                unloaded.append(model.get('name'))
+                used -= model.get('size') or 0
+            except Exception as e:
+                logger.warning("Could not unload %s: %s", model.get('name'), e)
+        if unloaded:
+            logger.warning("Memory at %.0f%%: unloaded %s", memory.percent, ', '.join(unloaded))
+        return unloaded
+
+    def check(self):
+        """One residency pass: update pins, then relieve memory pressure."""
+        try:
+            resident = self.resident()
+        except Exception as e:
+            logger.debug("Ollama /api/ps unavailable: %s", e)
+            return
+        self.update_pins(resident)
+        self.relieve_pressure(resident)
+
+    def run(self):
+        """Preload, then check residency until stopped."""
+        if self.stop_event.wait(STARTUP_DELAY):
+            return
+        self.preload()
+        while not self.stop_event.wait(self.interval):
+            self.check()
+
+    def start(self):
+        """Start the background thread."""
+        self.thread = threading.Thread(target=self.run, name='model-residency', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the background thread."""
+        self.stop_event.set()
+
+    def status(self):
+        """Resident models (from Ollama's /api/ps) with pin and usage state, plus memory use."""
+        try:
+            resident = self.resident()
+            error = None
+        except Exception as e:
+            resident = []
+            error = str(e)
+
+        with self.lock:
+            pinned = set(self.pinned)
+            last_used = dict(self.last_used)
+            recent = {model: len(uses) for model, uses in self.uses.items()}
+
+        memory = psutil.virtual_memory()
+        status = {
+            'resident': [
+                {
+                    'name': model.get('name'),
+                    'size': model.get('size'),
+                    'size_vram': model.get('size_vram'),
+                    'expires_at': model.get('expires_at'),
+                    'backend': model.get('backend'),
+                    'pinned': base_name(model.get('name')) in pinned,
+                    'last_used': last_used.get(base_name(model.get('name'))),
+                    'recent_uses': recent.get(base_name(model.get('name')), 0)
+                }
+                for model in resident
+            ],
+            'pinned': sorted(pinned),
+            'preloaded': list(self.preloaded),
+            'memory_percent': memory.percent,
+            'memory_high_percent': self.memory_high
+        }
+        if error:
+            status['error'] = error
+        return status
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_manager():
+    """Return the process-wide residency manager, creating an idle one on first use."""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = ResidencyManager(preload='')
+    return _manager
+
+
+def init_app(app):
+    """Configure the residency manager from the Flask app config and start it when enabled."""
+    global _manager
+    manager = ResidencyManager(
+        app=app,
+        preload=app.config.get('MODEL_PRELOAD', 'auto'),
+        preload_count=app.config.get('MODEL_PRELOAD_COUNT', PRELOAD_COUNT),
+        pinned=parse_models(app.config.get('MODEL_PINNED')),
+        memory_high=app.config.get('MODEL_MEMORY_HIGH_PERCENT', MEMORY_HIGH_PERCENT),
+        memory_low=app.config.get('MODEL_MEMORY_LOW_PERCENT', MEMORY_LOW_PERCENT),
+        idle_timeout=app.config.get('MODEL_IDLE_TIMEOUT', IDLE_TIMEOUT),
+        pin_min_uses=app.config.get('MODEL_PIN_MIN_USES', PIN_MIN_USES),
+        max_pinned=app.config.get('MODEL_MAX_PINNED', MAX_PINNED),
+        interval=app.config.get('MODEL_RESIDENCY_INTERVAL', CHECK_INTERVAL),
+        default_keep_alive=app.config.get('OLLAMA_KEEP_ALIVE')
+    )
+    with _manager_lock:
+        previous, _manager = _manager, manager
+    if previous is not None:
+        previous.stop()
+    if app.config.get('MODEL_RESIDENCY_ENABLED', True):
+        manager.start()
+    app.extensions['model_residency'] = manager
+    return manager
@@ -4,6 +4,8 @@ API routes for model-specific prompt engineering strategies in Free Thinkers
 
 from flask import Blueprint, request, jsonify
 
+from . import registries
+
 model_strategies_api = Blueprint('model_strategies_api', __name__, url_prefix='/api/model-strategies')
 
 # Static registry of model strategies (expand as needed)
@@ -31,12 +33,16 @@ MODEL_STRATEGIES = {
     # Add more models as needed
 }
 
+registries.register('model_strategies', lambda: registries.prepare_each({
+    model: {'model': model, **strategy} for model, strategy in MODEL_STRATEGIES.items()
+}))
+
 @model_strategies_api.route('', methods=['GET'])
 def get_model_strategy():
     model = request.args.get('model', '').strip()
     if not model:
         return jsonify({'error': 'Model name required'}), 400
-    strategy = MODEL_STRATEGIES.get(model)
-    if not strategy:
+    strategies = registries.get('model_strategies')
+    if model not in strategies:
         return jsonify({'error': f'No strategy found for model {model}'}), 404
-    return jsonify({'model': model, **strategy})
+    return registries.json_response(strategies[model])
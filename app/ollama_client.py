@@ -0,0 +1,546 @@
+"""
+Ollama Client for Free Thinkers
+Shared keep-alive connection pool used by every call to the Ollama API, routing each
+request across one or more Ollama servers with health checks and model affinity
+"""
+
+import contextlib
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import metrics, log
+
+# httpx is only needed for the asyncio streaming endpoints
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+logger = log.get_logger('ollama_client')
+
+# Connection settings (overridable through the environment or app config)
+OLLAMA_BASE_URL = os.environ.get('OLLAMA_BASE_URL', 'http://127.0.0.1:11434')
+OLLAMA_BACKENDS = os.environ.get('OLLAMA_BACKENDS', '')
+OLLAMA_POOL_CONNECTIONS = int(os.environ.get('OLLAMA_POOL_CONNECTIONS', 4))
+OLLAMA_POOL_MAXSIZE = int(os.environ.get('OLLAMA_POOL_MAXSIZE', 32))
+OLLAMA_CONNECT_TIMEOUT = float(os.environ.get('OLLAMA_CONNECT_TIMEOUT', 3.05))
+OLLAMA_ASYNC_MAX_CONNECTIONS = int(os.environ.get('OLLAMA_ASYNC_MAX_CONNECTIONS', 512))
+
+# Read timeouts (seconds) for the different kinds of calls
+LIST_TIMEOUT = 5        # Model listings and metadata
+PROXY_TIMEOUT = 60      # Generic proxied requests
+GENERATE_TIMEOUT = 60   # Non-streaming generations
+STREAM_TIMEOUT = 300    # Streaming generations (time between chunks)
+EMBED_TIMEOUT = 10      # Embedding lookups
+HEALTH_TIMEOUT = 2      # Backend health checks
+
+# Multi-backend routing
+HEALTH_CHECK_INTERVAL = 10  # Seconds between health checks of every backend
+FAILURE_THRESHOLD = 1       # Consecutive connection failures before a backend is drained
+AFFINITY_WEIGHT = 4         # Extra outstanding requests tolerated to reach a backend with the model loaded
+
+# Calls after which a backend holds the model they name (unless they unload it)
+LOADING_PATHS = ('api/generate', 'api/chat', 'api/embeddings', 'api/embed')
+
+
+def base_name(model):
+    """Model name without the default ':latest' tag, for comparing names from different sources."""
+    return model[:-len(':latest')] if model and model.endswith(':latest') else model
+
+
+def is_unload(keep_alive):
+    """Whether a keep_alive value (seconds or a '0s' / '0m' style duration) evicts the model right away."""
+    if isinstance(keep_alive, bool) or keep_alive is None:
+        return False
+    if isinstance(keep_alive, (int, float)):
+        return keep_alive == 0
+    try:
+        return float(str(keep_alive).strip().rstrip('smh') or 'nan') == 0
+    except ValueError:
+        return False
+
+
+def parse_backends(value, default=None):
+    """Parse a comma-separated list of Ollama URLs, falling back to the single default URL."""
+    urls = [url.strip().rstrip('/') for url in (value or '').split(',') if url.strip()]
+    return urls or [(default or OLLAMA_BASE_URL).rstrip('/')]
+
+
+class Backend:
+    """One Ollama server and what the registry knows about it."""
+
+    def __init__(self, url):
+        """Initialize a backend; it is assumed healthy until a request or check fails."""
+        self.url = url.rstrip('/')
+        self.healthy = True
+        self.outstanding = 0
+        self.failures = 0
+        self.loaded = set()    # Models resident according to /api/ps (and recent successful calls)
+        self.installed = None  # Models reported by /api/tags (None until checked)
+        self.last_error = None
+        self.checked_at = None
+
+    def endpoint(self, path):
+        """Full URL of an API path such as 'api/tags' on this backend."""
+        return f"{self.url}/{path.lstrip('/')}"
+
+    def state(self):
+        """Routing state for monitoring."""
+        return {
+            'url': self.url,
+            'healthy': self.healthy,
+            'outstanding': self.outstanding,
+            'loaded': sorted(self.loaded),
+            'installed': len(self.installed) if self.installed is not None else None,
+            'failures': self.failures,
+            'last_error': self.last_error,
+            'checked_at': self.checked_at
+        }
+
+
+class BackendRegistry:
+    """
+    Routes requests across Ollama backends.
+
+    Each request goes to the healthy backend with the fewest outstanding
+    requests, counting AFFINITY_WEIGHT extra for backends that do not have
+    the model loaded, so a model stays on the node that already holds it
+    until that node is busier than a reload is worth. Backends are drained
+    after connection failures and restored by the health check.
+    """
+
+    def __init__(self, urls, failure_threshold=FAILURE_THRESHOLD, affinity_weight=AFFINITY_WEIGHT):
+        """Initialize the registry with one Backend per URL."""
+        self.backends = [Backend(url) for url in urls]
+        self.failure_threshold = failure_threshold
+        self.affinity_weight = affinity_weight
+        self.cursor = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        """Number of backends."""
+        return len(self.backends)
+
+    def get(self, url):
+        """Return the backend with this URL."""
+        url = url.rstrip('/')
+        for backend in self.backends:
+            if backend.url == url:
+                return backend
+        raise KeyError(f"Unknown Ollama backend {url}")
+
+    def choose(self, model=None, exclude=()):
+        """Pick the backend for a request (for model, when the request names one)."""
+        with self.lock:
+            candidates = [backend for backend in self.backends if backend not in exclude] or list(self.backends)
+            # When every backend is drained, still try them: one may have recovered since its last check
+            candidates = [backend for backend in candidates if backend.healthy] or candidates
+
+            name = base_name(model)
+            if name:
+                installed = [backend for backend in candidates
+                             if backend.installed is None or name in backend.installed]
+                candidates = installed or candidates
+
+            def cost(backend):
+                penalty = 0 if not name or name in backend.loaded else self.affinity_weight
+                return backend.outstanding + penalty
+
+            # Rotate the starting point so ties are spread round-robin
+            self.cursor = (self.cursor + 1) % len(candidates)
+            rotated = candidates[self.cursor:] + candidates[:self.cursor]
+            return min(rotated, key=cost)
+
+    def begin(self, backend):
+        """Count a request as outstanding on a backend."""
+        with self.lock:
+            backend.outstanding += 1
+        metrics.increment('ollama_backend_requests_total', backend=backend.url)
+
+    def observe(self, backend, path, body):
+        """
+        Update the models a backend holds after it answered a request
+        successfully: generations and embeddings load their model, unloads
+        (keep_alive 0) and deletes remove it. Other calls leave it as is.
+        """
+        if not isinstance(body, dict):
+            return
+        name = base_name(body.get('model') or body.get('name'))
+        if not name:
+            return
+        path = path.strip('/')
+        with self.lock:
+            if path == 'api/delete':
+                backend.loaded.discard(name)
+                if backend.installed is not None:
+                    backend.installed.discard(name)
+            elif path == 'api/pull':
+                if backend.installed is not None:
+                    backend.installed.add(name)
+            elif path in LOADING_PATHS:
+                if is_unload(body.get('keep_alive')):
+                    backend.loaded.discard(name)
+                else:
+                    backend.loaded.add(name)
+
+    def end(self, backend):
+        """Count a request as finished."""
+        with self.lock:
+            backend.outstanding = max(backend.outstanding - 1, 0)
+
+    def succeeded(self, backend):
+        """Reset the failure count after a backend answered."""
+        with self.lock:
+            backend.failures = 0
+
+    def failed(self, backend, error):
+        """Record a connection failure, draining the backend once it reaches the threshold."""
+        with self.lock:
+            backend.failures += 1
+            backend.last_error = str(error)
+            drained = backend.healthy and backend.failures >= self.failure_threshold
+            if drained:
+                backend.healthy = False
+                backend.loaded.clear()
+        metrics.increment('ollama_backend_failures_total', backend=backend.url)
+        if drained:
+            metrics.increment('ollama_backend_drains_total', backend=backend.url)
+            logger.warning("Draining Ollama backend %s: %s", backend.url, error)
+
+    def check(self, session, timeout=HEALTH_TIMEOUT, connect_timeout=OLLAMA_CONNECT_TIMEOUT):
+        """Health-check every backend, refreshing its loaded and installed models."""
+        for backend in self.backends:
+            try:
+                response = session.get(backend.endpoint('api/tags'), timeout=(connect_timeout, timeout))
+                response.raise_for_status()
+                installed = {base_name(model.get('name')) for model in response.json().get('models', [])}
+                response = session.get(backend.endpoint('api/ps'), timeout=(connect_timeout, timeout))
+                loaded = ({base_name(model.get('name')) for model in response.json().get('models', [])}
+                          if response.ok else None)
+            except (requests.RequestException, ValueError) as e:
+                backend.checked_at = time.time()
+                self.failed(backend, e)
+                continue
+
+            with self.lock:
+                restored = not backend.healthy
+                backend.healthy = True
+                backend.failures = 0
+                backend.last_error = None
+                backend.installed = installed
+                if loaded is not None:
+                    backend.loaded = loaded
+                backend.checked_at = time.time()
+            if restored:
+                logger.info("Ollama backend %s is healthy again", backend.url)
+
+    def stats(self):
+        """Routing state of every backend."""
+        with self.lock:
+            return [backend.state() for backend in self.backends]
+
+
+class OllamaClient:
+    """
+    Thin wrapper around a pooled requests.Session pointed at one or more Ollama servers.
+
+    The session keeps connections alive between calls, so token streams and
+    model listings reuse sockets instead of opening a new one per request.
+    Requests naming a model are routed by BackendRegistry; a connection
+    failure drains the backend and the request is retried on another one.
+    """
+
+    def __init__(self, base_url=None, pool_connections=None, pool_maxsize=None,
+                 connect_timeout=None, backends=None, failure_threshold=None, affinity_weight=None):
+        """Initialize the client and its connection pool."""
+        urls = list(backends) if backends else parse_backends(OLLAMA_BACKENDS, base_url)
+        self.registry = BackendRegistry(
+            urls,
+            failure_threshold=failure_threshold or FAILURE_THRESHOLD,
+            affinity_weight=affinity_weight if affinity_weight is not None else AFFINITY_WEIGHT
+        )
+        self.base_url = self.registry.backends[0].url
+        self.pool_connections = max(pool_connections or OLLAMA_POOL_CONNECTIONS, len(urls))
+        self.pool_maxsize = pool_maxsize or OLLAMA_POOL_MAXSIZE
+        self.connect_timeout = connect_timeout or OLLAMA_CONNECT_TIMEOUT
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=0
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.health_stop = threading.Event()
+        self.health_thread = None
+
+    def url(self, path):
+        """Build a full Ollama URL for an API path such as 'api/tags' (on the first backend)."""
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def _timeout(self, timeout):
+        """Combine the shared connect timeout with a per-call read timeout (None = wait indefinitely)."""
+        if isinstance(timeout, tuple):
+            return timeout
+        return (self.connect_timeout, timeout)
+
+    def request(self, method, path, timeout=PROXY_TIMEOUT, model=None, backend=None, **kwargs):
+        """
+        Send a request to Ollama through the shared session.
+
+        The backend is chosen for model (taken from the JSON body when not
+        given) unless a backend URL is passed. Streaming responses count as
+        outstanding until they are closed.
+        """
+        if model is None and isinstance(kwargs.get('json'), dict):
+            model = kwargs['json'].get('model')
+
+        tried = []
+        while True:
+            target = self.registry.get(backend) if backend else self.registry.choose(model, exclude=tried)
+            self.registry.begin(target)
+            try:
+                response = self.session.request(method, target.endpoint(path), timeout=self._timeout(timeout), **kwargs)
+            except requests.ConnectionError as e:
+                self.registry.end(target)
+                self.registry.failed(target, e)
+                tried.append(target)
+                if backend or len(tried) >= len(self.registry):
+                    raise
+                logger.info("Retrying %s %s on another backend after %s failed", method, path, target.url)
+                continue
+            except Exception:
+                self.registry.end(target)
+                raise
+
+            self.registry.succeeded(target)
+            if response.ok:
+                self.registry.observe(target, path, kwargs.get('json'))
+            if kwargs.get('stream'):
+                self._release_on_close(response, target)
+            else:
+                self.registry.end(target)
+            return response
+
+    def _release_on_close(self, response, target):
+        """Keep a streaming request outstanding until its response is closed."""
+        close = response.close
+        released = threading.Event()
+
+        def close_and_release():
+            if not released.is_set():
+                released.set()
+                self.registry.end(target)
+            close()
+
+        response.close = close_and_release
+
+    def get(self, path, timeout=LIST_TIMEOUT, **kwargs):
+        """Send a GET request to Ollama."""
+        return self.request('GET', path, timeout=timeout, **kwargs)
+
+    def post(self, path, timeout=GENERATE_TIMEOUT, **kwargs):
+        """Send a POST request to Ollama."""
+        return self.request('POST', path, timeout=timeout, **kwargs)
+
+    def generate(self, payload, stream=False, timeout=None, backend=None):
+        """
+        Call /api/generate.
+
+        Streaming responses must be closed (or used as a context manager) so
+        the connection goes back to the pool.
+        """
+        if timeout is None:
+            timeout = STREAM_TIMEOUT if stream else GENERATE_TIMEOUT
+        return self.post('api/generate', json=payload, stream=stream, timeout=timeout, backend=backend)
+
+    def chat(self, payload, stream=False, timeout=None):
+        """Call /api/chat with structured messages; close streaming responses as above."""
+        if timeout is None:
+            timeout = STREAM_TIMEOUT if stream else GENERATE_TIMEOUT
+        return self.post('api/chat', json=payload, stream=stream, timeout=timeout)
+
+    def embeddings(self, model, text, timeout=EMBED_TIMEOUT):
+        """Return the embedding vector for text from /api/embeddings."""
+        response = self.post('api/embeddings', json={'model': model, 'prompt': text}, timeout=timeout)
+        response.raise_for_status()
+        return response.json().get('embedding', [])
+
+    def healthy_backends(self):
+        """URLs of the healthy backends (the first backend when none is)."""
+        return [backend['url'] for backend in self.registry.stats() if backend['healthy']] or [self.base_url]
+
+    def pull(self, model, backend=None, timeout=None):
+        """
+        Pull model onto one backend, or onto every healthy backend so requests
+        for it can be routed to any of them; returns the backend URLs. Large
+        models take a long time, so by default there is no read timeout.
+        """
+        urls = [backend] if backend else self.healthy_backends()
+        for url in urls:
+            response = self.post('api/pull', json={'name': model}, timeout=timeout, backend=url)
+            response.raise_for_status()
+        return urls
+
+    def _each_backend(self, path, timeout):
+        """GET path from every healthy backend; yields (backend URL, JSON body)."""
+        backends = self.healthy_backends()
+        for url in backends:
+            try:
+                response = self.get(path, timeout=timeout, backend=url)
+                response.raise_for_status()
+            except requests.RequestException as e:
+                if len(backends) == 1:
+                    raise
+                logger.warning("Skipping Ollama backend %s for %s: %s", url, path, e)
+                continue
+            yield url, response.json()
+
+    def tags(self, timeout=LIST_TIMEOUT):
+        """Return the raw model list reported by /api/tags (merged across backends)."""
+        models = {}
+        for _, data in self._each_backend('api/tags', timeout):
+            for model in data.get('models', []):
+                models.setdefault(model.get('name'), model)
+        return list(models.values())
+
+    def ps(self, timeout=LIST_TIMEOUT):
+        """Return the loaded models reported by /api/ps on every backend, each tagged with its 'backend'."""
+        models = []
+        for url, data in self._each_backend('api/ps', timeout):
+            models.extend(dict(model, backend=url) for model in data.get('models', []))
+        return models
+
+    def check_backends(self):
+        """Run one round of health checks."""
+        self.registry.check(self.session, connect_timeout=self.connect_timeout)
+
+    def start_health_checks(self, interval=HEALTH_CHECK_INTERVAL):
+        """Health-check every backend in the background (only useful with several backends)."""
+        def run():
+            while not self.health_stop.is_set():
+                self.check_backends()
+                self.health_stop.wait(interval)
+
+        self.health_thread = threading.Thread(target=run, name='ollama-health', daemon=True)
+        self.health_thread.start()
+
+    def close(self):
+        """Stop health checks and close every pooled connection."""
+        self.health_stop.set()
+        self.session.close()
+
+
+class AsyncOllamaClient:
+    """
+    asyncio counterpart of OllamaClient built on httpx.AsyncClient.
+
+    One instance serves every concurrent stream on an event loop, so token
+    streams are bounded by the connection limit rather than by threads. It
+    routes through the sync client's registry when given one, so both share
+    outstanding counts and backend health.
+    """
+
+    def __init__(self, base_url=None, max_connections=None, connect_timeout=None, registry=None):
+        """Initialize the async client and its connection pool."""
+        if httpx is None:
+            raise RuntimeError("httpx is required for async streaming (pip install httpx)")
+
+        self.registry = registry or BackendRegistry(parse_backends(OLLAMA_BACKENDS, base_url))
+        self.base_url = self.registry.backends[0].url
+        self.connect_timeout = connect_timeout or OLLAMA_CONNECT_TIMEOUT
+        limits = httpx.Limits(
+            max_connections=max_connections or OLLAMA_ASYNC_MAX_CONNECTIONS,
+            max_keepalive_connections=OLLAMA_POOL_MAXSIZE
+        )
+        self.client = httpx.AsyncClient(limits=limits)
+
+    def _timeout(self, timeout):
+        """Combine the shared connect timeout with a per-call read timeout."""
+        return httpx.Timeout(timeout, connect=self.connect_timeout)
+
+    @contextlib.asynccontextmanager
+    async def stream(self, method, path, timeout=STREAM_TIMEOUT, model=None, **kwargs):
+        """Open a streaming request on the chosen backend; use as an async context manager."""
+        if model is None and isinstance(kwargs.get('json'), dict):
+            model = kwargs['json'].get('model')
+
+        tried = []
+        while True:
+            target = self.registry.choose(model, exclude=tried)
+            self.registry.begin(target)
+            try:
+                request = self.client.build_request(method, target.endpoint(path), timeout=self._timeout(timeout), **kwargs)
+                try:
+                    response = await self.client.send(request, stream=True)
+                except httpx.ConnectError as e:
+                    self.registry.failed(target, e)
+                    tried.append(target)
+                    if len(tried) >= len(self.registry):
+                        raise
+                    logger.info("Retrying %s %s on another backend after %s failed", method, path, target.url)
+                    continue
+
+                self.registry.succeeded(target)
+                if response.is_success:
+                    self.registry.observe(target, path, kwargs.get('json'))
+                try:
+                    yield response
+                finally:
+                    await response.aclose()
+                return
+            finally:
+                self.registry.end(target)
+
+    def generate(self, payload, timeout=STREAM_TIMEOUT):
+        """Stream /api/generate; use as an async context manager."""
+        return self.stream('POST', 'api/generate', json=payload, timeout=timeout)
+
+    def chat(self, payload, timeout=STREAM_TIMEOUT):
+        """Stream /api/chat; use as an async context manager."""
+        return self.stream('POST', 'api/chat', json=payload, timeout=timeout)
+
+    async def aclose(self):
+        """Close every pooled connection."""
+        await self.client.aclose()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide Ollama client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = OllamaClient()
+    return _client
+
+
+def init_app(app):
+    """Configure the shared client from the Flask app config."""
+    global _client
+    backends = parse_backends(app.config.get('OLLAMA_BACKENDS'), app.config.get('OLLAMA_BASE_URL'))
+    client = OllamaClient(
+        backends=backends,
+        pool_connections=app.config.get('OLLAMA_POOL_CONNECTIONS'),
+        pool_maxsize=app.config.get('OLLAMA_POOL_MAXSIZE'),
+        connect_timeout=app.config.get('OLLAMA_CONNECT_TIMEOUT'),
+        failure_threshold=app.config.get('OLLAMA_FAILURE_THRESHOLD'),
+        affinity_weight=app.config.get('OLLAMA_AFFINITY_WEIGHT')
+    )
+    with _client_lock:
+        previous, _client = _client, client
+    if previous is not None:
+        previous.close()
+    if len(backends) > 1:
+        client.start_health_checks(app.config.get('OLLAMA_HEALTH_CHECK_INTERVAL', HEALTH_CHECK_INTERVAL))
+    app.extensions['ollama_client'] = client
+    return client
@@ -0,0 +1,215 @@
+"""
+Prompt Guides for Free Thinkers
+Per-model usage guides and recommended parameters shown in the model selector
+"""
+
+import copy
+
+# Comprehensive guides based on prompt engineering roadmap
+PROMPT_GUIDES = {
+    # Large language models
+    'llama3.1:8b': {
+        'title': 'Llama 3.1 (8B) - Detailed Reasoning',
+        'useCases': 'Ideal for complex reasoning, logic puzzles, and creative writing. This model excels at step-by-step problem solving and detailed explanations.',
+        'examples': 'Explain the process of photosynthesis and how it relates to global carbon cycles.',
+        'tips': 'Use chain-of-thought prompting by asking the model to "think step by step" for best results.'
+    },
+    'llama3.2:latest': {
+        'title': 'Llama 3.2 - General Purpose',
+        'useCases': 'A versatile, general-purpose model for everyday tasks, creative writing, and information retrieval.',
+        'examples': 'What are the key differences between nuclear fusion and nuclear fission?',
+        'tips': 'For complex queries, try breaking them down into sequential parts for more accurate responses.'
+    },
+    'mistral-7b:latest': {
+        'title': 'Mistral 7B - Precise Information',
+        'useCases': 'Excellent for factual information, code explanation, and technical content. This model prioritizes accuracy.',
+        'examples': 'Explain how TCP/IP protocols ensure reliable data transmission across networks.',
+        'tips': 'Use clear, explicit instructions and consider formatting requirements for structured outputs.'
+    },
+
+    # Smaller/specialized models
+    'phi3:3.8b': {
+        'title': 'Phi-3 (3.8B) - Concise Reasoning',
+        'useCases': 'Optimized for reasoning tasks despite its smaller size. Good for when you need efficient, concise responses.',
+        'examples': 'What are three key considerations when designing a sustainable urban transportation system?',
+        'tips': 'This model works well with few-shot examples when you need specific response formats.'
+    },
+    'gemma3:4b': {
+        'title': 'Gemma 3 (4B) - Efficient Assistant',
+        'useCases': 'A compact but capable model for general information and assistance with lower compute requirements.',
+        'examples': 'Give me a quick explanation of how blockchain technology works.',
+        'tips': 'Provide clear context and be specific with your requirements for best results.'
+    },
+    'gemma3:1b': {
+        'title': 'Gemma 3 (1B) - Quick Responses',
+        'useCases': 'Ultra-lightweight model for basic tasks and quick responses when efficiency is prioritized over detail.',
+        'examples': 'What are three healthy breakfast ideas that take less than 10 minutes to prepare?',
+        'tips': 'Keep queries simple and focused. Avoid complex reasoning tasks.'
+    },
+    'zephyr:latest': {
+        'title': 'Zephyr - Instruction Following',
+        'useCases': 'Excellent at following precise instructions and formatting requirements. Good for structured outputs.',
+        'examples': 'Create a 5-day itinerary for visiting Tokyo, with each day focused on a different area of the city.',
+        'tips': 'Use clear formatting instructions like "respond with a numbered list" or "format as a table".'
+    },
+
+    # Code models
+    'codegemma:2b': {
+        'title': 'CodeGemma (2B) - Code Generation',
+        'useCases': 'Specialized for programming tasks, code explanation, and debugging assistance.',
+        'examples': 'Write a Python function that checks if a string is a valid palindrome, ignoring spaces and punctuation.',
+        'tips': 'Specify the programming language, desired functionality, and any specific requirements or constraints.'
+    },
+
+    # Math models
+    'qwen2-math:1.5b': {
+        'title': 'Qwen2 Math (1.5B) - Mathematical Reasoning',
+        'useCases': 'Specialized for mathematical problems, equations, and numerical reasoning tasks.',
+        'examples': 'Solve the following system of equations: 2x + 3y = 7, 4x - 2y = 10',
+        'tips': 'Ask the model to show its work step-by-step for complex math problems.'
+    },
+
+    # Multimodal models
+    'llava-phi3:latest': {
+        'title': 'LLaVA-Phi3 - Visual Understanding',
+        'useCases': 'Multimodal model capable of understanding and describing images alongside text.',
+        'examples': 'Upload an image and ask: "Describe what you see in this image in detail."',
+        'tips': 'For best results with images, ask specific questions about visual elements rather than general descriptions.'
+    },
+
+    # Specialty models
+    'falcon3:1b': {
+        'title': 'Falcon 3 (1B) - Quick Responses',
+        'useCases': 'Fast, efficient model for simple tasks and basic information requests.',
+        'examples': 'What are the key ingredients in a classic carbonara pasta?',
+        'tips': 'Keep queries concise and straightforward for this lightweight model.'
+    },
+    'llama2-uncensored:7b': {
+        'title': 'Llama 2 Uncensored (7B)',
+        'useCases': 'Model with fewer content restrictions for research and creative writing purposes.',
+        'examples': 'Write a horror short story set in an abandoned research facility.',
+        'tips': 'Remember that while less restricted, ethical considerations still apply.'
+    },
+
+    # Default fallback guide
+    'default': {
+        'title': 'General AI Assistant',
+        'useCases': 'Ask questions on virtually any topic, request creative content, or get assistance with various tasks.',
+        'examples': 'Explain the concept of quantum computing in simple terms.',
+        'tips': 'Be specific with your questions and provide relevant context for better results.'
+    }
+}
+
+# Model-specific parameter recommendations for each model
+# This supports the parameter optimization part of the prompt engineering roadmap
+PARAMETER_RECOMMENDATIONS = {
+    'llama3.1:8b': {
+        'temperature': 0.7,
+        'top_p': 0.9,
+        'top_k': 40,
+        'context_window': 0.95,
+        'max_tokens': 2048
+    },
+    'llama3.2:latest': {
+        'temperature': 0.7,
+        'top_p': 0.9,
+        'top_k': 40,
+        'context_window': 0.95,
+        'max_tokens': 2048
+    },
+    'mistral-7b:latest': {
+        'temperature': 0.7,
+        'top_p': 0.9,
+        'top_k': 40,
+        'context_window': 0.95,
+        'max_tokens': 2048
+    },
+    'phi3:3.8b': {
+        'temperature': 0.8,
+        'top_p': 0.9,
+        'top_k': 40,
+        'context_window': 0.95,
+        'max_tokens': 1024
+    },
+    'gemma3:4b': {
+        'temperature': 0.8,
+        'top_p': 0.9,
+        'top_k': 40,
+        'context_window': 0.95,
+        'max_tokens': 1024
+    },
+    'gemma3:1b': {
+        'temperature': 0.8,
+        'top_p': 0.9,
+        'top_k': 40,
+        'context_window': 0.9,
+        'max_tokens': 512
+    },
+    'zephyr:latest': {
+        'temperature': 0.7,
+        'top_p': 0.9,
+        'top_k': 40,
+        'context_window': 0.95,
+        'max_tokens': 1024
+    },
+    'codegemma:2b': {
+        'temperature': 0.3,  # Lower temperature for more deterministic code
+        'top_p': 0.95,
+        'top_k': 40,
+        'context_window': 0.9,
+        'max_tokens': 1024
+    },
+    'qwen2-math:1.5b': {
+        'temperature': 0.1,  # Very low temperature for math precision
+        'top_p': 0.95,
+        'top_k': 40,
+        'context_window': 0.9,
+        'max_tokens': 1024
+    },
+    'llava-phi3:latest': {
+        'temperature': 0.7,
+        'top_p': 0.9,
+        'top_k': 40,
+        'context_window': 0.95,
+        'max_tokens': 1024
+    },
+    'falcon3:1b': {
+        'temperature': 0.8,
+        'top_p': 0.9,
+        'top_k': 40,
+        'context_window': 0.8,
+        'max_tokens': 512
+    },
+    'llama2-uncensored:7b': {
+        'temperature': 0.8,  # Higher for more creative outputs
+        'top_p': 0.95,
+        'top_k': 40,
+        'context_window': 0.95,
+        'max_tokens': 2048
+    },
+    'default': {
+        'temperature': 0.7,
+        'top_p': 0.9,
+        'top_k': 40,
+        'context_window': 0.9,
+        'max_tokens': 1024
+    }
+}
+
+
+def build_prompt_guides():
+    """Return the guides with each model's parameter recommendations merged in."""
+    guides = copy.deepcopy(PROMPT_GUIDES)
+    for model_name, params in PARAMETER_RECOMMENDATIONS.items():
+        if model_name in guides:
+            guides[model_name]['parameters'] = dict(params)
+    return guides
+
+
+def model_guides(model_params):
+    """Return the prompt guide and limits of every model in MODEL_PARAMS that has a guide."""
+    return {
+        model: {'guide': params['prompt_guide'], 'limits': params.get('limits', {})}
+        for model, params in (model_params or {}).items()
+        if 'prompt_guide' in params
+    }
@@ -652,13 +652,17 @@ MODEL_TEMPLATE_MAPPING = {
 # Default for unknown models
 DEFAULT_TEMPLATES = CLAUDE_TEMPLATES
 
-def get_templates_for_model(model_name):
-    """Return the appropriate template set for a specific model."""
+def template_set_name(model_name):
+    """Return the MODEL_TEMPLATE_MAPPING key used for a model, or None for the defaults."""
     # Find the closest match if exact model not found
-    for model_pattern, templates in MODEL_TEMPLATE_MAPPING.items():
+    for model_pattern in MODEL_TEMPLATE_MAPPING:
         if model_pattern in model_name:
-            return templates
-    return DEFAULT_TEMPLATES
+            return model_pattern
+    return None
+
+def get_templates_for_model(model_name):
+    """Return the appropriate template set for a specific model."""
+    return MODEL_TEMPLATE_MAPPING.get(template_set_name(model_name), DEFAULT_TEMPLATES)
 
 def fill_template(template_name, model_name, **kwargs):
     """Fill a template with provided values."""
@@ -679,8 +683,10 @@ def fill_template(template_name, model_name, **kwargs):
 
 def list_templates_for_model(model_name):
     """Return the list of available templates for a model."""
-    templates = get_templates_for_model(model_name)
-    
+    return describe_templates(get_templates_for_model(model_name))
+
+def describe_templates(templates):
+    """Return the public description of each template in a template set."""
     result = []
     for key, template in templates.items():
         result.append({
@@ -0,0 +1,100 @@
+"""
+Response Registries for Free Thinkers
+Read-only lookup data (prompt and model guides, templates, strategies) built once,
+serialized to JSON bytes with a strong ETag, and answered with 304 when unchanged
+"""
+
+import hashlib
+import threading
+
+from flask import current_app, request
+
+from . import metrics
+
+
+class PreparedResponse:
+    """A JSON body serialized once, with the ETag of its bytes."""
+
+    def __init__(self, value):
+        """Serialize value exactly as jsonify would."""
+        self.body = current_app.json.response(value).get_data()
+        self.etag = hashlib.sha256(self.body).hexdigest()[:32]
+
+
+def prepare(value):
+    """Serialize a JSON value for a registry that answers with one response."""
+    return PreparedResponse(value)
+
+
+def prepare_each(values):
+    """Serialize every value of a dict separately, for registries looked up by key."""
+    return {key: PreparedResponse(value) for key, value in values.items()}
+
+
+class Registry:
+    """
+    One registry: a build function and the config value it is derived from.
+
+    The build runs on first use and again whenever source() returns a
+    different object (e.g. MODEL_PARAMS replaced after create_app).
+    """
+
+    def __init__(self, name, build, source=None):
+        """Initialize the registry; build(source_value) returns prepared responses."""
+        self.name = name
+        self.build = build
+        self.source = source
+        self.lock = threading.Lock()
+        self.token = None
+        self.value = None
+
+    def get(self):
+        """Return the prepared responses, building them if missing or out of date."""
+        token = self.source() if self.source else None
+        value = self.value
+        if value is not None and token is self.token:
+            return value
+        with self.lock:
+            if self.value is None or token is not self.token:
+                self.value = self.build(token) if self.source else self.build()
+                self.token = token
+                metrics.increment('registry_builds_total', registry=self.name)
+            return self.value
+
+    def invalidate(self):
+        """Drop the prepared responses so the next lookup rebuilds them."""
+        with self.lock:
+            self.value = None
+
+
+_registries = {}
+
+
+def register(name, build, source=None):
+    """Register (or replace) a registry built by build, optionally derived from source()."""
+    _registries[name] = Registry(name, build, source)
+    return _registries[name]
+
+
+def get(name):
+    """Return a registry's prepared responses."""
+    return _registries[name].get()
+
+
+def invalidate(name=None):
+    """Rebuild one registry, or all of them, on next use (after editing the data in place)."""
+    for registry in ([_registries[name]] if name else _registries.values()):
+        registry.invalidate()
+
+
+def json_response(prepared):
+    """
+    Answer with prepared JSON bytes.
+
+    Clients must revalidate, but a matching If-None-Match gets an empty
+    304 so repeat loads only pay for the round trip.
+    """
+    response = current_app.response_class(prepared.body, mimetype='application/json')
+    response.set_etag(prepared.etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
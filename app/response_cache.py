@@ -0,0 +1,192 @@
+"""
+Response Cache for Free Thinkers
+Content-addressed cache of deterministic generations (temperature 0 or a fixed seed),
+with an in-memory LRU in front of an on-disk tier
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from . import metrics, log
+from .conversation_store import MemoryTier, FileTier
+
+logger = log.get_logger('response_cache')
+
+# Constants
+CACHE_DIR = Path(os.path.expanduser("~/.freethinkers/response_cache/"))
+MAX_MEMORY_RESPONSES = 512
+CACHE_MAX_AGE = 30 * 24 * 3600  # Cached responses older than a month are pruned
+
+# Request fields that determine the output; everything else in a flat payload is an option
+CONTENT_FIELDS = ('model', 'prompt', 'messages', 'system', 'template', 'format', 'images')
+# Transport fields that never affect the output
+TRANSPORT_FIELDS = ('stream', 'keep_alive')
+# Runtime options that change speed or memory use but not the tokens produced
+RUNTIME_OPTIONS = ('num_gpu', 'num_thread', 'num_batch', 'f16_kv', 'use_gpu', 'gpu_layers', 'low_vram')
+
+
+def request_options(payload):
+    """Return the sampling options of an Ollama payload (nested 'options' or flat keys)."""
+    if isinstance(payload.get('options'), dict):
+        return payload['options']
+    return {
+        key: value for key, value in payload.items()
+        if key not in CONTENT_FIELDS and key not in TRANSPORT_FIELDS
+    }
+
+
+def normalize_options(options):
+    """Drop runtime-only options and canonicalize numbers so equal settings hash equally."""
+    normalized = {}
+    for key, value in options.items():
+        if key in RUNTIME_OPTIONS or value is None:
+            continue
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        normalized[key] = value
+    return normalized
+
+
+def is_deterministic(payload):
+    """A request is cacheable when sampling is greedy (temperature 0) or seeded."""
+    options = request_options(payload)
+    try:
+        if options.get('temperature') is not None and float(options['temperature']) == 0:
+            return True
+    except (TypeError, ValueError):
+        return False
+    seed = options.get('seed')
+    return seed is not None and seed != -1
+
+
+def cache_key(payload):
+    """Hash the model, prompt content and normalized options of an Ollama payload."""
+    content = {}
+    for field in CONTENT_FIELDS:
+        if payload.get(field) is None:
+            continue
+        if field == 'images':
+            # Hash images individually so the key material stays small
+            content[field] = [hashlib.sha256(str(image).encode('utf-8')).hexdigest() for image in payload[field]]
+        else:
+            content[field] = payload[field]
+    content['options'] = normalize_options(request_options(payload))
+
+    material = json.dumps(content, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier cache of generated text keyed by request content.
+
+    Only deterministic requests are looked up or stored; lookups promote
+    disk hits into the memory tier.
+    """
+
+    def __init__(self, memory=None, persistent=None):
+        """Initialize the cache with its tiers."""
+        self.memory = memory or MemoryTier(MAX_MEMORY_RESPONSES)
+        self.persistent = persistent
+
+    def get(self, payload):
+        """Return the cached entry for a payload, or None (also None for non-deterministic requests)."""
+        if not is_deterministic(payload):
+            return None
+
+        key = cache_key(payload)
+        entry = self.memory.get(key)
+        if entry is not None:
+            metrics.increment('response_cache_hits_total', tier='memory')
+            return entry
+
+        if self.persistent is not None:
+            entry = self.persistent.get(key)
+            if entry is not None:
+                self.memory.put(key, entry)
+                metrics.increment('response_cache_hits_total', tier='disk')
+                return entry
+
+        metrics.increment('response_cache_misses_total')
+        return None
+
+    def put(self, payload, response, stats=None):
+        """Store a completed response for a deterministic payload; returns True if stored."""
+        if not response or not is_deterministic(payload):
+            return False
+
+        key = cache_key(payload)
+        entry = {
+            'model': payload.get('model'),
+            'response': response,
+            'stats': stats or {},
+            'created_at': time.time()
+        }
+        self.memory.put(key, entry)
+        if self.persistent is not None:
+            try:
+                self.persistent.put(key, entry)
+            except OSError as e:
+                logger.warning("Error persisting cached response %s: %s", key, e)
+        metrics.increment('response_cache_stores_total')
+        return True
+
+
+_cache = None
+_configured = False  # True once a cache (or None when disabled) has been set up
+_cache_lock = threading.Lock()
+
+
+def create_cache(backend='file', memory_size=MAX_MEMORY_RESPONSES, directory=CACHE_DIR, max_age=CACHE_MAX_AGE):
+    """Create a cache for a backend name: 'memory', 'file', or 'off' (returns None)."""
+    if backend == 'off':
+        return None
+    if backend == 'memory':
+        return ResponseCache(MemoryTier(memory_size))
+    if backend == 'file':
+        persistent = FileTier(directory)
+        persistent.prune(max_age)
+        return ResponseCache(MemoryTier(memory_size), persistent)
+    raise ValueError(f"Unknown response cache backend '{backend}'")
+
+
+def get_cache():
+    """Return the process-wide response cache (None when disabled)."""
+    global _cache, _configured
+    if not _configured:
+        with _cache_lock:
+            if not _configured:
+                _cache = create_cache(os.environ.get('RESPONSE_CACHE_BACKEND', 'file'))
+                _configured = True
+    return _cache
+
+
+def init_app(app):
+    """Configure the shared response cache from the Flask app config."""
+    global _cache, _configured
+    cache = create_cache(
+        backend=app.config.get('RESPONSE_CACHE_BACKEND', 'file'),
+        memory_size=app.config.get('RESPONSE_CACHE_MEMORY_SIZE', MAX_MEMORY_RESPONSES),
+        max_age=app.config.get('RESPONSE_CACHE_MAX_AGE', CACHE_MAX_AGE)
+    )
+    with _cache_lock:
+        _cache = cache
+        _configured = True
+    app.extensions['response_cache'] = cache
+    return cache
+
+
+def lookup(payload):
+    """Return the cached entry for a payload, or None when missing or caching is disabled."""
+    cache = get_cache()
+    return cache.get(payload) if cache is not None else None
+
+
+def store(payload, response, stats=None):
+    """Cache a completed response when caching is enabled."""
+    cache = get_cache()
+    return cache.put(payload, response, stats) if cache is not None else False
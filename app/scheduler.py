@@ -0,0 +1,300 @@
+"""
+Generation Scheduler for Free Thinkers
+Per-model admission control with fair round-robin queueing across users and guests
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from . import metrics
+
+# Defaults (overridable through the environment or app config)
+DEFAULT_CONCURRENCY = int(os.environ.get('GENERATION_CONCURRENCY', 2))
+MAX_QUEUE_LENGTH = int(os.environ.get('GENERATION_QUEUE_LIMIT', 64))
+QUEUE_TIMEOUT = float(os.environ.get('GENERATION_QUEUE_TIMEOUT', 300))
+QUEUE_UPDATE_INTERVAL = 1.0  # Seconds between queue position updates over SSE
+INITIAL_SERVICE_TIME = 10.0  # Assumed generation time before any have been measured
+
+
+class QueueFullError(Exception):
+    """Raised when a model's queue cannot accept another request."""
+
+
+class QueueTimeoutError(Exception):
+    """Raised when a request waited longer than the queue timeout."""
+
+
+def parse_concurrency_limits(value):
+    """Parse 'model=2,other=1' into a dict of per-model limits."""
+    limits = {}
+    for item in (value or '').split(','):
+        if '=' in item:
+            model, limit = item.rsplit('=', 1)
+            limits[model.strip()] = int(limit)
+    return limits
+
+
+class Ticket:
+    """A request's place in a model queue."""
+
+    def __init__(self, model, user, slots=1):
+        """Initialize a waiting ticket that needs slots of the model's concurrency."""
+        self.model = model
+        self.user = user
+        self.slots = slots
+        self.enqueued_at = time.monotonic()
+        self.admitted_at = None
+        self.admitted = threading.Event()
+        self.callbacks = []
+
+    @property
+    def queue_wait(self):
+        """Seconds spent waiting before admission (so far, if still waiting)."""
+        end = self.admitted_at if self.admitted_at is not None else time.monotonic()
+        return end - self.enqueued_at
+
+    def wait(self, timeout=None):
+        """Block until admitted; returns False if the timeout elapsed first."""
+        return self.admitted.wait(timeout)
+
+    def add_callback(self, callback):
+        """Call callback() once the ticket is admitted (immediately if it already is)."""
+        self.callbacks.append(callback)
+        if self.admitted.is_set():
+            callback()
+
+    def _admit(self):
+        """Mark the ticket admitted and notify waiters."""
+        self.admitted_at = time.monotonic()
+        self.admitted.set()
+        for callback in self.callbacks:
+            callback()
+
+
+class ModelQueue:
+    """Admission state for one model: running count plus per-user FIFO queues."""
+
+    def __init__(self, limit):
+        """Initialize an idle queue."""
+        self.limit = limit
+        self.running = 0
+        self.waiting = OrderedDict()  # user -> deque of tickets, in round-robin order
+        self.service_time = INITIAL_SERVICE_TIME
+
+    def __len__(self):
+        """Number of waiting tickets."""
+        return sum(len(tickets) for tickets in self.waiting.values())
+
+    def fair_order(self):
+        """List waiting tickets in the order they will be admitted."""
+        queues = [list(tickets) for tickets in self.waiting.values()]
+        order = []
+        depth = 0
+        while True:
+            layer = [tickets[depth] for tickets in queues if depth < len(tickets)]
+            if not layer:
+                return order
+            order.extend(layer)
+            depth += 1
+
+    def can_admit(self, ticket):
+        """Whether the ticket's slots are free."""
+        return self.running + ticket.slots <= self.limit
+
+    def peek(self):
+        """The next ticket to be admitted."""
+        return next(iter(self.waiting.values()))[0]
+
+    def pop_next(self):
+        """Take the next ticket, rotating the user it came from to the back."""
+        user, tickets = next(iter(self.waiting.items()))
+        ticket = tickets.popleft()
+        del self.waiting[user]
+        if tickets:
+            self.waiting[user] = tickets
+        return ticket
+
+
+class GenerationScheduler:
+    """
+    Admission control in front of every generation call.
+
+    Each model gets a concurrency limit; requests beyond it wait in per-user
+    queues served round-robin, so one heavy user cannot starve others.
+    """
+
+    def __init__(self, default_limit=DEFAULT_CONCURRENCY, limits=None, max_queue=MAX_QUEUE_LENGTH,
+                 queue_timeout=QUEUE_TIMEOUT):
+        """Initialize the scheduler."""
+        self.default_limit = max(1, default_limit)
+        self.limits = limits or {}
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.queues = {}
+        self.lock = threading.Lock()
+
+    def _queue(self, model):
+        """Get (or create) the queue for a model; caller holds the lock."""
+        queue = self.queues.get(model)
+        if queue is None:
+            queue = ModelQueue(max(1, self.limits.get(model, self.default_limit)))
+            self.queues[model] = queue
+        return queue
+
+    def submit(self, model, user, exclusive=False):
+        """
+        Enqueue a request and admit it right away if the model has capacity.
+
+        An exclusive ticket takes every slot of the model: it is admitted once
+        the generations already running finish, and nothing else runs on the
+        model until it is released.
+        """
+        with self.lock:
+            queue = self._queue(model)
+            ticket = Ticket(model, user or 'anonymous', queue.limit if exclusive else 1)
+            if queue.can_admit(ticket) and not queue.waiting:
+                queue.running += ticket.slots
+                ticket._admit()
+            elif len(queue) >= self.max_queue:
+                metrics.increment('queue_rejected_total', model=model)
+                raise QueueFullError(f"Too many requests queued for model '{model}'")
+            else:
+                queue.waiting.setdefault(ticket.user, deque()).append(ticket)
+        if ticket.admitted.is_set():
+            self._record_admission(ticket)
+        return ticket
+
+    def release(self, ticket):
+        """Give back a slot (or leave the queue if never admitted) and admit the next request."""
+        admitted = []
+        with self.lock:
+            queue = self._queue(ticket.model)
+            if ticket.admitted.is_set():
+                queue.running = max(0, queue.running - ticket.slots)
+                elapsed = time.monotonic() - ticket.admitted_at
+                queue.service_time = 0.8 * queue.service_time + 0.2 * elapsed
+            else:
+                tickets = queue.waiting.get(ticket.user)
+                if tickets and ticket in tickets:
+                    tickets.remove(ticket)
+                    if not tickets:
+                        del queue.waiting[ticket.user]
+                metrics.increment('queue_abandoned_total', model=ticket.model)
+
+            while queue.waiting and queue.can_admit(queue.peek()):
+                next_ticket = queue.pop_next()
+                queue.running += next_ticket.slots
+                next_ticket._admit()
+                admitted.append(next_ticket)
+
+        for next_ticket in admitted:
+            self._record_admission(next_ticket)
+
+    def _record_admission(self, ticket):
+        """Record queue wait for the metrics endpoint."""
+        metrics.increment('queue_admitted_total', model=ticket.model)
+        metrics.increment('queue_wait_seconds_total', ticket.queue_wait, model=ticket.model)
+
+    def position(self, ticket):
+        """Return (position, estimated_wait_seconds); position 0 means admitted."""
+        if ticket.admitted.is_set():
+            return 0, 0.0
+        with self.lock:
+            queue = self._queue(ticket.model)
+            order = queue.fair_order()
+            position = order.index(ticket) + 1 if ticket in order else len(order)
+            estimated_wait = math.ceil(position / queue.limit) * queue.service_time
+        return position, round(estimated_wait, 1)
+
+    def queue_status(self, ticket):
+        """Queue update payload sent to clients while they wait."""
+        position, estimated_wait = self.position(ticket)
+        return {'queue': {'model': ticket.model, 'position': position, 'estimated_wait': estimated_wait}}
+
+    def queue_updates(self, ticket, interval=QUEUE_UPDATE_INTERVAL):
+        """Yield queue status updates every interval seconds until the ticket is admitted."""
+        deadline = ticket.enqueued_at + self.queue_timeout
+        while not ticket.admitted.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise QueueTimeoutError(f"Timed out waiting for model '{ticket.model}'")
+            yield self.queue_status(ticket)
+            ticket.wait(min(interval, remaining))
+
+    @contextmanager
+    def slot(self, model, user=None, timeout=None, exclusive=False):
+        """Block until a slot (every slot, if exclusive) for model is free, hold it for the with block, then release it."""
+        ticket = self.submit(model, user, exclusive=exclusive)
+        try:
+            if not ticket.wait(timeout if timeout is not None else self.queue_timeout):
+                raise QueueTimeoutError(f"Timed out waiting for model '{model}'")
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def stats(self):
+        """Current load per model."""
+        with self.lock:
+            return {
+                model: {
+                    'limit': queue.limit,
+                    'running': queue.running,
+                    'waiting': len(queue),
+                    'waiting_users': len(queue.waiting),
+                    'avg_service_time': round(queue.service_time, 2)
+                }
+                for model, queue in self.queues.items()
+            }
+
+
+def user_key(session, remote_addr=None):
+    """Identify a requester for fair queueing: logged-in user, guest id, or client address."""
+    if session.get('_user_id'):
+        return f"user:{session['_user_id']}"
+    if session.get('guest_id'):
+        return session['guest_id']
+    return f"ip:{remote_addr or 'unknown'}"
+
+
+def current_user_key():
+    """Queueing identity of the current Flask request."""
+    from flask import has_request_context, request, session
+
+    if not has_request_context():
+        return 'anonymous'
+    return user_key(session, request.remote_addr)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Return the process-wide scheduler, creating it on first use."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = GenerationScheduler(
+                    limits=parse_concurrency_limits(os.environ.get('MODEL_CONCURRENCY'))
+                )
+    return _scheduler
+
+
+def init_app(app):
+    """Configure the shared scheduler from the Flask app config."""
+    global _scheduler
+    scheduler = GenerationScheduler(
+        default_limit=app.config.get('GENERATION_CONCURRENCY', DEFAULT_CONCURRENCY),
+        limits=parse_concurrency_limits(app.config.get('MODEL_CONCURRENCY')),
+        max_queue=app.config.get('GENERATION_QUEUE_LIMIT', MAX_QUEUE_LENGTH),
+        queue_timeout=app.config.get('GENERATION_QUEUE_TIMEOUT', QUEUE_TIMEOUT)
+    )
+    with _scheduler_lock:
+        _scheduler = scheduler
+    app.extensions['generation_scheduler'] = scheduler
+    return scheduler
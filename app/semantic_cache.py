@@ -0,0 +1,292 @@
+"""
+Semantic Cache for Free Thinkers
+Near-duplicate prompt cache: a paraphrase of an earlier single-turn prompt is answered
+from the cache when its embedding is close enough to one the same model already answered
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from . import metrics, log, ollama_client
+
+logger = log.get_logger('semantic_cache')
+
+# Defaults (overridable through the environment or app config)
+DEFAULT_EMBED_MODEL = 'nomic-embed-text'
+DEFAULT_THRESHOLD = 0.92
+MAX_ENTRIES_PER_MODEL = 1000
+LOCAL_EMBED_DIM = 512
+INITIAL_ROWS = 64
+REMOTE_RETRY_INTERVAL = 60  # Seconds before retrying Ollama embeddings after a failure
+
+
+def normalize(vector):
+    """Scale a vector to unit length so dot products are cosine similarities."""
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def local_embedding(text, dim=LOCAL_EMBED_DIM):
+    """Embed text as a signed, hashed bag of words and word bigrams (no model required)."""
+    words = re.findall(r"[a-z0-9']+", text.lower())
+    features = words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature in features:
+        digest = hashlib.md5(feature.encode('utf-8')).digest()
+        index = int.from_bytes(digest[:4], 'little') % dim
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+    return vector
+
+
+def cache_query(payload):
+    """
+    Extract (context, text) to embed from an Ollama payload.
+
+    Only single-turn requests without images are eligible; the context is a
+    hash of the system prompt so answers given under different instructions
+    are never mixed. Returns None for ineligible payloads.
+    """
+    if payload.get('images'):
+        return None
+
+    messages = payload.get('messages')
+    if messages is not None:
+        if any(message.get('images') or message.get('role') == 'assistant' for message in messages):
+            return None
+        user_messages = [message.get('content', '') for message in messages if message.get('role') == 'user']
+        if len(user_messages) != 1:
+            return None
+        system = '\n'.join(message.get('content', '') for message in messages if message.get('role') == 'system')
+        text = user_messages[0]
+    else:
+        system = payload.get('system') or ''
+        text = payload.get('prompt') or ''
+
+    if not text.strip():
+        return None
+    return hashlib.sha256(system.encode('utf-8')).hexdigest()[:16], text
+
+
+class Embedder:
+    """Embeds text with an Ollama embedding model, falling back to the local embedder."""
+
+    def __init__(self, model=DEFAULT_EMBED_MODEL):
+        """Initialize the embedder; an empty model name always uses the local embedder."""
+        self.model = model
+        self.failed_at = None
+
+    def embed(self, text):
+        """Return (embedder_name, unit vector) for text."""
+        if self.model and (self.failed_at is None or time.monotonic() - self.failed_at > REMOTE_RETRY_INTERVAL):
+            try:
+                vector = np.asarray(ollama_client.get_client().embeddings(self.model, text), dtype=np.float32)
+                if vector.size:
+                    self.failed_at = None
+                    return f"ollama:{self.model}", normalize(vector)
+            except Exception as e:
+                logger.warning("Ollama embeddings unavailable, using local embedder: %s", e)
+            self.failed_at = time.monotonic()
+        return 'local', normalize(local_embedding(text))
+
+
+class VectorIndex:
+    """Rows of unit vectors in one NumPy matrix, with least-recently-used eviction."""
+
+    def __init__(self, dim, capacity=MAX_ENTRIES_PER_MODEL):
+        """Initialize an empty index; the matrix grows on demand up to capacity rows."""
+        self.capacity = capacity
+        self.vectors = np.zeros((min(INITIAL_ROWS, capacity), dim), dtype=np.float32)
+        self.last_used = np.zeros(len(self.vectors))
+        self.entries = []
+
+    def search(self, vector):
+        """Return (row, cosine similarity) of the closest vector, or (None, 0.0) when empty."""
+        if not self.entries:
+            return None, 0.0
+        scores = self.vectors[:len(self.entries)] @ vector
+        row = int(np.argmax(scores))
+        return row, float(scores[row])
+
+    def touch(self, row):
+        """Mark a row as recently used."""
+        self.last_used[row] = time.monotonic()
+
+    def add(self, vector, entry):
+        """Insert a vector; returns True if the least recently used row was evicted for it."""
+        evicted = False
+        if len(self.entries) < self.capacity:
+            row = len(self.entries)
+            if row == len(self.vectors):
+                rows = min(self.capacity, len(self.vectors) * 2)
+                self.vectors = np.resize(self.vectors, (rows, self.vectors.shape[1]))
+                self.last_used = np.resize(self.last_used, rows)
+            self.entries.append(entry)
+        else:
+            row = int(np.argmin(self.last_used))
+            self.entries[row] = entry
+            evicted = True
+
+        self.vectors[row] = vector
+        self.touch(row)
+        return evicted
+
+
+class SemanticCache:
+    """
+    Per-model semantic cache of single-turn answers.
+
+    Models opt in by name ('*' enables every model). Vectors are kept in one
+    index per model, system prompt and embedder, so vectors of different
+    dimensions or meaning are never compared.
+    """
+
+    def __init__(self, models=(), threshold=DEFAULT_THRESHOLD, embedder=None, max_entries=MAX_ENTRIES_PER_MODEL):
+        """Initialize the cache."""
+        self.models = set(models)
+        self.threshold = threshold
+        self.embedder = embedder or Embedder()
+        self.max_entries = max_entries
+        self.indexes = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='semantic-cache')
+
+    def enabled_for(self, model):
+        """Check whether a model has opted in."""
+        return '*' in self.models or model in self.models
+
+    def _prepare(self, payload):
+        """Return (index key, text) for an eligible payload, else None."""
+        model = payload.get('model')
+        if not model or not self.enabled_for(model):
+            return None
+        query = cache_query(payload)
+        if query is None:
+            return None
+        context, text = query
+        return (model, context), text
+
+    def lookup(self, payload):
+        """Return a cached entry (with its similarity) for a near-duplicate prompt, or None."""
+        prepared = self._prepare(payload)
+        if prepared is None:
+            return None
+        (model, context), text = prepared
+        embedder_name, vector = self.embedder.embed(text)
+
+        with self.lock:
+            index = self.indexes.get((model, context, embedder_name))
+            row, similarity = index.search(vector) if index is not None else (None, 0.0)
+            if row is not None and similarity >= self.threshold:
+                index.touch(row)
+                entry = dict(index.entries[row], similarity=round(similarity, 4))
+            else:
+                entry = None
+
+        if entry is None:
+            metrics.increment('semantic_cache_misses_total', model=model)
+        else:
+            metrics.increment('semantic_cache_hits_total', model=model)
+        return entry
+
+    def store(self, payload, response):
+        """Add an answer to the model's index."""
+        prepared = self._prepare(payload)
+        if prepared is None or not response:
+            return False
+        (model, context), text = prepared
+        embedder_name, vector = self.embedder.embed(text)
+
+        entry = {'model': model, 'prompt': text, 'response': response, 'created_at': time.time()}
+        with self.lock:
+            key = (model, context, embedder_name)
+            index = self.indexes.get(key)
+            if index is None:
+                index = self.indexes[key] = VectorIndex(len(vector), self.max_entries)
+            evicted = index.add(vector, entry)
+
+        if evicted:
+            metrics.increment('semantic_cache_evictions_total', model=model)
+        return True
+
+    def store_async(self, payload, response):
+        """Store in the background so embedding never delays the end of a stream."""
+        if self._prepare(payload) is not None and response:
+            self.executor.submit(self.store, payload, response)
+
+    def stats(self):
+        """Entries and hit rate per opted-in model."""
+        with self.lock:
+            entries = {}
+            for (model, _, _), index in self.indexes.items():
+                entries[model] = entries.get(model, 0) + len(index.entries)
+
+        result = {}
+        for model in set(entries) | (self.models - {'*'}):
+            hits = metrics.get_counter('semantic_cache_hits_total', model=model)
+            misses = metrics.get_counter('semantic_cache_misses_total', model=model)
+            result[model] = {
+                'entries': entries.get(model, 0),
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+                'evictions': metrics.get_counter('semantic_cache_evictions_total', model=model)
+            }
+        return result
+
+
+def parse_models(value):
+    """Parse a comma-separated model list ('*' for all models)."""
+    return [model.strip() for model in (value or '').split(',') if model.strip()]
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the process-wide semantic cache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SemanticCache(
+                    models=parse_models(os.environ.get('SEMANTIC_CACHE_MODELS')),
+                    threshold=float(os.environ.get('SEMANTIC_CACHE_THRESHOLD', DEFAULT_THRESHOLD)),
+                    embedder=Embedder(os.environ.get('SEMANTIC_CACHE_EMBED_MODEL', DEFAULT_EMBED_MODEL))
+                )
+    return _cache
+
+
+def init_app(app):
+    """Configure the shared semantic cache from the Flask app config."""
+    global _cache
+    cache = SemanticCache(
+        models=parse_models(app.config.get('SEMANTIC_CACHE_MODELS')),
+        threshold=app.config.get('SEMANTIC_CACHE_THRESHOLD', DEFAULT_THRESHOLD),
+        embedder=Embedder(app.config.get('SEMANTIC_CACHE_EMBED_MODEL', DEFAULT_EMBED_MODEL)),
+        max_entries=app.config.get('SEMANTIC_CACHE_MAX_ENTRIES', MAX_ENTRIES_PER_MODEL)
+    )
+    with _cache_lock:
+        _cache = cache
+    app.extensions['semantic_cache'] = cache
+    return cache
+
+
+def lookup(payload):
+    """Return a cached answer for a near-duplicate prompt, or None."""
+    cache = get_cache()
+    return cache.lookup(payload) if cache.models else None
+
+
+def store(payload, response):
+    """Remember an answer for later near-duplicates (in the background)."""
+    cache = get_cache()
+    if cache.models:
+        cache.store_async(payload, response)
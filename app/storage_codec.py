@@ -0,0 +1,161 @@
+"""
+Storage Codec for Free Thinkers
+Writes JSON data files compact and compressed (zstd with the zstandard package, gzip
+otherwise) and reads them back, along with legacy plain JSON, whatever codec wrote them
+"""
+
+import gzip
+import json
+import os
+from pathlib import Path
+
+from . import log
+
+# zstd is optional; without it files are gzip-compressed
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = log.get_logger('storage')
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+class Codec:
+    """A compression format and the suffix its files get (e.g. summary.json.zst)."""
+
+    def __init__(self, name, suffix, compress):
+        """Initialize the codec; decompression is detected from the data itself."""
+        self.name = name
+        self.suffix = suffix
+        self.compress = compress
+
+
+def _zstd_compress(data):
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+
+
+CODECS = {
+    'zstd': Codec('zstd', '.zst', _zstd_compress),
+    # mtime=0 keeps the output identical for identical content
+    'gzip': Codec('gzip', '.gz', lambda data: gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)),
+    'none': Codec('none', '', lambda data: data)
+}
+
+# Every suffix a file may carry, so readers find it whichever codec wrote it
+SUFFIXES = tuple(codec.suffix for codec in CODECS.values())
+
+
+def get_codec(name='auto'):
+    """Look up a codec by name; 'auto' is zstd when available, else gzip."""
+    if name == 'auto':
+        name = 'zstd' if zstandard is not None else 'gzip'
+    elif name == 'zstd' and zstandard is None:
+        logger.warning("STORAGE_CODEC is zstd but the zstandard package is not installed; using gzip")
+        name = 'gzip'
+    if name not in CODECS:
+        raise ValueError(f"Unknown storage codec '{name}'")
+    return CODECS[name]
+
+
+def decode(data):
+    """Decompress data written by any codec, detected by its magic bytes; plain data is returned as is."""
+    if data.startswith(GZIP_MAGIC):
+        return gzip.decompress(data)
+    if data.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise ValueError("zstd-compressed data, but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+
+def dumps(value):
+    """Serialize value as compact UTF-8 JSON."""
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def variants(base):
+    """Paths base may have been written to, one per codec (base is the plain path, e.g. x.json)."""
+    return [Path(str(base) + suffix) for suffix in SUFFIXES]
+
+
+def find(base):
+    """The existing file written for base, newest first if a codec change left several; or None."""
+    existing = [path for path in variants(base) if path.exists()]
+    if not existing:
+        return None
+    return max(existing, key=lambda path: path.stat().st_mtime)
+
+
+def find_all(directory, suffix='.json'):
+    """Map names to the file written for them in directory, e.g. {'abc': Path('abc.json.gz')}."""
+    found = {}
+    for path in Path(directory).glob(f'*{suffix}*'):
+        for codec_suffix in SUFFIXES:
+            ending = suffix + codec_suffix
+            if path.name.endswith(ending):
+                name = path.name[:-len(ending)]
+                if name not in found or path.stat().st_mtime > found[name].stat().st_mtime:
+                    found[name] = path
+                break
+    return found
+
+
+def write_json(base, value, codec=None):
+    """
+    Write value as compact JSON through codec, atomically, and remove the
+    variants of base written by other codecs.
+
+    Returns (path, bytes written).
+    """
+    codec = codec or default_codec()
+    data = codec.compress(dumps(value))
+    path = Path(str(base) + codec.suffix)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    for other in variants(base):
+        if other != path and other.exists():
+            other.unlink()
+    return path, len(data)
+
+
+def read_json(path):
+    """Read a JSON file written by any codec, or a legacy plain (indented) one."""
+    with open(path, 'rb') as f:
+        return json.loads(decode(f.read()))
+
+
+def remove(base):
+    """Delete every variant of base; returns whether any existed."""
+    removed = False
+    for path in variants(base):
+        if path.exists():
+            path.unlink()
+            removed = True
+    return removed
+
+
+_codec = None
+
+
+def default_codec():
+    """The codec new files are written with (STORAGE_CODEC)."""
+    global _codec
+    if _codec is None:
+        _codec = get_codec(os.environ.get('STORAGE_CODEC', 'auto'))
+    return _codec
+
+
+def init_app(app):
+    """Select the codec for new files from the app config."""
+    global _codec
+    _codec = get_codec(app.config.get('STORAGE_CODEC', 'auto'))
+    app.extensions['storage_codec'] = _codec
+    logger.info("Writing data files with the %s codec", _codec.name)
+    return _codec
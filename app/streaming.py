@@ -0,0 +1,629 @@
+"""
+Streaming helpers for Free Thinkers
+Shared request building and SSE framing for the sync and async chat endpoints
+"""
+
+import json
+import queue
+import threading
+import time
+
+from . import metrics, model_residency, response_cache, semantic_cache, conversation_store, log
+
+logger = log.get_logger('streaming')
+
+# Model parameters forwarded from MODEL_PARAMS to Ollama when present
+OLLAMA_PASSTHROUGH_PARAMS = ['num_gpu', 'num_thread', 'num_batch', 'f16_kv', 'use_gpu', 'gpu_layers']
+
+# Chat modes: 'chat' sends structured messages to /api/chat so Ollama can reuse
+# the KV cache for the unchanged prefix; 'generate' sends one flattened prompt
+CHAT_MODES = ('chat', 'generate')
+CHAT_ROLES = ('system', 'user', 'assistant')
+
+DEFAULT_IMAGE_PROMPT = "Describe this image in detail."
+
+# Default SSE flush policy: emit a frame once this much time has passed or this
+# many bytes of text are buffered, whichever comes first (0/0 = one frame per chunk)
+DEFAULT_FLUSH_INTERVAL_MS = 50
+DEFAULT_FLUSH_BYTES = 512
+
+# Cached responses are replayed in frames of this many characters, without pacing
+REPLAY_FRAME_CHARS = 4096
+
+# Seconds a stream waits on the upstream before checking whether it was cancelled,
+# so Stop works while the model is still loading or evaluating the prompt
+CANCEL_POLL_INTERVAL = 0.25
+
+# Marks the end of a stream read by paced_lines()
+_END_OF_STREAM = object()
+
+
+def format_chat_prompt(messages):
+    """Flatten a message list into the 'User: ... Assistant:' prompt format."""
+    parts = []
+    for msg in messages:
+        role = msg.get('role', 'user')
+        content = msg.get('content', '')
+        if role == 'user':
+            parts.append(f"User: {content}\n")
+        elif role == 'assistant':
+            parts.append(f"Assistant: {content}\n")
+
+    # Add final assistant prompt
+    parts.append("Assistant:")
+    return "".join(parts)
+
+
+def build_generate_payload(model, prompt, parameters, model_params, images=None, keep_alive=None):
+    """Build the /api/generate request body for a streaming generation."""
+    payload = {
+        'model': model,
+        'prompt': prompt,
+        'stream': True,
+        'temperature': float(parameters.get('temperature', 0.7)),
+        'top_p': float(parameters.get('top_p', 0.95)),
+        'top_k': int(parameters.get('top_k', 40))
+    }
+    if parameters.get('seed') is not None:
+        payload['seed'] = int(parameters['seed'])
+    if images:
+        payload['images'] = images
+    if keep_alive:
+        payload['keep_alive'] = keep_alive
+
+    # Add other params if available in model_params
+    for key in OLLAMA_PASSTHROUGH_PARAMS:
+        if key in model_params:
+            payload[key] = model_params[key]
+
+    return payload
+
+
+def normalize_messages(messages, system_prompt=None):
+    """
+    Reduce messages to role/content pairs with a stable leading system prompt.
+
+    Extra client-side fields (ids, timestamps) are dropped so that the prefix
+    sent on turn N+1 is byte-identical to what was sent on turn N.
+    """
+    normalized = []
+    for msg in messages:
+        role = msg.get('role', 'user')
+        if role in CHAT_ROLES:
+            normalized.append({'role': role, 'content': msg.get('content', '')})
+
+    if system_prompt and not (normalized and normalized[0]['role'] == 'system'):
+        normalized.insert(0, {'role': 'system', 'content': system_prompt})
+
+    return normalized
+
+
+def build_chat_payload(model, messages, parameters, model_params, keep_alive=None, system_prompt=None):
+    """Build the /api/chat request body for a streaming multi-turn generation."""
+    options = {
+        'temperature': float(parameters.get('temperature', 0.7)),
+        'top_p': float(parameters.get('top_p', 0.95)),
+        'top_k': int(parameters.get('top_k', 40))
+    }
+    if parameters.get('seed') is not None:
+        options['seed'] = int(parameters['seed'])
+
+    # Add other params if available in model_params
+    for key in OLLAMA_PASSTHROUGH_PARAMS:
+        if key in model_params:
+            options[key] = model_params[key]
+
+    payload = {
+        'model': model,
+        'messages': normalize_messages(messages, system_prompt),
+        'stream': True,
+        'options': options
+    }
+    if keep_alive:
+        payload['keep_alive'] = keep_alive
+
+    return payload
+
+
+def build_conversation_request(conversation, model_params, config):
+    """
+    Build the Ollama request for a stored conversation.
+
+    Returns (api_path, payload) using the conversation's chat mode, falling
+    back to the deployment default in config.
+    """
+    model = conversation.get('model', 'mistral-7b')
+    messages = conversation.get('messages', [])
+    parameters = conversation.get('parameters', {})
+    keep_alive = model_residency.get_manager().keep_alive(model, config.get('OLLAMA_KEEP_ALIVE'))
+
+    chat_mode = conversation.get('chat_mode') or config.get('OLLAMA_CHAT_MODE', 'chat')
+    if chat_mode == 'chat':
+        payload = build_chat_payload(model, messages, parameters, model_params,
+                                     keep_alive=keep_alive,
+                                     system_prompt=config.get('CHAT_SYSTEM_PROMPT'))
+        return 'api/chat', payload
+
+    payload = build_generate_payload(model, format_chat_prompt(messages), parameters,
+                                     model_params, keep_alive=keep_alive)
+    return 'api/generate', payload
+
+
+def prompt_eval_stats(payload, final_chunk, previous_turn=None):
+    """
+    Summarize prompt evaluation from Ollama's final chunk.
+
+    prompt_eval_count only counts tokens Ollama actually evaluated. The
+    previous turn of the conversation (its 'model', 'prompt_tokens' and
+    'eval_count', as returned in 'turn') left its prompt and reply in the KV
+    cache; when this turn evaluated fewer tokens than that context holds,
+    the context was reused. A cache miss re-evaluates at least that many
+    tokens, so it reports no reuse (as does the first turn).
+
+    Returns (stats for the done event, turn to store with the conversation).
+    """
+    if not final_chunk or 'prompt_eval_count' not in final_chunk:
+        return None, None
+
+    evaluated = final_chunk.get('prompt_eval_count') or 0
+    model = payload.get('model')
+    reused = 0
+    if previous_turn and previous_turn.get('model') == model:
+        context = (previous_turn.get('prompt_tokens') or 0) + (previous_turn.get('eval_count') or 0)
+        if evaluated < context:
+            reused = context
+    stats = {
+        'prompt_eval_count': evaluated,
+        'prompt_tokens': reused + evaluated,
+        'prompt_tokens_reused': reused
+    }
+    turn = {'model': model, 'prompt_tokens': reused + evaluated, 'eval_count': final_chunk.get('eval_count') or 0}
+    return stats, turn
+
+
+# Ollama durations (nanoseconds) recorded as histograms in seconds
+OLLAMA_TIMINGS = (
+    ('load_duration', 'generation_load_seconds'),
+    ('prompt_eval_duration', 'generation_prompt_eval_seconds'),
+    ('eval_duration', 'generation_eval_seconds'),
+    ('total_duration', 'generation_total_seconds')
+)
+
+
+def record_generation(endpoint, model, final_chunk, queue_wait=None):
+    """
+    Record a finished generation's timings per model and endpoint.
+
+    final_chunk is Ollama's last stream chunk (or a non-streaming response
+    body), which carries load, prompt evaluation and generation durations.
+    """
+    labels = {'model': model or 'unknown', 'endpoint': endpoint}
+    model_residency.get_manager().touch(model)
+    if queue_wait is not None:
+        metrics.observe('generation_queue_wait_seconds', queue_wait, **labels)
+    if not final_chunk:
+        return
+
+    for field, name in OLLAMA_TIMINGS:
+        if final_chunk.get(field):
+            metrics.observe(name, final_chunk[field] / 1e9, **labels)
+
+    eval_count = final_chunk.get('eval_count')
+    eval_duration = final_chunk.get('eval_duration')
+    if eval_count and eval_duration:
+        metrics.observe('generation_tokens_per_second', eval_count / (eval_duration / 1e9), **labels)
+        metrics.increment('generation_eval_tokens_total', eval_count, **labels)
+    if final_chunk.get('prompt_eval_count'):
+        metrics.increment('generation_prompt_eval_tokens_total', final_chunk['prompt_eval_count'], **labels)
+
+
+def parse_image_request(form, files):
+    """
+    Validate a multipart image chat request.
+
+    Returns (model, prompt, parameters, image_file) and raises ValueError
+    with a user-facing message when the upload is missing or invalid.
+    """
+    model = form.get('model', 'llava-phi3:latest')
+    prompt = form.get('prompt', '') or DEFAULT_IMAGE_PROMPT
+    parameters = {
+        'temperature': float(form.get('temperature', 0.7)),
+        'top_p': float(form.get('top_p', 0.95)),
+        'top_k': int(form.get('top_k', 40))
+    }
+    if form.get('seed'):
+        parameters['seed'] = int(form['seed'])
+
+    # Check if image is in the request
+    if 'image' not in files:
+        raise ValueError("No image uploaded")
+
+    image_file = files['image']
+
+    # Validate image file
+    if image_file.filename == '':
+        raise ValueError("Empty image file")
+
+    # Check if it's a valid image type
+    if not (image_file.content_type or '').startswith('image/'):
+        raise ValueError("Invalid file type. Please upload an image.")
+
+    return model, prompt, parameters, image_file
+
+
+def cached_response(payload):
+    """Look a payload up in the exact response cache, then in the semantic cache."""
+    return response_cache.lookup(payload) or semantic_cache.lookup(payload)
+
+
+def remember_response(payload, text, stats=None):
+    """Offer a completed generation to both caches (each decides whether it is eligible)."""
+    response_cache.store(payload, text, stats)
+    semantic_cache.store(payload, text)
+
+
+def sse_event(data):
+    """Frame a JSON-serializable object as one SSE event."""
+    return f"data: {json.dumps(data)}\n\n"
+
+
+def chunk_text(chunk):
+    """Return the generated text carried by a /api/generate or /api/chat chunk."""
+    if 'response' in chunk:
+        return chunk['response']
+    message = chunk.get('message')
+    if isinstance(message, dict):
+        return message.get('content')
+    return None
+
+
+def parse_chunk(line):
+    """Decode one NDJSON line from Ollama; returns None for blank or invalid lines."""
+    if not line:
+        return None
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError as e:
+        logger.warning("JSON decode error: %s (line of %d bytes)", e, len(line))
+        return None
+
+
+def flush_policy(overrides, config):
+    """
+    Resolve the SSE flush policy for a request.
+
+    Per-request values (stream_flush_ms / stream_flush_bytes) win over the
+    deployment defaults in config. Returns (interval_seconds, max_bytes).
+    """
+    interval_ms = overrides.get('stream_flush_ms')
+    if interval_ms is None:
+        interval_ms = config.get('SSE_FLUSH_INTERVAL_MS', DEFAULT_FLUSH_INTERVAL_MS)
+    max_bytes = overrides.get('stream_flush_bytes')
+    if max_bytes is None:
+        max_bytes = config.get('SSE_FLUSH_BYTES', DEFAULT_FLUSH_BYTES)
+    return max(0.0, float(interval_ms) / 1000.0), max(0, int(max_bytes))
+
+
+class TokenCoalescer:
+    """
+    Buffer streamed tokens and release them in batches.
+
+    The first token is released at once so batching never delays the time
+    to first token. After that a batch is released when the buffer reaches
+    max_bytes, or once the oldest buffered token is older than the flush
+    interval: callers wait for the next token at most timeout() seconds
+    and call due() when it elapses, so a stalled upstream cannot hold text.
+    """
+
+    def __init__(self, interval=DEFAULT_FLUSH_INTERVAL_MS / 1000.0, max_bytes=DEFAULT_FLUSH_BYTES):
+        """Initialize an empty buffer."""
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.parts = []
+        self.size = 0
+        self.started = None
+        self.flushed = False
+
+    def add(self, text):
+        """Buffer text; returns the batch to emit if the policy says flush, else None."""
+        if not self.parts:
+            self.started = time.monotonic()
+        self.parts.append(text)
+        self.size += len(text.encode('utf-8'))
+
+        if not self.flushed or self.size >= self.max_bytes or time.monotonic() - self.started >= self.interval:
+            return self.flush()
+        return None
+
+    def timeout(self):
+        """Seconds until the buffered text must be released (None when nothing is buffered)."""
+        if not self.parts:
+            return None
+        return max(0.0, self.started + self.interval - time.monotonic())
+
+    def due(self):
+        """Return the buffered text if its flush deadline has passed, else None."""
+        if self.parts and time.monotonic() - self.started >= self.interval:
+            return self.flush()
+        return None
+
+    def flush(self):
+        """Return and clear whatever is buffered (None when empty)."""
+        if not self.parts:
+            return None
+        text = ''.join(self.parts)
+        self.parts = []
+        self.size = 0
+        self.started = None
+        self.flushed = True
+        return text
+
+
+def paced_lines(open_response, timeout):
+    """
+    Yield the lines of a streaming Ollama response, or None whenever
+    timeout() seconds pass without one (timeout() returning None waits).
+
+    open_response() is called and read on a helper thread, so the caller can
+    release buffered text on time and notice a cancel even while Ollama is
+    still loading the model, before it has sent any headers. Closing the
+    generator closes the response, or has the helper close it once it opens.
+    """
+    received = queue.Queue()
+    stopped = threading.Event()
+    opened = []
+
+    def read():
+        try:
+            response = open_response()
+            opened.append(response)
+            with response:
+                if stopped.is_set():
+                    return
+                for line in response.iter_lines():
+                    if stopped.is_set():
+                        return
+                    received.put((line, None))
+        except Exception as e:
+            if not stopped.is_set():
+                received.put((None, e))
+            return
+        received.put((_END_OF_STREAM, None))
+
+    threading.Thread(target=read, name='stream-reader', daemon=True).start()
+    try:
+        while True:
+            try:
+                line, error = received.get(timeout=timeout())
+            except queue.Empty:
+                yield None
+                continue
+            if error is not None:
+                raise error
+            if line is _END_OF_STREAM:
+                return
+            yield line
+    finally:
+        # Closing the upstream socket makes Ollama stop generating
+        stopped.set()
+        if opened:
+            opened[0].close()
+
+
+class GenerationRelay:
+    """
+    Turn Ollama's NDJSON stream into coalesced SSE frames.
+
+    Shared by the WSGI and ASGI endpoints: feed() each line as it arrives and
+    send the frames it returns, then send finish() (or error()) at the end.
+    """
+
+    def __init__(self, endpoint, flush=(DEFAULT_FLUSH_INTERVAL_MS / 1000.0, DEFAULT_FLUSH_BYTES), payload=None,
+                 started_at=None, conversation_id=None, previous_turn=None):
+        """
+        Initialize the relay for one generation; payload may be attached once built.
+
+        started_at is when the request arrived (time.monotonic()), so time to
+        first token includes upload and preprocessing; defaults to now.
+        For a stored conversation, previous_turn is its 'last_turn' record,
+        which finish() replaces with this turn's prompt and reply sizes.
+        """
+        self.conversation_id = conversation_id
+        self.previous_turn = previous_turn
+        self.endpoint = endpoint
+        self.started_at = started_at if started_at is not None else time.monotonic()
+        self.first_token_at = None
+        self.queue_wait = None
+        self.payload = payload or {}
+        self.coalescer = TokenCoalescer(*flush)
+        self.final_chunk = None
+        self.chunks = 0
+        self.frames = 0
+        self.content_frames = 0
+        self.cancelled = False
+        self.parts = []
+
+    def frame(self, data):
+        """Frame one SSE event and count it."""
+        self.frames += 1
+        return sse_event(data)
+
+    def content_frame(self, text):
+        """Frame a batch of generated text."""
+        self.content_frames += 1
+        return self.frame({'content': text})
+
+    def feed(self, line):
+        """Process one NDJSON line; returns the (possibly empty) list of frames to send."""
+        chunk = parse_chunk(line)
+        if not chunk:
+            return []
+
+        frames = []
+        text = chunk_text(chunk)
+        if text:
+            if self.first_token_at is None:
+                self.first_token_at = time.monotonic()
+                metrics.observe('generation_ttft_seconds', self.first_token_at - self.started_at,
+                                model=self.payload.get('model', 'unknown'), endpoint=self.endpoint)
+            self.chunks += 1
+            self.parts.append(text)
+            batch = self.coalescer.add(text)
+            if batch:
+                frames.append(self.content_frame(batch))
+        if chunk.get('done'):
+            self.final_chunk = chunk
+        return frames
+
+    def finish(self):
+        """Flush buffered text and emit the done event with prompt evaluation stats."""
+        frames = self._drain()
+
+        done_event = {'done': True}
+        stats, turn = prompt_eval_stats(self.payload, self.final_chunk, self.previous_turn)
+        if stats:
+            done_event['stats'] = stats
+        if turn and self.conversation_id:
+            conversation_store.get_store().update(self.conversation_id, last_turn=turn)
+        frames.append(self.frame(done_event))
+
+        # Track completed generation lengths so cancellations can estimate tokens saved
+        model = self.payload.get('model', 'unknown')
+        generated = (self.final_chunk or {}).get('eval_count', self.chunks)
+        metrics.increment('generations_completed_total', model=model)
+        metrics.increment('generation_tokens_total', generated, model=model)
+        record_generation(self.endpoint, model, self.final_chunk, self.queue_wait)
+
+        # Generations that ran to completion are offered to the caches for replay
+        if self.final_chunk is not None:
+            remember_response(self.payload, self.text, {'eval_count': generated})
+
+        self._record()
+        return frames
+
+    @property
+    def text(self):
+        """Full text generated so far."""
+        return ''.join(self.parts)
+
+    def replay(self, entry):
+        """Emit a cached response at full speed, followed by the done event."""
+        text = entry.get('response', '')
+        frames = [
+            self.content_frame(text[start:start + REPLAY_FRAME_CHARS])
+            for start in range(0, len(text), REPLAY_FRAME_CHARS)
+        ]
+        done_event = {'done': True, 'cached': True}
+        if 'similarity' in entry:
+            # Answered from the semantic cache for a near-duplicate prompt
+            done_event['similarity'] = entry['similarity']
+        frames.append(self.frame(done_event))
+        metrics.increment('response_cache_replays_total', endpoint=self.endpoint,
+                          cache='semantic' if 'similarity' in entry else 'exact')
+        metrics.increment('stream_frames_total', self.frames, endpoint=self.endpoint)
+        return frames
+
+    def cancel(self, reason):
+        """
+        Record that the generation was abandoned before Ollama finished.
+
+        Tokens saved are estimated from the average length of completed
+        generations for the same model. Returns the frames to send if the
+        client is still listening (nothing is sent after a disconnect).
+        """
+        if self.cancelled:
+            return []
+        self.cancelled = True
+
+        model = self.payload.get('model', 'unknown')
+        completed = metrics.get_counter('generations_completed_total', model=model)
+        if completed:
+            expected = metrics.get_counter('generation_tokens_total', model=model) / completed
+        else:
+            expected = self.chunks * 2
+        metrics.increment('generations_cancelled_total', endpoint=self.endpoint, reason=reason)
+        metrics.increment('cancelled_tokens_saved_total', int(max(0, expected - self.chunks)), endpoint=self.endpoint)
+        self._record()
+
+        if reason == 'disconnect':
+            return []
+        frames = self._drain()
+        frames.append(self.frame({'cancelled': True, 'done': True}))
+        return frames
+
+    def error(self, exc):
+        """Flush buffered text and emit an error followed by the done event."""
+        frames = self._drain()
+        frames.append(self.frame({'error': str(exc)}))
+        frames.append(self.frame({'done': True}))
+        self._record()
+        return frames
+
+    def flush_timeout(self):
+        """Seconds to wait for the next line before buffered text is due (None = no deadline)."""
+        return self.coalescer.timeout()
+
+    def wait_timeout(self):
+        """Seconds to wait for the next line before flushing or checking for a cancel."""
+        timeout = self.flush_timeout()
+        return CANCEL_POLL_INTERVAL if timeout is None else min(timeout, CANCEL_POLL_INTERVAL)
+
+    def tick(self):
+        """Emit buffered text whose flush deadline passed while waiting for the next line."""
+        batch = self.coalescer.due()
+        return [self.content_frame(batch)] if batch else []
+
+    def _drain(self):
+        """Emit whatever text is still buffered."""
+        batch = self.coalescer.flush()
+        return [self.content_frame(batch)] if batch else []
+
+    def _record(self):
+        """Record chunk and frame counts for the metrics endpoint."""
+        metrics.increment('stream_chunks_total', self.chunks, endpoint=self.endpoint)
+        metrics.increment('stream_frames_total', self.frames, endpoint=self.endpoint)
+        metrics.increment('stream_frames_saved_total', self.chunks - self.content_frames, endpoint=self.endpoint)
+
+
+class ActiveGenerations:
+    """
+    Registry of in-flight generations keyed by conversation id.
+
+    Starting a new generation for a conversation cancels the previous one, so
+    a user who sends another message does not leave the old stream running.
+    """
+
+    def __init__(self):
+        """Initialize an empty registry."""
+        self.lock = threading.Lock()
+        self.active = {}
+
+    def start(self, key):
+        """Register a generation and return its cancel event."""
+        event = threading.Event()
+        if key:
+            with self.lock:
+                previous = self.active.get(key)
+                self.active[key] = event
+            if previous is not None:
+                previous.set()
+        return event
+
+    def cancel(self, key):
+        """Cancel the generation running for key; returns True if one was running."""
+        with self.lock:
+            event = self.active.pop(key, None)
+        if event is None:
+            return False
+        event.set()
+        return True
+
+    def finish(self, key, event):
+        """Unregister a generation once it has ended."""
+        if key:
+            with self.lock:
+                if self.active.get(key) is event:
+                    del self.active[key]
+
+
+active_generations = ActiveGenerations()
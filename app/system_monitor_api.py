@@ -9,8 +9,11 @@ import platform
 import time
 import json
 import subprocess
+import requests
 from flask import Blueprint, jsonify, request
 
+from . import benchmark, metrics, model_residency, ollama_client, scheduler, semantic_cache
+
 # Don't attempt to import GPUtil which is incompatible with Python 3.13
 # import GPUtil
 
@@ -107,6 +110,18 @@ def get_resource_usage():
             'message': f'Error getting resource usage: {str(e)}'
         }), 500
 
+def parse_flag(value, name):
+    """Read a JSON boolean that may also arrive as a number or a string such as "false"."""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return value != 0
+    if isinstance(value, str) and value.strip().lower() in ('1', 'true', 'yes', 'on'):
+        return True
+    if isinstance(value, str) and value.strip().lower() in ('0', 'false', 'no', 'off', ''):
+        return False
+    raise ValueError(f"{name} must be true or false")
+
 @system_monitor_api.route('/benchmark', methods=['POST'])
 def run_benchmark():
     """Run a performance benchmark for a specific model."""
@@ -125,34 +140,83 @@ def run_benchmark():
             'message': 'No model specified for benchmark'
         }), 400
     
-    # Get benchmark parameters
-    profile = data.get('profile', '')
-    benchmark_type = data.get('type', 'token_generation')
-    iterations = data.get('iterations', 3)
-    
-    # For demonstration - in a real implementation, we would run the actual benchmark
-    # For now, return simulated benchmark results
-    if benchmark_type == 'token_generation':
+    try:
+        result = benchmark.get_runner().run(
+            model,
+            profile=data.get('profile', ''),
+            benchmark_type=data.get('type', 'token_generation'),
+            iterations=int(data.get('iterations', benchmark.DEFAULT_ITERATIONS)),
+            prompt_tokens=int(data.get('prompt_tokens', benchmark.DEFAULT_PROMPT_TOKENS)),
+            output_tokens=int(data.get('output_tokens', benchmark.DEFAULT_OUTPUT_TOKENS)),
+            cold_start=parse_flag(data.get('cold_start', True), 'cold_start')
+        )
+        return jsonify(result)
+    except (TypeError, ValueError) as e:
         return jsonify({
-            'status': 'success',
-            'model': model,
-            'profile': profile,
-            'type': benchmark_type,
-            'iterations': iterations,
-            'tokens_per_second': 45.3,
-            'avg_inference_time': 1.2,
-            'peak_memory_mb': 4500,
-            'score': 87.5,
-            'prompt_length': 500,
-            'response_length': 1200,
-            'total_tokens': 1700,
-            'timestamp': time.time()
-        })
-    else:
+            'status': 'error',
+            'message': str(e)
+        }), 400
+    except (scheduler.QueueFullError, scheduler.QueueTimeoutError) as e:
         return jsonify({
             'status': 'error',
-            'message': f'Benchmark type {benchmark_type} not yet implemented'
-        }), 501
+            'message': str(e)
+        }), 503
+    except (benchmark.BenchmarkError, requests.RequestException) as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Benchmark failed: {str(e)}'
+        }), 502
+
+@system_monitor_api.route('/benchmark/history', methods=['GET'])
+def get_benchmark_history():
+    """Get saved benchmark results, newest first, to compare runs over time and across profiles."""
+    return jsonify({
+        'results': benchmark.get_runner().history(
+            model=request.args.get('model'),
+            profile=request.args.get('profile'),
+            benchmark_type=request.args.get('type'),
+            limit=request.args.get('limit', benchmark.HISTORY_LIMIT, type=int)
+        ),
+        'timestamp': time.time()
+    })
+
+@system_monitor_api.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Get in-process counters and histograms (streaming frames, generation timings, etc.)."""
+    return jsonify({
+        'counters': metrics.snapshot(),
+        'histograms': metrics.histogram_snapshot(),
+        'timestamp': time.time()
+    })
+
+@system_monitor_api.route('/queue', methods=['GET'])
+def get_queue():
+    """Get generation admission state (running and waiting requests) per model."""
+    return jsonify({
+        'models': scheduler.get_scheduler().stats(),
+        'timestamp': time.time()
+    })
+
+@system_monitor_api.route('/models', methods=['GET'])
+def get_resident_models():
+    """Get the models loaded in Ollama (from /api/ps) with their pin and usage state."""
+    return jsonify(dict(model_residency.get_manager().status(), timestamp=time.time()))
+
+@system_monitor_api.route('/backends', methods=['GET'])
+def get_backends():
+    """Get the Ollama backends with their health, outstanding requests and loaded models."""
+    return jsonify({
+        'backends': ollama_client.get_client().registry.stats(),
+        'timestamp': time.time()
+    })
+
+@system_monitor_api.route('/cache', methods=['GET'])
+def get_cache_stats():
+    """Get semantic cache entries and hit rates per opted-in model."""
+    return jsonify({
+        'semantic': semantic_cache.get_cache().stats(),
+        'timestamp': time.time()
+    })
 
 @system_monitor_api.route('/info', methods=['GET'])
 def get_system_info():
@@ -3,19 +3,28 @@ API endpoints for the prompt templates functionality in Free Thinkers
 """
 
 from flask import Blueprint, jsonify, request
-from app.prompt_templates import get_templates_for_model, list_templates_for_model, fill_template
+from app import registries
+from app.prompt_templates import (
+    MODEL_TEMPLATE_MAPPING, DEFAULT_TEMPLATES, describe_templates, template_set_name, fill_template
+)
 
 templates_api = Blueprint('templates_api', __name__, url_prefix='/templates')
 
+def build_template_lists():
+    """Prepare the template list response of every template set (None = the defaults)."""
+    template_sets = {**MODEL_TEMPLATE_MAPPING, None: DEFAULT_TEMPLATES}
+    return registries.prepare_each({
+        name: {"status": "success", "templates": describe_templates(templates)}
+        for name, templates in template_sets.items()
+    })
+
+registries.register('templates', build_template_lists)
+
 @templates_api.route('/list/<model_name>', methods=['GET'])
 def get_templates(model_name):
     """Get available templates for a specific model."""
     try:
-        templates = list_templates_for_model(model_name)
-        return jsonify({
-            "status": "success",
-            "templates": templates
-        })
+        return registries.json_response(registries.get('templates')[template_set_name(model_name)])
     except Exception as e:
         return jsonify({
             "status": "error",
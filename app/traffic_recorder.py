@@ -0,0 +1,178 @@
+"""
+Traffic Recorder for Free Thinkers
+Records incoming API requests as JSONL in the format load_replay.py replays, so capacity
+changes can be judged against the real request mix; text is redacted by default
+"""
+
+import hashlib
+import json
+import os
+import queue
+import random
+import threading
+import time
+from pathlib import Path
+
+from flask import request
+
+from . import metrics, log
+
+logger = log.get_logger('traffic_recorder')
+
+RECORD_QUEUE_SIZE = 10000
+
+# Requests that are never recorded: monitoring, proxying, cancellation and authentication
+EXCLUDED_PREFIXES = ('/api/system', '/api/ollama', '/api/chat/cancel', '/api/auth')
+
+# Body fields holding user text; redaction replaces their content but keeps its length
+REDACTED_FIELDS = {'content', 'prompt', 'query', 'input', 'text', 'system', 'system_prompt', 'title'}
+
+# Credentials and identities, replaced by CREDENTIAL_PLACEHOLDER even with redaction off
+CREDENTIAL_FIELDS = {
+    'password', 'current_password', 'new_password', 'confirm_password', 'email', 'username',
+    'token', 'access_token', 'refresh_token', 'api_key', 'secret', 'authorization'
+}
+CREDENTIAL_PLACEHOLDER = '[redacted]'
+
+FILLER_WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua enim ad minim veniam quis nostrud"
+).split()
+
+
+def redact_text(text):
+    """
+    Replace text by filler of the same length.
+
+    The filler is seeded by a hash of the original, so repeated prompts stay
+    identical after redaction and cache hit patterns survive a replay.
+    """
+    rng = random.Random(hashlib.sha256(text.encode('utf-8')).digest())
+    words = []
+    length = 0
+    while length < len(text):
+        word = rng.choice(FILLER_WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)[:len(text)]
+
+
+def is_credential(field):
+    """Check whether a body field holds a credential or identity."""
+    return isinstance(field, str) and field.lower() in CREDENTIAL_FIELDS
+
+
+def redact_body(value, field=None, text=True):
+    """
+    Redact a JSON body, keeping its structure, model names and parameters.
+
+    Credential fields are always replaced; user text only when text is on.
+    """
+    if isinstance(value, dict):
+        return {key: CREDENTIAL_PLACEHOLDER if is_credential(key) else redact_body(item, key, text)
+                for key, item in value.items()}
+    if isinstance(value, list):
+        return [redact_body(item, field, text) for item in value]
+    if text and isinstance(value, str) and field in REDACTED_FIELDS:
+        return redact_text(value)
+    return value
+
+
+def should_record(method, path):
+    """Check whether a request belongs in the replay log."""
+    if not path.startswith('/api/') or path.startswith(EXCLUDED_PREFIXES):
+        return False
+    # The SSE half of a chat is replayed from its POST, so it is not recorded separately
+    return not (method == 'GET' and path == '/api/chat')
+
+
+class TrafficRecorder:
+    """Appends request entries to a JSONL file from a background writer thread."""
+
+    def __init__(self, path, redact=True, sample_rate=1.0, queue_size=RECORD_QUEUE_SIZE):
+        """Initialize the recorder and start its writer thread."""
+        self.path = Path(path).expanduser()
+        self.redact = redact
+        self.sample_rate = sample_rate
+        self.entries = queue.Queue(maxsize=queue_size)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.thread = threading.Thread(target=self.run, name='traffic-recorder', daemon=True)
+        self.thread.start()
+
+    def entry(self, req):
+        """Build the replay entry for a Flask request, or None if it is not recorded."""
+        if not should_record(req.method, req.path):
+            return None
+
+        entry = {
+            'ts': round(time.time(), 3),
+            'method': req.method,
+            'path': req.path,
+            'endpoint': req.url_rule.rule if req.url_rule is not None else req.path
+        }
+        if req.args:
+            entry['query'] = req.args.to_dict()
+        if req.is_json:
+            body = req.get_json(silent=True)
+            entry['body'] = redact_body(body, text=self.redact)
+        elif req.files:
+            # Uploads are not replayable; keep their shape so they show up in the request mix
+            entry['form'] = {key: value for key, value in req.form.items()
+                             if key not in REDACTED_FIELDS and not is_credential(key)}
+            entry['files'] = {key: file.content_length or 0 for key, file in req.files.items()}
+        if req.method == 'POST' and req.path == '/api/chat':
+            entry['stream'] = True
+        return entry
+
+    def record(self, req):
+        """Queue a request for writing; never blocks the request."""
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        entry = self.entry(req)
+        if entry is None:
+            return
+        try:
+            self.entries.put_nowait(entry)
+        except queue.Full:
+            metrics.increment('traffic_records_dropped_total')
+
+    def run(self):
+        """Write queued entries, flushing whenever the queue drains."""
+        with open(self.path, 'a') as f:
+            while True:
+                entry = self.entries.get()
+                f.write(json.dumps(entry) + '\n')
+                metrics.increment('traffic_records_total')
+                if self.entries.empty():
+                    f.flush()
+
+
+_recorder = None
+
+
+def get_recorder():
+    """Return the active recorder, or None when recording is off."""
+    return _recorder
+
+
+def init_app(app):
+    """Start recording API traffic when TRAFFIC_RECORD_PATH is set."""
+    global _recorder
+    path = app.config.get('TRAFFIC_RECORD_PATH') or os.environ.get('TRAFFIC_RECORD_PATH')
+    if not path:
+        return None
+
+    recorder = TrafficRecorder(
+        path,
+        redact=app.config.get('TRAFFIC_RECORD_REDACT', True),
+        sample_rate=app.config.get('TRAFFIC_RECORD_SAMPLE_RATE', 1.0)
+    )
+
+    @app.before_request
+    def record_request():
+        recorder.record(request)
+
+    _recorder = recorder
+    app.extensions['traffic_recorder'] = recorder
+    logger.info("Recording API traffic to %s (redact=%s)", recorder.path, recorder.redact)
+    return recorder
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Storage codec benchmark for Free Thinkers.
+Writes the same thread history and context summaries in the old format (indented plain
+JSON) and through each storage codec (compact plain, gzip and, with the zstandard
+package, zstd), then reports bytes on disk, write time and load latency per format.
+
+By default a synthetic corpus is generated; --source and --summaries read real data
+from a history directory and a summaries directory instead. Files are read back from
+the page cache, so load latency measures reading, decompressing and parsing.
+
+Usage:
+    python bench_storage.py
+    python bench_storage.py --threads 500 --messages 40 --repeat 5
+    python bench_storage.py --source ~/.freethinkers/history --summaries ~/.freethinkers/summaries
+"""
+
+import argparse
+import json
+import math
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from app import history, storage_codec
+
+WORDS = ('the model context window token prompt response summary thread message parameter '
+         'temperature sampling layer memory cache latency quantized inference python function '
+         'return value list dictionary example explain because however therefore result').split()
+
+
+def synthetic_text(rng, words):
+    """Prose-like text, with a code block now and then, of about the given number of words."""
+    text = ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+    if rng.random() < 0.2:
+        text += '\n\n```python\ndef example(value):\n    return [item * 2 for item in value]\n```\n'
+    return text
+
+
+def synthetic_corpus(threads, messages, seed=0):
+    """Generate threads and the context summaries the app would keep for them."""
+    rng = random.Random(seed)
+    thread_data, summaries = {}, {}
+    for number in range(threads):
+        thread_id = f"bench{number:05d}"
+        conversation = [{'role': 'user' if position % 2 == 0 else 'assistant',
+                         'content': synthetic_text(rng, rng.randint(10, 60) if position % 2 == 0 else rng.randint(80, 400))}
+                        for position in range(messages)]
+        thread_data[thread_id] = {'id': thread_id, 'model': 'llama3:8b', 'messages': conversation,
+                                  'created_at': '2025-01-01T00:00:00', 'updated_at': '2025-01-01T00:00:00'}
+        summaries[thread_id] = {'summary': synthetic_text(rng, 120), 'summarized_messages': conversation[:messages // 2],
+                                'timestamp': '2025-01-01T00:00:00'}
+    return thread_data, summaries
+
+
+def load_source(history_dir, summaries_dir):
+    """Read real threads and summaries, whatever format they were stored in."""
+    thread_data, summaries = {}, {}
+    if history_dir:
+        for thread_id, files in history.thread_files(history_dir).items():
+            thread = history.load_thread(*files)[0]
+            if thread is not None:
+                thread_data[thread_id] = thread
+    if summaries_dir:
+        for thread_id, path in storage_codec.find_all(summaries_dir).items():
+            summaries[thread_id] = storage_codec.read_json(path)
+    return thread_data, summaries
+
+
+def formats():
+    """(name, writer) for the old format and every available codec."""
+    def legacy(base, value):
+        path = Path(str(base))
+        with open(path, 'w') as f:
+            json.dump(value, f, indent=2)
+        return path
+
+    def codec_writer(codec):
+        return lambda base, value: storage_codec.write_json(base, value, codec)[0]
+
+    result = [('legacy (indent=2)', legacy)]
+    for name in ('none', 'gzip', 'zstd'):
+        if name == 'zstd' and storage_codec.zstandard is None:
+            continue
+        result.append((name if name != 'none' else 'compact', codec_writer(storage_codec.CODECS[name])))
+    return result
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def measure(items, writer, directory, repeat):
+    """Write every item with writer, then read each back repeat times."""
+    start = time.perf_counter()
+    paths = [writer(directory / f"{name}.json", value) for name, value in items.items()]
+    write_seconds = time.perf_counter() - start
+
+    latencies = []
+    for _ in range(repeat):
+        for path in paths:
+            start = time.perf_counter()
+            storage_codec.read_json(path)
+            latencies.append(time.perf_counter() - start)
+    return {
+        'files': len(paths),
+        'bytes': sum(path.stat().st_size for path in paths),
+        'write_ms': write_seconds * 1000,
+        'load_mean_ms': sum(latencies) / len(latencies) * 1000,
+        'load_p95_ms': percentile(latencies, 0.95) * 1000,
+        'load_all_ms': sum(latencies) / repeat * 1000
+    }
+
+
+def run(datasets, repeat):
+    """Benchmark every format on every dataset; returns report rows."""
+    rows = []
+    for dataset, items in datasets.items():
+        if not items:
+            continue
+        baseline = None
+        for name, writer in formats():
+            with tempfile.TemporaryDirectory() as directory:
+                row = dict(measure(items, writer, Path(directory), repeat), dataset=dataset, format=name)
+            baseline = baseline or row
+            row['size_ratio'] = row['bytes'] / baseline['bytes']
+            row['load_speedup'] = baseline['load_all_ms'] / row['load_all_ms']
+            rows.append(row)
+    return rows
+
+
+def print_report(rows, out=sys.stdout):
+    """Print bytes on disk and latency per dataset and format."""
+    print(f"{'dataset':<10} {'format':<18} {'files':>6} {'bytes':>12} {'ratio':>6} {'write ms':>9} "
+          f"{'load ms':>8} {'p95 ms':>7} {'all ms':>8} {'speedup':>8}", file=out)
+    for row in rows:
+        print(f"{row['dataset']:<10} {row['format']:<18} {row['files']:>6} {row['bytes']:>12} "
+              f"{row['size_ratio']:>6.2f} {row['write_ms']:>9.1f} {row['load_mean_ms']:>8.3f} "
+              f"{row['load_p95_ms']:>7.3f} {row['load_all_ms']:>8.1f} {row['load_speedup']:>7.2f}x", file=out)
+    if storage_codec.zstandard is None:
+        print("\nzstandard is not installed; zstd was skipped", file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare history and summary storage formats')
+    parser.add_argument('--threads', type=int, default=200, help='Synthetic threads to generate')
+    parser.add_argument('--messages', type=int, default=30, help='Messages per synthetic thread')
+    parser.add_argument('--source', help='Benchmark the threads of this history directory instead')
+    parser.add_argument('--summaries', help='Benchmark the summaries of this directory instead')
+    parser.add_argument('--repeat', type=int, default=3, help='Times every file is read back')
+    parser.add_argument('--output', help='Also write the report as JSON to this file')
+    args = parser.parse_args()
+
+    if args.source or args.summaries:
+        threads, summaries = load_source(args.source, args.summaries)
+    else:
+        threads, summaries = synthetic_corpus(args.threads, args.messages)
+    if not threads and not summaries:
+        parser.error('nothing to benchmark')
+
+    rows = run({'history': threads, 'summaries': summaries}, max(1, args.repeat))
+    print_report(rows)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Blob garbage collection for Free Thinkers.
+Counts the message references held by saved history threads and context summaries,
+resets the blob store's reference counts to match and deletes blobs nothing refers to.
+Saves keep the counts current on their own; a crash between a save's steps can only
+leave a count too high, which keeps a blob alive until this runs.
+
+Run it while the app is stopped: a save made during the count would not be seen.
+
+Usage:
+    python blob_gc.py
+    python blob_gc.py --dry-run
+"""
+
+import argparse
+from collections import Counter
+
+from app import blob_store, history, storage_codec
+from app.context_manager import SUMMARIES_DIR
+
+
+def live_references(history_dir, summaries_dir):
+    """Count every message hash listed by thread files and summary files."""
+    counts = Counter()
+    for files in history.thread_files(history_dir).values():
+        counts.update(history.thread_refs(*files))
+    for path in storage_codec.find_all(summaries_dir).values():
+        counts.update(storage_codec.read_json(path).get('summarized_message_refs', []))
+    return counts
+
+
+def print_stats(label, stats):
+    """Print blob count, stored bytes and how many references share them."""
+    shared = stats['references'] / stats['blobs'] if stats['blobs'] else 0
+    print(f"{label:<7} {stats['blobs']:>8} blobs {stats['bytes']:>12} bytes "
+          f"{stats['references']:>8} references ({shared:.2f} per blob)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Recount message blob references and delete unused blobs')
+    parser.add_argument('--history', default=str(history.HISTORY_DIR), help='History directory')
+    parser.add_argument('--summaries', default=str(SUMMARIES_DIR), help='Context summaries directory')
+    parser.add_argument('--dry-run', action='store_true', help='Only report what would change')
+    args = parser.parse_args()
+
+    store = blob_store.get_store()
+    counts = live_references(args.history, args.summaries)
+    print_stats('before', store.stats())
+
+    if args.dry_run:
+        rows = store.connection().execute('SELECT hash, refs FROM blobs').fetchall()
+        unused = [ref for ref, _ in rows if not counts.get(ref)]
+        wrong = [ref for ref, refs in rows if counts.get(ref) and counts[ref] != refs]
+        print(f"{len(unused)} blobs would be deleted, {len(wrong)} reference counts corrected")
+        return
+
+    deleted = store.recount(counts)
+    print_stats('after', store.stats())
+    print(f"Deleted {deleted} unreferenced blobs")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Static asset build for Free Thinkers.
+Bundles the files listed in static/bundles.json, minifies them when rjsmin/rcssmin are
+installed, names each bundle by a hash of its content and writes gzip (and, with the
+brotli package, brotli) variants next to it. static/dist/manifest.json tells the app
+which file to load for each bundle; the app serves these precompressed and immutable.
+
+Usage:
+    python build_assets.py
+    python build_assets.py --no-minify --check
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# Minifiers and brotli are optional; without them bundles are only concatenated and gzipped
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = Path(__file__).resolve().parent / 'static'
+BUNDLES_FILE = 'bundles.json'
+DIST_DIR = 'dist'
+HASH_LENGTH = 12
+
+# Scripts are joined with a separator that ends any unterminated statement in the previous file
+SEPARATORS = {'.js': '\n;\n', '.css': '\n'}
+
+
+def minify(text, extension):
+    """Minify a bundle with rjsmin/rcssmin when installed."""
+    if extension == '.js' and rjsmin is not None:
+        return rjsmin.jsmin(text)
+    if extension == '.css' and rcssmin is not None:
+        return rcssmin.cssmin(text)
+    return text
+
+
+def check_script(path):
+    """Syntax-check a built script with node when it is available; returns an error or None."""
+    node = shutil.which('node')
+    if node is None:
+        return None
+    result = subprocess.run([node, '--check', str(path)], capture_output=True, text=True)
+    return result.stderr.strip() if result.returncode else None
+
+
+def build_bundle(name, sources, static_dir, dist_dir, use_minify=True):
+    """Build one bundle and its compressed variants; returns its manifest entry."""
+    extension = Path(name).suffix
+    parts = []
+    mtimes = {}
+    for source in sources:
+        path = static_dir / source
+        parts.append(path.read_text(encoding='utf-8').rstrip())
+        mtimes[source] = os.path.getmtime(path)
+
+    text = SEPARATORS.get(extension, '\n').join(parts) + '\n'
+    if use_minify:
+        text = minify(text, extension)
+    data = text.encode('utf-8')
+
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    filename = f"{Path(name).stem}.{digest}{extension}"
+    path = dist_dir / filename
+    path.write_bytes(data)
+
+    # mtime=0 keeps the gzip output byte-identical across builds of the same content
+    gzipped = gzip.compress(data, compresslevel=9, mtime=0)
+    (dist_dir / (filename + '.gz')).write_bytes(gzipped)
+    entry = {
+        'file': f"{DIST_DIR}/{filename}",
+        'size': len(data),
+        'gzip': len(gzipped),
+        'source_size': sum(len(part.encode('utf-8')) for part in parts),
+        'sources': mtimes
+    }
+    if brotli is not None:
+        compressed = brotli.compress(data, quality=11)
+        (dist_dir / (filename + '.br')).write_bytes(compressed)
+        entry['brotli'] = len(compressed)
+    return entry
+
+
+def build(static_dir=STATIC_DIR, use_minify=True, check=False):
+    """Build every bundle, replace the previous build output and write the manifest."""
+    static_dir = Path(static_dir)
+    with open(static_dir / BUNDLES_FILE, 'r') as f:
+        bundles = json.load(f)
+
+    dist_dir = static_dir / DIST_DIR
+    if dist_dir.exists():
+        shutil.rmtree(dist_dir)
+    dist_dir.mkdir(parents=True)
+
+    manifest = {'built_at': time.time(), 'minified': use_minify, 'bundles': {}}
+    errors = []
+    for name, sources in bundles.items():
+        entry = build_bundle(name, sources, static_dir, dist_dir, use_minify)
+        manifest['bundles'][name] = entry
+        if check and name.endswith('.js'):
+            error = check_script(static_dir / entry['file'])
+            if error:
+                errors.append(f"{name}: {error}")
+
+    with open(dist_dir / 'manifest.json', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest, errors
+
+
+def print_manifest(manifest, out=sys.stdout):
+    """Print bundle sizes before and after minification and compression."""
+    print(f"{'bundle':<14} {'file':<32} {'source':>9} {'built':>9} {'gzip':>9} {'brotli':>9}", file=out)
+    for name, entry in manifest['bundles'].items():
+        brotli_size = f"{entry['brotli']:>9}" if 'brotli' in entry else f"{'-':>9}"
+        print(f"{name:<14} {entry['file']:<32} {entry['source_size']:>9} {entry['size']:>9} "
+              f"{entry['gzip']:>9} {brotli_size}", file=out)
+    missing = [name for name, module in (('rjsmin', rjsmin), ('rcssmin', rcssmin), ('brotli', brotli)) if module is None]
+    if missing:
+        print(f"\nNot installed (optional): {', '.join(missing)}", file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build fingerprinted, precompressed static bundles')
+    parser.add_argument('--static-dir', default=str(STATIC_DIR), help='Static files directory')
+    parser.add_argument('--no-minify', action='store_true', help='Only concatenate and compress')
+    parser.add_argument('--check', action='store_true', help='Syntax-check built scripts with node')
+    args = parser.parse_args()
+
+    manifest, errors = build(args.static_dir, use_minify=not args.no_minify, check=args.check)
+    print_manifest(manifest)
+    for error in errors:
+        print(f"\nSyntax check failed for {error}", file=sys.stderr)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == '__main__':
+    main()
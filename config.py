@@ -25,6 +25,108 @@ class Config:
     SESSION_TYPE = 'filesystem'
     SESSION_PERMANENT = True
     PERMANENT_SESSION_LIFETIME = 86400  # 24 hours in seconds
+    
+    # Ollama connection pool configuration
+    OLLAMA_BASE_URL = os.environ.get('OLLAMA_BASE_URL', 'http://127.0.0.1:11434')
+    
+    # Several Ollama servers ('http://host:11434,...'; empty = OLLAMA_BASE_URL only). Requests go to the
+    # backend with the fewest outstanding requests, counting OLLAMA_AFFINITY_WEIGHT extra where the model
+    # is not loaded; backends are drained after OLLAMA_FAILURE_THRESHOLD connection failures and restored
+    # by health checks
+    OLLAMA_BACKENDS = os.environ.get('OLLAMA_BACKENDS', '')
+    OLLAMA_HEALTH_CHECK_INTERVAL = float(os.environ.get('OLLAMA_HEALTH_CHECK_INTERVAL', 10))
+    OLLAMA_FAILURE_THRESHOLD = int(os.environ.get('OLLAMA_FAILURE_THRESHOLD', 1))
+    OLLAMA_AFFINITY_WEIGHT = int(os.environ.get('OLLAMA_AFFINITY_WEIGHT', 4))
+    
+    OLLAMA_POOL_CONNECTIONS = int(os.environ.get('OLLAMA_POOL_CONNECTIONS', 4))
+    OLLAMA_POOL_MAXSIZE = int(os.environ.get('OLLAMA_POOL_MAXSIZE', 32))
+    OLLAMA_CONNECT_TIMEOUT = float(os.environ.get('OLLAMA_CONNECT_TIMEOUT', 3.05))
+    OLLAMA_ASYNC_MAX_CONNECTIONS = int(os.environ.get('OLLAMA_ASYNC_MAX_CONNECTIONS', 512))
+    
+    # Server-side chat state ('file' persists across workers, 'memory' is per process)
+    CONVERSATION_STORE_BACKEND = os.environ.get('CONVERSATION_STORE_BACKEND', 'file')
+    CONVERSATION_STORE_MEMORY_SIZE = int(os.environ.get('CONVERSATION_STORE_MEMORY_SIZE', 256))
+    
+    # Chat mode: 'chat' uses Ollama's /api/chat so the KV cache is reused across turns,
+    # 'generate' sends one flattened prompt to /api/generate
+    OLLAMA_CHAT_MODE = os.environ.get('OLLAMA_CHAT_MODE', 'chat')
+    OLLAMA_KEEP_ALIVE = os.environ.get('OLLAMA_KEEP_ALIVE', '30m')
+    CHAT_SYSTEM_PROMPT = os.environ.get('CHAT_SYSTEM_PROMPT', '')
+    
+    # SSE token coalescing: flush after this many ms or bytes (0 and 0 = one frame per token)
+    SSE_FLUSH_INTERVAL_MS = int(os.environ.get('SSE_FLUSH_INTERVAL_MS', 50))
+    SSE_FLUSH_BYTES = int(os.environ.get('SSE_FLUSH_BYTES', 512))
+    
+    # Generation admission control: concurrent generations per model ('model=n,...' overrides the default),
+    # how many requests may wait per model, and how long they may wait in seconds
+    GENERATION_CONCURRENCY = int(os.environ.get('GENERATION_CONCURRENCY', 2))
+    MODEL_CONCURRENCY = os.environ.get('MODEL_CONCURRENCY', '')
+    GENERATION_QUEUE_LIMIT = int(os.environ.get('GENERATION_QUEUE_LIMIT', 64))
+    GENERATION_QUEUE_TIMEOUT = float(os.environ.get('GENERATION_QUEUE_TIMEOUT', 300))
+    
+    # Cache for deterministic generations (temperature 0 or fixed seed): 'file', 'memory' or 'off'
+    RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND', 'file')
+    RESPONSE_CACHE_MEMORY_SIZE = int(os.environ.get('RESPONSE_CACHE_MEMORY_SIZE', 512))
+    RESPONSE_CACHE_MAX_AGE = int(os.environ.get('RESPONSE_CACHE_MAX_AGE', 30 * 24 * 3600))
+    
+    # Semantic cache for near-duplicate single-turn prompts: opted-in models ('model,...' or '*'),
+    # minimum cosine similarity, embedding model (empty = local hashed embedder) and entries per model
+    SEMANTIC_CACHE_MODELS = os.environ.get('SEMANTIC_CACHE_MODELS', '')
+    SEMANTIC_CACHE_THRESHOLD = float(os.environ.get('SEMANTIC_CACHE_THRESHOLD', 0.92))
+    SEMANTIC_CACHE_EMBED_MODEL = os.environ.get('SEMANTIC_CACHE_EMBED_MODEL', 'nomic-embed-text')
+    SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get('SEMANTIC_CACHE_MAX_ENTRIES', 1000))
+    
+    # Image uploads: longest side sent to vision models (MODEL_PARAMS 'image_size' overrides per model),
+    # upload size limit and number of prepared images cached by content hash
+    IMAGE_MAX_SIDE = int(os.environ.get('IMAGE_MAX_SIDE', 672))
+    IMAGE_MAX_UPLOAD_BYTES = int(os.environ.get('IMAGE_MAX_UPLOAD_BYTES', 20 * 1024 * 1024))
+    IMAGE_CACHE_SIZE = int(os.environ.get('IMAGE_CACHE_SIZE', 64))
+    
+    # Largest request body accepted (default: the image limit plus room for the form fields);
+    # larger requests are refused with 413 before their body is read
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', IMAGE_MAX_UPLOAD_BYTES + 1024 * 1024))
+    
+    # Application logging: level, and the fraction of DEBUG/INFO records kept (warnings and errors always are)
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 1.0))
+    
+    # Traffic recording for load_replay.py: JSONL file (empty = off), whether user text is replaced
+    # by same-length filler, and the fraction of requests recorded
+    TRAFFIC_RECORD_PATH = os.environ.get('TRAFFIC_RECORD_PATH', '')
+    TRAFFIC_RECORD_REDACT = os.environ.get('TRAFFIC_RECORD_REDACT', 'true').lower() not in ('0', 'false', 'no')
+    TRAFFIC_RECORD_SAMPLE_RATE = float(os.environ.get('TRAFFIC_RECORD_SAMPLE_RATE', 1.0))
+    
+    # Model residency: models preloaded at startup ('auto' = the most common user default model(s),
+    # 'off', or 'model,...'), always-pinned models, and the memory pressure (percent used) at which
+    # idle models are unloaded until usage is expected to fall below the low-water mark
+    MODEL_RESIDENCY_ENABLED = os.environ.get('MODEL_RESIDENCY_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+    MODEL_PRELOAD = os.environ.get('MODEL_PRELOAD', 'auto')
+    MODEL_PRELOAD_COUNT = int(os.environ.get('MODEL_PRELOAD_COUNT', 1))
+    MODEL_PINNED = os.environ.get('MODEL_PINNED', '')
+    MODEL_PIN_MIN_USES = int(os.environ.get('MODEL_PIN_MIN_USES', 3))
+    MODEL_MAX_PINNED = int(os.environ.get('MODEL_MAX_PINNED', 2))
+    MODEL_MEMORY_HIGH_PERCENT = float(os.environ.get('MODEL_MEMORY_HIGH_PERCENT', 90))
+    MODEL_MEMORY_LOW_PERCENT = float(os.environ.get('MODEL_MEMORY_LOW_PERCENT', 80))
+    MODEL_IDLE_TIMEOUT = int(os.environ.get('MODEL_IDLE_TIMEOUT', 600))
+    MODEL_RESIDENCY_INTERVAL = int(os.environ.get('MODEL_RESIDENCY_INTERVAL', 30))
+    
+    # Batch generation (/api/batch): worker threads per batch when the request does not say,
+    # and the most a request may ask for (generations still obey the per-model concurrency limits)
+    BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', 4))
+    BATCH_MAX_CONCURRENCY = int(os.environ.get('BATCH_MAX_CONCURRENCY', 16))
+    
+    # Static assets: serve the bundles built by build_assets.py (when present and up to date)
+    # instead of the individual source files
+    STATIC_ASSETS_BUILD = os.environ.get('STATIC_ASSETS_BUILD', 'true').lower() not in ('0', 'false', 'no')
+    
+    # Compression for history snapshots and context summaries: 'auto' (zstd with the
+    # zstandard package, else gzip), 'zstd', 'gzip' or 'none'; files from any codec stay readable
+    STORAGE_CODEC = os.environ.get('STORAGE_CODEC', 'auto')
+    
+    # Saved thread history: 'file' (a snapshot and log file per thread) or 'sqlite' (one WAL database
+    # with full-text search); import existing files with migrate_history.py
+    HISTORY_BACKEND = os.environ.get('HISTORY_BACKEND', 'file')
+    HISTORY_DB_PATH = os.environ.get('HISTORY_DB_PATH', os.path.expanduser('~/.freethinkers/history.db'))
 
 class DevelopmentConfig(Config):
     """Development configuration."""
@@ -34,6 +136,9 @@ class TestingConfig(Config):
     """Testing configuration."""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    CONVERSATION_STORE_BACKEND = 'memory'
+    RESPONSE_CACHE_BACKEND = 'memory'
+    MODEL_RESIDENCY_ENABLED = False
     
 class ProductionConfig(Config):
     """Production configuration."""
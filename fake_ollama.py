@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+Fake Ollama server for Free Thinkers.
+A stand-in for the Ollama API with configurable token rate, load delay, error rate
+and streaming chunk size, so the app and load tests can run without models or GPUs.
+
+Usage:
+    python fake_ollama.py --port 11434 --token-rate 50 --load-delay 2 --error-rate 0.01
+    OLLAMA_BASE_URL=http://127.0.0.1:11434 python app.py
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import Flask, Response, jsonify, request
+
+DEFAULT_MODELS = 'mistral-7b,llama3.1:latest,phi3:latest,llava-phi3:latest,nomic-embed-text:latest'
+DEFAULT_KEEP_ALIVE = 300  # Seconds a model stays loaded after its last request
+EMBEDDING_DIM = 768
+
+WORDS = (
+    "the model considers your question and answers it with a short explanation of the "
+    "main ideas involved while keeping the response clear and focused on what matters most "
+    "for a local assistant running entirely on this machine without any remote services"
+).split()
+
+
+class FakeOllama:
+    """Simulated models, their load state and the generation timing settings."""
+
+    def __init__(self, models, token_rate=50.0, load_delay=0.0, error_rate=0.0, chunk_size=1,
+                 response_tokens=64, prompt_rate=1000.0, keep_alive=DEFAULT_KEEP_ALIVE, seed=None):
+        """Initialize the server state; token and prompt rates are in tokens per second."""
+        self.models = list(models)
+        self.token_rate = token_rate
+        self.load_delay = load_delay
+        self.error_rate = error_rate
+        self.chunk_size = max(1, chunk_size)
+        self.response_tokens = response_tokens
+        self.prompt_rate = prompt_rate
+        self.keep_alive = keep_alive
+        self.random = random.Random(seed)
+        self.loaded = {}  # model -> expiry (epoch seconds)
+        self.lock = threading.Lock()
+
+    def has_model(self, name):
+        """Check whether a model is installed (a missing tag means ':latest')."""
+        return self.resolve(name) is not None
+
+    def resolve(self, name):
+        """Return the installed model name matching name, or None."""
+        if not name:
+            return None
+        for model in self.models:
+            if model == name or model == f"{name}:latest":
+                return model
+        return None
+
+    def should_fail(self):
+        """Decide whether to inject an error into this request."""
+        with self.lock:
+            return self.error_rate > 0 and self.random.random() < self.error_rate
+
+    def load(self, model, keep_alive=None):
+        """Mark a model as loaded, sleeping for the load delay if it was not; returns the load time."""
+        now = time.time()
+        with self.lock:
+            loaded = self.loaded.get(model, 0) > now
+        started = time.perf_counter()
+        if not loaded and self.load_delay:
+            time.sleep(self.load_delay)
+        with self.lock:
+            self.loaded[model] = time.time() + self.keep_alive_seconds(keep_alive)
+        return time.perf_counter() - started
+
+    def unload(self, model):
+        """Evict a model."""
+        with self.lock:
+            self.loaded.pop(model, None)
+
+    def keep_alive_seconds(self, keep_alive):
+        """Convert Ollama's keep_alive (seconds or '5m' / '1h' style durations) to seconds."""
+        if keep_alive is None:
+            return self.keep_alive
+        if isinstance(keep_alive, (int, float)):
+            return keep_alive if keep_alive >= 0 else 10 ** 9
+        match = re.fullmatch(r'(-?\d+(?:\.\d+)?)([smh]?)', str(keep_alive).strip())
+        if not match:
+            return self.keep_alive
+        value = float(match.group(1))
+        if value < 0:
+            return 10 ** 9
+        return value * {'': 1, 's': 1, 'm': 60, 'h': 3600}[match.group(2)]
+
+    def running(self):
+        """Currently loaded models with their expiry times."""
+        now = time.time()
+        with self.lock:
+            self.loaded = {model: expires for model, expires in self.loaded.items() if expires > now}
+            return dict(self.loaded)
+
+    def tokens(self, text, options):
+        """The tokens of a response: deterministic for a given prompt and seed."""
+        count = int(options.get('num_predict') or self.response_tokens)
+        if count < 0:
+            count = self.response_tokens
+        seed = options.get('seed')
+        rng = random.Random(f"{seed}:{text}" if seed is not None else None)
+        return [(' ' if index else '') + rng.choice(WORDS) for index in range(count)]
+
+
+def count_tokens(text):
+    """Approximate token count (4 characters per token, like the app's context manager)."""
+    return max(1, len(text or '') // 4)
+
+
+def embedding(text, dim=EMBEDDING_DIM):
+    """Deterministic unit vector: a signed, hashed bag of words so similar texts are close."""
+    vector = [0.0] * dim
+    for word in re.findall(r"[a-z0-9']+", (text or '').lower()):
+        digest = hashlib.md5(word.encode('utf-8')).digest()
+        vector[int.from_bytes(digest[:4], 'little') % dim] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+def model_details(name):
+    """Static metadata for a model listing."""
+    family = name.split(':')[0].split('-')[0]
+    return {
+        'format': 'gguf',
+        'family': family,
+        'families': [family],
+        'parameter_size': '7B',
+        'quantization_level': 'Q4_0'
+    }
+
+
+def timestamp():
+    """Current time in Ollama's RFC 3339 format."""
+    return datetime.now(timezone.utc).isoformat()
+
+
+def create_app(server):
+    """Create the Flask app serving the Ollama API from a FakeOllama."""
+    app = Flask(__name__)
+
+    def error(message, status):
+        return jsonify({'error': message}), status
+
+    def ndjson(lines):
+        return Response((json.dumps(line) + '\n' for line in lines), mimetype='application/x-ndjson')
+
+    @app.route('/')
+    def index():
+        return 'Ollama is running'
+
+    @app.route('/api/version')
+    def version():
+        return jsonify({'version': '0.0.0-fake'})
+
+    @app.route('/api/tags')
+    def tags():
+        return jsonify({'models': [
+            {
+                'name': model,
+                'model': model,
+                'modified_at': timestamp(),
+                'size': 4 * 1024 ** 3,
+                'digest': hashlib.sha256(model.encode('utf-8')).hexdigest(),
+                'details': model_details(model)
+            }
+            for model in server.models
+        ]})
+
+    @app.route('/api/ps')
+    def ps():
+        return jsonify({'models': [
+            {
+                'name': model,
+                'model': model,
+                'size': 4 * 1024 ** 3,
+                'size_vram': 4 * 1024 ** 3,
+                'expires_at': datetime.fromtimestamp(min(expires, 4102444800), timezone.utc).isoformat(),
+                'details': model_details(model)
+            }
+            for model, expires in server.running().items()
+        ]})
+
+    @app.route('/api/show', methods=['POST'])
+    def show():
+        data = request.get_json(silent=True) or {}
+        model = server.resolve(data.get('model') or data.get('name'))
+        if model is None:
+            return error(f"model '{data.get('model') or data.get('name')}' not found", 404)
+        return jsonify({
+            'modelfile': f"FROM {model}\n",
+            'parameters': 'num_ctx 4096\nstop "</s>"',
+            'template': '{{ .Prompt }}',
+            'details': model_details(model),
+            'model_info': {'general.architecture': model_details(model)['family'], 'general.context_length': 4096}
+        })
+
+    @app.route('/api/pull', methods=['POST'])
+    def pull():
+        data = request.get_json(silent=True) or {}
+        name = data.get('model') or data.get('name')
+        if not name:
+            return error('model is required', 400)
+        if server.should_fail():
+            return error('pull model manifest: simulated failure', 500)
+        model = name if ':' in name else f"{name}:latest"
+
+        def progress():
+            total = 4 * 1024 ** 3
+            yield {'status': 'pulling manifest'}
+            for step in range(1, 5):
+                time.sleep(0.05)
+                yield {'status': 'downloading', 'digest': 'sha256:fake', 'total': total, 'completed': total * step // 4}
+            yield {'status': 'verifying sha256 digest'}
+            yield {'status': 'writing manifest'}
+            with server.lock:
+                if model not in server.models:
+                    server.models.append(model)
+            yield {'status': 'success'}
+
+        if data.get('stream', True):
+            return ndjson(progress())
+        for _ in progress():
+            pass
+        return jsonify({'status': 'success'})
+
+    @app.route('/api/embeddings', methods=['POST'])
+    def embeddings():
+        data = request.get_json(silent=True) or {}
+        if not server.has_model(data.get('model')):
+            return error(f"model '{data.get('model')}' not found", 404)
+        return jsonify({'embedding': embedding(data.get('prompt', ''))})
+
+    @app.route('/api/embed', methods=['POST'])
+    def embed():
+        data = request.get_json(silent=True) or {}
+        if not server.has_model(data.get('model')):
+            return error(f"model '{data.get('model')}' not found", 404)
+        inputs = data.get('input', '')
+        inputs = inputs if isinstance(inputs, list) else [inputs]
+        return jsonify({'model': data.get('model'), 'embeddings': [embedding(text) for text in inputs]})
+
+    @app.route('/api/generate', methods=['POST'])
+    def generate():
+        data = request.get_json(silent=True) or {}
+        return generation(data, data.get('prompt') or '', chat=False)
+
+    @app.route('/api/chat', methods=['POST'])
+    def chat():
+        data = request.get_json(silent=True) or {}
+        messages = data.get('messages') or []
+        return generation(data, '\n'.join(message.get('content', '') for message in messages), chat=True)
+
+    def generation(data, prompt, chat):
+        model = server.resolve(data.get('model'))
+        if model is None:
+            return error(f"model '{data.get('model')}' not found, try pulling it first", 404)
+
+        # An empty request with keep_alive 0 unloads the model, as in Ollama
+        if not prompt and data.get('keep_alive') in (0, '0', '0s', '0m'):
+            server.unload(model)
+            body = {'model': model, 'created_at': timestamp(), 'done': True, 'done_reason': 'unload'}
+            body.update({'message': {'role': 'assistant', 'content': ''}} if chat else {'response': ''})
+            return jsonify(body)
+
+        if server.should_fail():
+            return error('llama runner process has terminated: simulated failure', 500)
+
+        started = time.perf_counter()
+        load_time = server.load(model, data.get('keep_alive'))
+        if not prompt:
+            body = {'model': model, 'created_at': timestamp(), 'done': True, 'done_reason': 'load'}
+            body.update({'message': {'role': 'assistant', 'content': ''}} if chat else {'response': ''})
+            return jsonify(body)
+
+        options = data.get('options') or {}
+        prompt_tokens = count_tokens(prompt)
+        prompt_time = prompt_tokens / server.prompt_rate if server.prompt_rate else 0.0
+        tokens = server.tokens(prompt, options)
+
+        def frame(text):
+            body = {'model': model, 'created_at': timestamp(), 'done': False}
+            body.update({'message': {'role': 'assistant', 'content': text}} if chat else {'response': text})
+            return body
+
+        def final(eval_time, content=''):
+            body = frame(content)
+            body.update({
+                'done': True,
+                'done_reason': 'length' if options.get('num_predict') else 'stop',
+                'total_duration': int((time.perf_counter() - started) * 1e9),
+                'load_duration': int(load_time * 1e9),
+                'prompt_eval_count': prompt_tokens,
+                'prompt_eval_duration': int(prompt_time * 1e9),
+                'eval_count': len(tokens),
+                'eval_duration': int(eval_time * 1e9)
+            })
+            return body
+
+        def stream():
+            time.sleep(prompt_time)
+            eval_started = time.perf_counter()
+            for index in range(0, len(tokens), server.chunk_size):
+                chunk = tokens[index:index + server.chunk_size]
+                if server.token_rate:
+                    time.sleep(len(chunk) / server.token_rate)
+                yield frame(''.join(chunk))
+            yield final(time.perf_counter() - eval_started)
+
+        if data.get('stream', True):
+            return ndjson(stream())
+
+        time.sleep(prompt_time + (len(tokens) / server.token_rate if server.token_rate else 0.0))
+        return jsonify(final(len(tokens) / server.token_rate if server.token_rate else 0.0, ''.join(tokens)))
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake Ollama server for Free Thinkers load tests')
+    parser.add_argument('--host', default=os.environ.get('FAKE_OLLAMA_HOST', '127.0.0.1'), help='Host to bind')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('FAKE_OLLAMA_PORT', 11434)), help='Port to bind')
+    parser.add_argument('--models', default=os.environ.get('FAKE_OLLAMA_MODELS', DEFAULT_MODELS),
+                        help='Comma-separated installed model names')
+    parser.add_argument('--token-rate', type=float, default=float(os.environ.get('FAKE_OLLAMA_TOKEN_RATE', 50)),
+                        help='Generated tokens per second (0 = as fast as possible)')
+    parser.add_argument('--prompt-rate', type=float, default=float(os.environ.get('FAKE_OLLAMA_PROMPT_RATE', 1000)),
+                        help='Prompt tokens evaluated per second (0 = instant)')
+    parser.add_argument('--load-delay', type=float, default=float(os.environ.get('FAKE_OLLAMA_LOAD_DELAY', 0)),
+                        help='Seconds to "load" a model that is not resident')
+    parser.add_argument('--error-rate', type=float, default=float(os.environ.get('FAKE_OLLAMA_ERROR_RATE', 0)),
+                        help='Fraction of generation and pull requests that fail with a 500')
+    parser.add_argument('--chunk-size', type=int, default=int(os.environ.get('FAKE_OLLAMA_CHUNK_SIZE', 1)),
+                        help='Tokens per streamed chunk')
+    parser.add_argument('--response-tokens', type=int, default=int(os.environ.get('FAKE_OLLAMA_RESPONSE_TOKENS', 64)),
+                        help='Tokens per response when the request sets no num_predict')
+    parser.add_argument('--keep-alive', type=float, default=DEFAULT_KEEP_ALIVE,
+                        help='Default seconds a model stays loaded')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for error injection')
+    args = parser.parse_args()
+
+    server = FakeOllama(
+        models=[model.strip() for model in args.models.split(',') if model.strip()],
+        token_rate=args.token_rate,
+        load_delay=args.load_delay,
+        error_rate=args.error_rate,
+        chunk_size=args.chunk_size,
+        response_tokens=args.response_tokens,
+        prompt_rate=args.prompt_rate,
+        keep_alive=args.keep_alive,
+        seed=args.seed
+    )
+    print(f"Fake Ollama on http://{args.host}:{args.port} "
+          f"({args.token_rate:g} tok/s, load {args.load_delay:g}s, errors {args.error_rate:.0%}, "
+          f"{args.chunk_size} token(s)/chunk)")
+    create_app(server).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
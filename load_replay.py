@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Load replay tool for Free Thinkers.
+Replays a JSONL request log (recorded with TRAFFIC_RECORD_PATH, or written by hand) against
+the app at a fixed concurrency or arrival rate and reports throughput, latency percentiles,
+time to first token and error rates per endpoint.
+
+Each line is one request:
+    {"method": "POST", "path": "/api/chat", "body": {...}, "stream": true}
+    {"method": "GET", "path": "/api/history", "query": {"limit": "20"}}
+Optional fields: "endpoint" (report group, defaults to the path) and "ts" (epoch seconds,
+used by --speed). A chat POST with "stream": true is followed by its SSE stream.
+
+Usage:
+    python load_replay.py traffic.jsonl --url http://localhost:5000 --concurrency 16
+    python load_replay.py traffic.jsonl --rate 5 --duration 60
+    python load_replay.py traffic.jsonl --speed 2 --output report.json
+"""
+
+import argparse
+import itertools
+import json
+import math
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+DEFAULT_URL = 'http://localhost:5000'
+DEFAULT_TIMEOUT = 300
+
+
+def load_entries(path):
+    """Read replayable entries from a JSONL log, skipping uploads and malformed lines."""
+    entries = []
+    skipped = 0
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                skipped += 1
+                continue
+            if not isinstance(entry, dict) or 'path' not in entry or entry.get('files'):
+                skipped += 1
+                continue
+            entries.append(entry)
+    return entries, skipped
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers (None when empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Results:
+    """Per-endpoint outcomes collected from every worker."""
+
+    def __init__(self):
+        """Initialize empty results."""
+        self.lock = threading.Lock()
+        self.endpoints = {}
+
+    def add(self, endpoint, latency, ttft=None, error=None):
+        """Record one finished request."""
+        with self.lock:
+            stats = self.endpoints.setdefault(endpoint, {'latencies': [], 'ttfts': [], 'errors': {}})
+            stats['latencies'].append(latency)
+            if ttft is not None:
+                stats['ttfts'].append(ttft)
+            if error is not None:
+                stats['errors'][error] = stats['errors'].get(error, 0) + 1
+
+    def report(self, elapsed):
+        """Summarize the results per endpoint and overall."""
+        def summarize(latencies, ttfts, errors):
+            failed = sum(errors.values())
+            summary = {
+                'requests': len(latencies),
+                'errors': failed,
+                'error_rate': round(failed / len(latencies), 4) if latencies else 0.0,
+                'throughput': round(len(latencies) / elapsed, 2) if elapsed else 0.0
+            }
+            for name, values in (('latency', latencies), ('ttft', ttfts)):
+                if values:
+                    summary[name] = {
+                        label: round(percentile(values, fraction), 4)
+                        for label, fraction in (('p50', 0.50), ('p95', 0.95), ('p99', 0.99))
+                    }
+            if errors:
+                summary['error_types'] = dict(errors)
+            return summary
+
+        with self.lock:
+            endpoints = {name: summarize(stats['latencies'], stats['ttfts'], stats['errors'])
+                         for name, stats in sorted(self.endpoints.items())}
+            all_errors = {}
+            for stats in self.endpoints.values():
+                for error, count in stats['errors'].items():
+                    all_errors[error] = all_errors.get(error, 0) + count
+            total = summarize(
+                [latency for stats in self.endpoints.values() for latency in stats['latencies']],
+                [ttft for stats in self.endpoints.values() for ttft in stats['ttfts']],
+                all_errors
+            )
+        return {'elapsed': round(elapsed, 2), 'total': total, 'endpoints': endpoints}
+
+
+class Replayer:
+    """Sends log entries to the app and times them."""
+
+    def __init__(self, base_url, results, timeout=DEFAULT_TIMEOUT):
+        """Initialize the replayer; each worker thread keeps its own HTTP session."""
+        self.base_url = base_url.rstrip('/')
+        self.results = results
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def session(self):
+        """The calling worker's session (keeps connections and cookies per worker)."""
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def send(self, entry, scheduled_at=None):
+        """
+        Replay one entry and record its outcome.
+
+        Latency is measured from scheduled_at when given, so time spent waiting
+        for a free worker in rate mode counts against the server.
+        """
+        started = scheduled_at if scheduled_at is not None else time.perf_counter()
+        endpoint = entry.get('endpoint') or entry['path']
+        try:
+            response = self.session().request(
+                entry.get('method', 'GET'), self.base_url + entry['path'],
+                params=entry.get('query'), json=entry.get('body'), timeout=self.timeout
+            )
+            if response.status_code >= 400:
+                self.results.add(endpoint, time.perf_counter() - started, error=f"HTTP {response.status_code}")
+                return
+            if entry.get('stream'):
+                ttft, error = self.stream_chat(response.json().get('conversation_id'), started)
+                self.results.add(endpoint, time.perf_counter() - started, ttft=ttft, error=error)
+            else:
+                self.results.add(endpoint, time.perf_counter() - started)
+        except requests.RequestException as e:
+            self.results.add(endpoint, time.perf_counter() - started, error=type(e).__name__)
+        except ValueError:
+            self.results.add(endpoint, time.perf_counter() - started, error='invalid response')
+
+    def stream_chat(self, conversation_id, started):
+        """Read a chat's SSE stream to the end; returns (time to first token, error or None)."""
+        params = {'conversation_id': conversation_id} if conversation_id else None
+        ttft = None
+        with self.session().get(self.base_url + '/api/chat', params=params, stream=True, timeout=self.timeout) as response:
+            if response.status_code >= 400:
+                return None, f"HTTP {response.status_code}"
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                data = json.loads(line[5:])
+                if data.get('error'):
+                    return ttft, 'stream error'
+                if ttft is None and data.get('content'):
+                    ttft = time.perf_counter() - started
+                if data.get('done'):
+                    return ttft, None
+        return ttft, 'stream ended early'
+
+
+def schedule(entries, args):
+    """Yield (entry, offset in seconds) in dispatch order for the chosen mode."""
+    source = itertools.cycle(entries) if args.loop else iter(entries)
+    if args.limit:
+        source = itertools.islice(source, args.limit)
+
+    if args.speed:
+        # Original arrival times, compressed by the speed factor; entries without a
+        # timestamp go out with the one before them, and each loop starts where the last ended
+        offsets = []
+        first = next((entry['ts'] for entry in entries if entry.get('ts') is not None), 0)
+        for entry in entries:
+            ts = entry.get('ts')
+            offsets.append((ts - first) / args.speed if ts is not None else (offsets[-1] if offsets else 0.0))
+        for index, entry in enumerate(source):
+            cycle, position = divmod(index, len(entries))
+            yield entry, cycle * offsets[-1] + offsets[position]
+    elif args.rate:
+        for index, entry in enumerate(source):
+            yield entry, index / args.rate
+    else:
+        for entry in source:
+            yield entry, None
+
+
+def run(entries, args):
+    """Replay entries and return the report."""
+    results = Results()
+    replayer = Replayer(args.url, results, timeout=args.timeout)
+    started = time.perf_counter()
+    deadline = started + args.duration if args.duration else None
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        if not args.rate and not args.speed:
+            # Closed loop: at most `concurrency` requests in flight, each worker sends as soon as it is free
+            slots = threading.Semaphore(args.concurrency)
+            for entry, _ in schedule(entries, args):
+                slots.acquire()
+                if deadline and time.perf_counter() >= deadline:
+                    slots.release()
+                    break
+                future = executor.submit(replayer.send, entry)
+                future.add_done_callback(lambda _: slots.release())
+        else:
+            # Open loop: requests go out on schedule whether or not earlier ones have finished
+            for entry, offset in schedule(entries, args):
+                scheduled_at = started + offset
+                if deadline and scheduled_at >= deadline:
+                    break
+                delay = scheduled_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(replayer.send, entry, scheduled_at)
+
+    return results.report(time.perf_counter() - started)
+
+
+def print_report(report, out=sys.stdout):
+    """Print a report as a table."""
+    def fmt(summary, name, label):
+        value = summary.get(name, {}).get(label)
+        return f"{value * 1000:8.0f}" if value is not None else f"{'-':>8}"
+
+    header = (f"{'endpoint':<36} {'reqs':>6} {'err%':>6} {'req/s':>7} "
+              f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'ttft50':>8} {'ttft95':>8} {'ttft99':>8}")
+    print(header, file=out)
+    print('-' * len(header), file=out)
+    rows = list(report['endpoints'].items()) + [('TOTAL', report['total'])]
+    for name, summary in rows:
+        print(f"{name[:36]:<36} {summary['requests']:>6} {summary['error_rate'] * 100:>6.1f} {summary['throughput']:>7.2f} "
+              f"{fmt(summary, 'latency', 'p50')} {fmt(summary, 'latency', 'p95')} {fmt(summary, 'latency', 'p99')} "
+              f"{fmt(summary, 'ttft', 'p50')} {fmt(summary, 'ttft', 'p95')} {fmt(summary, 'ttft', 'p99')}", file=out)
+    print(f"\n{report['total']['requests']} requests in {report['elapsed']}s", file=out)
+    for name, summary in report['endpoints'].items():
+        for error, count in summary.get('error_types', {}).items():
+            print(f"  {name}: {count} x {error}", file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a JSONL request log against Free Thinkers')
+    parser.add_argument('log', help='JSONL request log')
+    parser.add_argument('--url', default=DEFAULT_URL, help='Base URL of the app')
+    parser.add_argument('--concurrency', type=int, default=8, help='Worker threads (maximum requests in flight)')
+    parser.add_argument('--rate', type=float, default=0, help='Arrival rate in requests/second (0 = closed loop)')
+    parser.add_argument('--speed', type=float, default=0, help='Replay at the logged arrival times, this many times faster')
+    parser.add_argument('--duration', type=float, default=0, help='Stop dispatching after this many seconds')
+    parser.add_argument('--limit', type=int, default=0, help='Send at most this many requests')
+    parser.add_argument('--loop', action='store_true', help='Repeat the log until --duration or --limit is reached')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='Per-request timeout in seconds')
+    parser.add_argument('--output', help='Also write the report as JSON to this file')
+    args = parser.parse_args()
+
+    if args.loop and not (args.duration or args.limit):
+        parser.error('--loop needs --duration or --limit')
+
+    entries, skipped = load_entries(args.log)
+    if not entries:
+        parser.error(f"no replayable requests in {args.log}")
+    mode = f"{args.rate:g} req/s" if args.rate else f"{args.speed:g}x logged timing" if args.speed else "closed loop"
+    print(f"Replaying {len(entries)} requests ({skipped} skipped) against {args.url}: "
+          f"{mode}, concurrency {args.concurrency}\n")
+
+    report = run(entries, args)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+History migration for Free Thinkers.
+Imports the saved threads in ~/.freethinkers/history/ (snapshots, compressed or plain,
+and their logs) into the SQLite history database used with HISTORY_BACKEND=sqlite.
+Threads already in the database are skipped unless --force is given, so the import can
+be re-run safely; the thread files are left in place.
+
+Usage:
+    python migrate_history.py
+    python migrate_history.py --source ~/.freethinkers/history --db ~/.freethinkers/history.db --force
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+from app import history
+
+
+def migrate(source, db_path, force=False):
+    """Import every thread file in source; returns (imported, skipped, unreadable) counts."""
+    store = history.SQLiteHistoryStore(db_path)
+    imported = skipped = unreadable = 0
+    for _, files in sorted(history.thread_files(source).items()):
+        thread = history.load_thread(*files)[0]
+        if thread is None:
+            unreadable += 1
+        elif store.import_thread(thread, replace=force):
+            imported += 1
+        else:
+            skipped += 1
+    return imported, skipped, unreadable
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import file thread history into the SQLite history database')
+    parser.add_argument('--source', default=str(history.HISTORY_DIR), help='Directory of thread files')
+    parser.add_argument('--db', default=str(history.HISTORY_DB_PATH), help='SQLite database to import into')
+    parser.add_argument('--force', action='store_true', help='Overwrite threads already in the database')
+    args = parser.parse_args()
+
+    if not Path(args.source).is_dir():
+        parser.error(f"no history directory at {args.source}")
+    imported, skipped, unreadable = migrate(args.source, args.db, force=args.force)
+    print(f"Imported {imported} threads into {args.db} ({skipped} already present, {unreadable} unreadable)")
+    if skipped and not args.force:
+        print("Use --force to overwrite threads that are already in the database")
+    sys.exit(1 if unreadable else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -523,7 +523,8 @@ document.addEventListener('DOMContentLoaded', function() {
         const requestData = {
             model: currentModel,
             messages: window.currentThread,
-            parameters: parameters
+            parameters: parameters,
+            conversation_id: window.chatConversationId || null
         };
         
         console.log('Request payload:', requestData);
@@ -540,13 +541,21 @@ document.addEventListener('DOMContentLoaded', function() {
             if (!response.ok) {
                 throw new Error(`Server error: ${response.status} ${response.statusText}`);
             }
+            return response.json();
+        })
+        .then(initData => {
+            // Keep the server-side conversation handle for the stream and later turns
+            window.chatConversationId = initData.conversation_id || null;
             
             // Create assistant message placeholder
             const assistantMessageId = addMessageToUI('assistant', '', true);
             console.log('Created assistant message with ID:', assistantMessageId);
             
             // Set up event source for SSE
-            const eventSource = new EventSource('/api/chat');
+            const streamUrl = window.chatConversationId
+                ? `/api/chat?conversation_id=${encodeURIComponent(window.chatConversationId)}`
+                : '/api/chat';
+            const eventSource = new EventSource(streamUrl);
             let assistantResponse = '';
             
             eventSource.onmessage = function(event) {
@@ -577,6 +586,14 @@ document.addEventListener('DOMContentLoaded', function() {
                         return;
                     }
                     
+                    // Show the queue position while waiting for a free model slot
+                    if (data.queue) {
+                        updateLastAssistantMessage(
+                            `Waiting for ${data.queue.model} (position ${data.queue.position}, ~${Math.ceil(data.queue.estimated_wait)}s)...`
+                        );
+                        return;
+                    }
+                    
                     // Append content
                     if (data.response) {
                         assistantResponse += data.response;
@@ -622,6 +639,15 @@ document.addEventListener('DOMContentLoaded', function() {
                 console.log('Cancelling response');
                 eventSource.close();
                 
+                // Tell the server to stop the upstream generation right away
+                if (window.chatConversationId) {
+                    fetch('/api/chat/cancel', {
+                        method: 'POST',
+                        headers: { 'Content-Type': 'application/json' },
+                        body: JSON.stringify({ conversation_id: window.chatConversationId })
+                    }).catch(err => console.warn('Cancel request failed:', err));
+                }
+                
                 if (assistantResponse) {
                     // Add to conversation thread with [cancelled] note
                     window.currentThread.push({
@@ -792,6 +818,7 @@ document.addEventListener('DOMContentLoaded', function() {
             if (confirm('Are you sure you want to clear all messages?')) {
                 chatMessages.innerHTML = '';
                 window.currentThread = [];
+                window.chatConversationId = null;
             }
         });
     }
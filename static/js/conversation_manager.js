@@ -71,29 +71,20 @@ class ConversationManager {
                 syncNotif = window.showSyncingNotification();
             }
             
-            const response = await fetch('/api/history');
-            if (response.ok) {
-                const serverConversations = await response.json();
-                this.mergeServerConversations(serverConversations);
-                
-                // Complete loading with success
-                if (loading) {
-                    loading.complete('Conversations loaded', 'success');
-                } else {
-                    // Fallback to old completion methods
-                    if (syncNotif) {
-                        syncNotif.complete();
-                    } else if (window.showNotification) {
-                        window.showNotification('Conversations synced successfully', 'success');
-                    }
-                }
+            // Thread summaries only (a failed request lands in the catch below);
+            // messages are fetched when a conversation is opened
+            const serverConversations = await ConversationStore.fetchHistorySummaries();
+            this.mergeServerConversations(serverConversations);
+            
+            // Complete loading with success
+            if (loading) {
+                loading.complete('Conversations loaded', 'success');
             } else {
-                // Show error but don't fail completely
-                if (loading) {
-                    loading.updateText('Could not connect to server');
-                    setTimeout(() => loading.complete('Using local conversations', 'error'), 1000);
+                // Fallback to old completion methods
+                if (syncNotif) {
+                    syncNotif.complete();
                 } else if (window.showNotification) {
-                    window.showNotification('Could not sync with server, using local conversations', 'warning');
+                    window.showNotification('Conversations synced successfully', 'success');
                 }
             }
         } catch (error) {
@@ -139,7 +130,7 @@ class ConversationManager {
             // If the conversation already exists locally, update it if server version is newer
             if (existingIds.has(serverConv.id)) {
                 const localConv = existingIds.get(serverConv.id);
-                const serverUpdated = new Date(serverConv.updatedAt || serverConv.created_at);
+                const serverUpdated = new Date(serverConv.updated_at || serverConv.created_at);
                 const localUpdated = new Date(localConv.updatedAt);
                 
                 if (serverUpdated > localUpdated) {
@@ -176,11 +167,15 @@ class ConversationManager {
 
     // Format server conversation to match local format
     formatServerConversation(serverConv) {
+        // Listings carry summaries only; messages are fetched when the conversation is opened
+        const hasMessages = Array.isArray(serverConv.messages);
         return {
             id: serverConv.id,
             title: serverConv.title || this.getDefaultTitle(serverConv),
             category: serverConv.category || 'Uncategorized',
-            messages: Array.isArray(serverConv.messages) ? serverConv.messages : [],
+            messages: hasMessages ? serverConv.messages : [],
+            messagesLoaded: hasMessages,
+            messageCount: hasMessages ? serverConv.messages.length : (serverConv.message_count || 0),
             createdAt: serverConv.created_at || new Date().toISOString(),
             updatedAt: serverConv.updated_at || new Date().toISOString(),
             isPinned: this.pinnedConversations.includes(serverConv.id)
@@ -234,19 +229,7 @@ class ConversationManager {
                 window.createConversationLoadingIndicator('Saving conversation...') :
                 (window.showLoadingState ? window.showLoadingState('Saving conversation to server...') : null);
             
-            const response = await fetch('/api/history/save', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({
-                    id: conversation.id,
-                    title: conversation.title,
-                    category: conversation.category,
-                    messages: conversation.messages,
-                    model: window.currentModel
-                })
-            });
+            const response = await ConversationStore.postHistorySave(conversation, window.currentModel);
 
             // Handle completion with pleasant UI feedback
             if (loading) {
@@ -734,6 +717,21 @@ class ConversationManager {
         const conversation = this.getConversationById(conversationId);
         if (!conversation) return false;
         
+        // Conversations listed from the server fetch their messages on first open
+        if (conversation.messagesLoaded === false) {
+            ConversationStore.fetchHistoryThread(conversationId)
+                .then(thread => {
+                    if (!thread || !Array.isArray(thread.messages)) return;
+                    conversation.messages = thread.messages;
+                    conversation.messagesLoaded = true;
+                    ConversationStore.markSaved(conversation);
+                    this.saveConversations();
+                    this.loadConversationToThread(conversationId);
+                })
+                .catch(error => console.error('Error loading conversation messages:', error));
+            return true;
+        }
+        
         // Create loading indicator with a friendly message
         let loadingIndicator = null;
         if (window.createConversationLoadingIndicator) {
@@ -157,19 +157,8 @@ class ConversationStore {
         this.dispatchEvent('stateChanged', { syncInProgress: true });
         
         try {
-            const response = await fetch('/api/history', {
-                method: 'GET',
-                headers: {
-                    'Cache-Control': 'no-cache',
-                    'Pragma': 'no-cache'
-                }
-            });
-            
-            if (!response.ok) {
-                throw new Error(`Server returned ${response.status}: ${response.statusText}`);
-            }
-            
-            const serverConversations = await response.json();
+            // Only summaries are listed; pages stop once they reach what the last sync already saw
+            const serverConversations = await ConversationStore.fetchHistorySummaries(this.lastSyncTime);
             
             // Merge server conversations with local ones
             this.mergeServerConversations(serverConversations);
@@ -204,6 +193,166 @@ class ConversationStore {
         }
     }
     
+    /**
+     * Fetch saved thread summaries from the server, newest first, one page at a time
+     * @param {Date|null} since - Stop paging once threads are no newer than this
+     * @returns {Promise<Array>} - Thread summaries (without messages)
+     */
+    static async fetchHistorySummaries(since = null) {
+        const summaries = [];
+        let cursor = null;
+        
+        do {
+            const params = new URLSearchParams({ limit: ConversationStore.HISTORY_PAGE_SIZE });
+            if (cursor) params.set('cursor', cursor);
+            
+            const response = await fetch(`/api/history?${params}`, {
+                method: 'GET',
+                headers: {
+                    'Cache-Control': 'no-cache',
+                    'Pragma': 'no-cache'
+                }
+            });
+            
+            if (!response.ok) {
+                throw new Error(`Server returned ${response.status}: ${response.statusText}`);
+            }
+            
+            const page = await response.json();
+            summaries.push(...page.threads);
+            cursor = page.next_cursor;
+            
+            const oldest = page.threads[page.threads.length - 1];
+            if (since && oldest && new Date(oldest.updated_at || oldest.created_at) <= since) {
+                break;
+            }
+        } while (cursor);
+        
+        return summaries;
+    }
+    
+    /**
+     * Fetch one saved thread, messages included
+     * @param {string} threadId - Thread ID
+     * @returns {Promise<Object|null>} - Thread or null if not found
+     */
+    static async fetchHistoryThread(threadId) {
+        const response = await fetch(`/api/history/${encodeURIComponent(threadId)}`);
+        if (!response.ok) {
+            return null;
+        }
+        return response.json();
+    }
+    
+    /**
+     * Rolling fingerprints of a message list: entry i covers messages 0..i
+     * @param {Array} messages - Messages to fingerprint
+     * @returns {Array<string>} - One 32-bit FNV-1a hash (hex) per message
+     */
+    static prefixHashes(messages) {
+        const hashes = [];
+        let hash = 0x811c9dc5;
+        for (const message of messages) {
+            const text = JSON.stringify(message) + '\u0000';
+            for (let i = 0; i < text.length; i++) {
+                hash = Math.imul(hash ^ text.charCodeAt(i), 0x01000193) >>> 0;
+            }
+            hashes.push(hash.toString(16));
+        }
+        return hashes;
+    }
+    
+    /**
+     * Position from which the server's copy of a conversation is out of date
+     * @param {Object} conversation - Conversation to save
+     * @returns {number} - Number of leading messages the server already has unchanged
+     */
+    static savedPrefixLength(conversation) {
+        const saved = conversation.savedHashes || [];
+        const current = ConversationStore.prefixHashes(conversation.messages || []);
+        // Any edit to a saved message (e.g. a regenerated reply) ends the unchanged prefix there;
+        // an edit to the first message, or nothing remembered, means a full save
+        let offset = 0;
+        while (offset < saved.length && offset < current.length && saved[offset] === current[offset]) {
+            offset++;
+        }
+        return offset;
+    }
+    
+    /**
+     * Remember what the server has of a conversation, so the next save only sends what changed
+     * @param {Object} conversation - Conversation that was saved or loaded from the server
+     */
+    static markSaved(conversation) {
+        const messages = conversation.messages || [];
+        conversation.savedMessageCount = messages.length;
+        conversation.savedHashes = ConversationStore.prefixHashes(messages);
+        delete conversation.savedTail;
+    }
+    
+    /**
+     * Save a conversation to server history, appending only new messages when possible
+     * @param {Object} conversation - Conversation to save
+     * @param {string} model - Model to record with the thread
+     * @returns {Promise<Response>} - Response of the save request
+     */
+    static async postHistorySave(conversation, model) {
+        const send = async (offset) => {
+            const data = {
+                id: conversation.id,
+                title: conversation.title,
+                category: conversation.category,
+                messages: (conversation.messages || []).slice(offset),
+                model: model
+            };
+            if (offset > 0) data.offset = offset;
+            return fetch('/api/history/save', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify(data)
+            });
+        };
+        
+        // Messages of a conversation listed from the server but never opened are not here to send
+        const offset = conversation.messagesLoaded === false ?
+            (conversation.messageCount || 0) : ConversationStore.savedPrefixLength(conversation);
+        let response = await send(offset);
+        if (response.status === 409 && conversation.messagesLoaded !== false) {
+            // The server's copy is not what we last saved; send the whole conversation
+            response = await send(0);
+        }
+        if (response.ok && conversation.messagesLoaded !== false) {
+            ConversationStore.markSaved(conversation);
+        }
+        return response;
+    }
+    
+    /**
+     * Load the messages of a conversation listed from a server summary
+     * @param {string} conversationId - ID of conversation
+     * @returns {Promise<Object|null>} - The conversation with its messages
+     */
+    async ensureMessagesLoaded(conversationId) {
+        const conversation = this.getConversationById(conversationId);
+        if (!conversation || conversation.messagesLoaded !== false) return conversation;
+        
+        try {
+            const thread = await ConversationStore.fetchHistoryThread(conversationId);
+            if (thread && Array.isArray(thread.messages)) {
+                conversation.messages = thread.messages;
+                conversation.messagesLoaded = true;
+                ConversationStore.markSaved(conversation);
+                this.saveToLocalStorage();
+                this.dispatchEvent('conversationUpdated', conversation);
+            }
+        } catch (error) {
+            console.error('Error loading conversation messages:', error);
+        }
+        return conversation;
+    }
+    
     /**
      * Merge server conversations with local ones
      * @param {Array} serverConversations - Conversations from server
@@ -257,11 +406,15 @@ class ConversationStore {
      * @returns {Object} - Formatted conversation
      */
     formatServerConversation(serverConv) {
+        // Listings carry summaries only; messages are fetched when the conversation is opened
+        const hasMessages = Array.isArray(serverConv.messages);
         return {
             id: serverConv.id,
             title: serverConv.title || this.getDefaultTitle(serverConv),
             category: serverConv.category || 'Uncategorized',
-            messages: Array.isArray(serverConv.messages) ? serverConv.messages : [],
+            messages: hasMessages ? serverConv.messages : [],
+            messagesLoaded: hasMessages,
+            messageCount: hasMessages ? serverConv.messages.length : (serverConv.message_count || 0),
             model: serverConv.model || 'default',
             createdAt: serverConv.created_at || new Date().toISOString(),
             updatedAt: serverConv.updated_at || new Date().toISOString(),
@@ -658,6 +811,13 @@ class ConversationStore {
         const conversation = this.getConversationById(conversationId);
         if (!conversation || !Array.isArray(conversation.messages)) return false;
         
+        if (conversation.messagesLoaded === false) {
+            this.ensureMessagesLoaded(conversationId).then(loaded => {
+                if (loaded && loaded.messagesLoaded !== false) this.loadConversationToThread(conversationId);
+            });
+            return true;
+        }
+        
         // Set current conversation
         this.setCurrentConversation(conversationId);
         
@@ -1082,23 +1242,8 @@ class ConversationStore {
                 throw new Error('Conversation not found');
             }
             
-            // Prepare data for API
-            const data = {
-                id: conversation.id,
-                title: conversation.title,
-                category: conversation.category,
-                messages: conversation.messages,
-                model: conversation.model
-            };
-            
             // Make API request
-            const response = await fetch('/api/history/save', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify(data)
-            });
+            const response = await ConversationStore.postHistorySave(conversation, conversation.model);
             
             if (!response.ok) {
                 const errorData = await response.json();
@@ -1221,6 +1366,9 @@ class ConversationStore {
     }
 }
 
+// Threads listed per request from /api/history
+ConversationStore.HISTORY_PAGE_SIZE = 50;
+
 // Create the global store instance
 window.conversationStore = new ConversationStore();
 
@@ -145,6 +145,26 @@ class PerformanceMonitor {
                                 </div>
                             </div>
                         </div>
+                        <div class="row">
+                            <div class="col-md-4">
+                                <div class="form-group mb-3">
+                                    <label for="benchmarkPromptTokens" class="form-label">Prompt Length (tokens)</label>
+                                    <input type="number" id="benchmarkPromptTokens" class="form-control" value="256" min="1" max="8192">
+                                </div>
+                            </div>
+                            <div class="col-md-4">
+                                <div class="form-group mb-3">
+                                    <label for="benchmarkOutputTokens" class="form-label">Output Length (tokens)</label>
+                                    <input type="number" id="benchmarkOutputTokens" class="form-control" value="128" min="1" max="4096">
+                                </div>
+                            </div>
+                            <div class="col-md-4 d-flex align-items-end">
+                                <div class="form-check mb-3">
+                                    <input class="form-check-input" type="checkbox" id="benchmarkColdStart" checked>
+                                    <label class="form-check-label" for="benchmarkColdStart">Measure cold load</label>
+                                </div>
+                            </div>
+                        </div>
                         <div class="d-flex justify-content-end mt-3">
                             <button id="runBenchmarkBtn" class="btn btn-primary">
                                 <i class="fas fa-play"></i> Run Benchmark
@@ -157,6 +177,7 @@ class PerformanceMonitor {
                             <p>Run a benchmark to see performance results</p>
                         </div>
                     </div>
+                    <div id="benchmarkHistory" class="benchmark-history mt-3"></div>
                 </div>
             </div>
         `;
@@ -203,6 +224,14 @@ class PerformanceMonitor {
                 this.runBenchmark();
             });
         }
+        
+        // Show previous runs of the selected model
+        const modelSelector = document.getElementById('benchmarkModel');
+        if (modelSelector) {
+            modelSelector.addEventListener('change', () => {
+                this.loadBenchmarkHistory(modelSelector.value);
+            });
+        }
     }
     
     /**
@@ -219,22 +248,21 @@ class PerformanceMonitor {
         profileSelector.innerHTML = '<option value="">Default parameters</option>';
         
         try {
-            // Fetch models
-            const modelResponse = await fetch('/api/tags');
+            // Fetch models (a list of model names)
+            const modelResponse = await fetch('/api/models');
             if (modelResponse.ok) {
-                const modelData = await modelResponse.json();
-                const models = modelData.models || [];
+                const models = await modelResponse.json();
                 
-                models.forEach(model => {
+                (Array.isArray(models) ? models : []).forEach(name => {
                     const option = document.createElement('option');
-                    option.value = model.name;
-                    option.textContent = model.name;
+                    option.value = name;
+                    option.textContent = name;
                     modelSelector.appendChild(option);
                 });
             }
             
             // Fetch profiles
-            const profileResponse = await fetch('/api/profiles');
+            const profileResponse = await fetch('/api/parameter_profiles/');
             if (profileResponse.ok) {
                 const profiles = await profileResponse.json();
                 
@@ -245,7 +273,7 @@ class PerformanceMonitor {
                     
                     profiles.general.forEach(profile => {
                         const option = document.createElement('option');
-                        option.value = `general:${profile.name}`;
+                        option.value = profile.name;
                         option.textContent = profile.name;
                         generalGroup.appendChild(option);
                     });
@@ -260,7 +288,7 @@ class PerformanceMonitor {
                     
                     profiles.task_specific.forEach(profile => {
                         const option = document.createElement('option');
-                        option.value = `task:${profile.name}`;
+                        option.value = profile.name;
                         option.textContent = profile.name;
                         taskGroup.appendChild(option);
                     });
@@ -275,7 +303,7 @@ class PerformanceMonitor {
                     
                     profiles.custom.forEach(profile => {
                         const option = document.createElement('option');
-                        option.value = `custom:${profile.name}`;
+                        option.value = profile.name;
                         option.textContent = profile.name;
                         customGroup.appendChild(option);
                     });
@@ -410,6 +438,9 @@ class PerformanceMonitor {
         const profile = profileSelector.value;
         const benchmarkType = typeSelector.value;
         const iterations = parseInt(iterationsInput.value) || 3;
+        const promptTokens = parseInt(document.getElementById('benchmarkPromptTokens')?.value) || 256;
+        const outputTokens = parseInt(document.getElementById('benchmarkOutputTokens')?.value) || 128;
+        const coldStart = document.getElementById('benchmarkColdStart')?.checked ?? true;
         
         if (!model) {
             alert('Please select a model to benchmark');
@@ -427,7 +458,7 @@ class PerformanceMonitor {
         `;
         
         try {
-            const response = await fetch('/api/benchmark', {
+            const response = await fetch('/api/system/benchmark', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
@@ -436,19 +467,24 @@ class PerformanceMonitor {
                     model: model,
                     profile: profile,
                     type: benchmarkType,
-                    iterations: iterations
+                    iterations: iterations,
+                    prompt_tokens: promptTokens,
+                    output_tokens: outputTokens,
+                    cold_start: coldStart
                 })
             });
             
+            const result = await response.json().catch(() => ({}));
             if (response.ok) {
-                const result = await response.json();
                 this.benchmarkResults.push(result);
                 this.displayBenchmarkResults(result);
+                this.loadBenchmarkHistory(model);
             } else {
-                console.error(`Error running benchmark: ${response.statusText}`);
+                const message = result.message || response.statusText;
+                console.error(`Error running benchmark: ${message}`);
                 resultsContainer.innerHTML = `
                     <div class="alert alert-danger">
-                        Error running benchmark: ${response.statusText}
+                        Error running benchmark: ${message}
                     </div>
                 `;
             }
@@ -469,6 +505,9 @@ class PerformanceMonitor {
         const resultsContainer = document.getElementById('benchmarkResults');
         if (!resultsContainer || !result) return;
         
+        const format = (value, digits = 2) => (value === null || value === undefined) ? 'n/a' : Number(value).toFixed(digits);
+        const cold = result.cold;
+        
         let resultsHtml = `
             <div class="benchmark-result">
                 <h6 class="mb-3">
@@ -482,7 +521,7 @@ class PerformanceMonitor {
                             <div class="card mb-3">
                                 <div class="card-body p-3">
                                     <h6 class="card-title">Token Generation</h6>
-                                    <p class="display-6 text-primary mb-1">${result.tokens_per_second.toFixed(2)}</p>
+                                    <p class="display-6 text-primary mb-1">${format(result.tokens_per_second)}</p>
                                     <p class="text-muted small">tokens/second</p>
                                 </div>
                             </div>
@@ -491,7 +530,7 @@ class PerformanceMonitor {
                             <div class="card mb-3">
                                 <div class="card-body p-3">
                                     <h6 class="card-title">Inference Time</h6>
-                                    <p class="display-6 text-primary mb-1">${result.avg_inference_time.toFixed(2)}</p>
+                                    <p class="display-6 text-primary mb-1">${format(result.avg_inference_time)}</p>
                                     <p class="text-muted small">seconds</p>
                                 </div>
                             </div>
@@ -501,18 +540,18 @@ class PerformanceMonitor {
                         <div class="col-md-6">
                             <div class="card mb-3">
                                 <div class="card-body p-3">
-                                    <h6 class="card-title">Memory Usage</h6>
-                                    <p class="display-6 text-primary mb-1">${result.peak_memory_mb}</p>
-                                    <p class="text-muted small">MB</p>
+                                    <h6 class="card-title">Peak Ollama Memory</h6>
+                                    <p class="display-6 text-primary mb-1">${result.peak_memory_mb ?? 'n/a'}</p>
+                                    <p class="text-muted small">MB RSS</p>
                                 </div>
                             </div>
                         </div>
                         <div class="col-md-6">
                             <div class="card mb-3">
                                 <div class="card-body p-3">
-                                    <h6 class="card-title">Overall Score</h6>
-                                    <p class="display-6 text-primary mb-1">${result.score.toFixed(2)}</p>
-                                    <p class="text-muted small">higher is better</p>
+                                    <h6 class="card-title">Time to First Token</h6>
+                                    <p class="display-6 text-primary mb-1">${format(result.warm_ttft)}</p>
+                                    <p class="text-muted small">seconds warm${cold ? `, ${format(cold.ttft)} cold (${format(cold.load_time)}s load)` : ''}</p>
                                 </div>
                             </div>
                         </div>
@@ -525,8 +564,9 @@ class PerformanceMonitor {
                         <li>Test prompt length: ${result.prompt_length} tokens</li>
                         <li>Response length: ${result.response_length} tokens</li>
                         <li>Total tokens: ${result.total_tokens} tokens</li>
+                        <li>Prompt evaluation: ${format(result.prompt_tokens_per_second)} tokens/second</li>
                         <li>Number of iterations: ${result.iterations}</li>
-                        <li>Test completed: ${new Date(result.timestamp).toLocaleString()}</li>
+                        <li>Test completed: ${new Date(result.timestamp * 1000).toLocaleString()}</li>
                     </ul>
                 </div>
             </div>
@@ -535,6 +575,62 @@ class PerformanceMonitor {
         resultsContainer.innerHTML = resultsHtml;
     }
     
+    /**
+     * Show previous benchmark runs of a model for comparison across profiles
+     */
+    async loadBenchmarkHistory(model) {
+        const historyContainer = document.getElementById('benchmarkHistory');
+        if (!historyContainer) return;
+        
+        if (!model) {
+            historyContainer.innerHTML = '';
+            return;
+        }
+        
+        try {
+            const response = await fetch(`/api/system/benchmark/history?model=${encodeURIComponent(model)}&limit=10`);
+            if (!response.ok) return;
+            
+            const data = await response.json();
+            const results = data.results || [];
+            if (results.length === 0) {
+                historyContainer.innerHTML = '';
+                return;
+            }
+            
+            const format = (value, digits = 2) => (value === null || value === undefined) ? 'n/a' : Number(value).toFixed(digits);
+            const rows = results.map(result => `
+                <tr>
+                    <td>${new Date(result.timestamp * 1000).toLocaleString()}</td>
+                    <td>${result.profile || 'Default'}</td>
+                    <td>${format(result.tokens_per_second)}</td>
+                    <td>${format(result.warm_ttft)}</td>
+                    <td>${result.cold ? format(result.cold.ttft) : 'n/a'}</td>
+                    <td>${result.peak_memory_mb ?? 'n/a'}</td>
+                </tr>
+            `).join('');
+            
+            historyContainer.innerHTML = `
+                <p class="small mb-1"><strong>Previous runs:</strong></p>
+                <table class="table table-sm small">
+                    <thead>
+                        <tr>
+                            <th>Date</th>
+                            <th>Profile</th>
+                            <th>Tokens/s</th>
+                            <th>Warm TTFT (s)</th>
+                            <th>Cold TTFT (s)</th>
+                            <th>Peak MB</th>
+                        </tr>
+                    </thead>
+                    <tbody>${rows}</tbody>
+                </table>
+            `;
+        } catch (error) {
+            console.error(`Error loading benchmark history: ${error}`);
+        }
+    }
+    
     /**
      * Update metrics with new data
      */
@@ -1,6 +1,9 @@
+import os
+
 import requests
 
-BASE_URL = 'http://localhost:5000/api/model-strategies'
+# Point at another server (e.g. one backed by fake_ollama.py) with FREETHINKERS_URL
+BASE_URL = os.environ.get('FREETHINKERS_URL', 'http://localhost:5000') + '/api/model-strategies'
 
 def test_model_strategies():
     for model in ['llava-phi3', 'llama3.1', 'phi3', 'mistral-7b', 'unknown-model']:
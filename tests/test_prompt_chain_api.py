@@ -1,6 +1,9 @@
+import os
+
 import requests
 
-BASE_URL = 'http://localhost:5000/api/prompt-chain'
+# Point at another server (e.g. one backed by fake_ollama.py) with FREETHINKERS_URL
+BASE_URL = os.environ.get('FREETHINKERS_URL', 'http://localhost:5000') + '/api/prompt-chain'
 
 def test_prompt_chain():
     chain = [